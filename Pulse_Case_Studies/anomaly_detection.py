@@ -0,0 +1,135 @@
+"""
+anomaly_detection.py
+
+This module scores quarterly state and district series for spikes, drops and
+stagnation.
+
+Every series is a row of one 2-D matrix (see forecasting.build_series_matrix) and all
+scores are array operations over the whole matrix:
+
+- spikes and drops: rolling z-score of year-over-year log growth, so the festive
+  quarter is compared with the same quarter of earlier years rather than flagged
+  every year;
+- trend: least-squares slope of the log rolling 4-quarter sum over the most recent
+  quarters, with its t-statistic.
+"""
+import warnings
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from forecasting import build_series_matrix
+
+SEASON = 4
+Z_WINDOW = 4
+TREND_QUARTERS = 8
+Z_THRESHOLD = 3.0
+T_THRESHOLD = 2.0
+STAGNATION_PCT = 1.0
+
+
+def rolling_z_scores(matrix, window=Z_WINDOW, season=SEASON):
+    """
+    Z-score of each quarter's year-over-year log growth against the previous window
+    quarters of the same series.
+
+    Returns:
+    (n_series, n_periods) array, NaN where there is not enough history
+    """
+    logs = np.log1p(np.clip(matrix, 0, None))
+    growth = np.full_like(logs, np.nan)
+    growth[:, season:] = logs[:, season:] - logs[:, :-season]
+
+    z = np.full_like(logs, np.nan)
+    if growth.shape[1] <= window:
+        return z
+
+    # windows[:, i] holds growth[:, i:i + window], the history of period i + window.
+    windows = sliding_window_view(growth, window, axis=1)[:, :-1]
+    with warnings.catch_warnings(), np.errstate(invalid="ignore", divide="ignore"):
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        mean = np.nanmean(windows, axis=2)
+        std = np.nanstd(windows, axis=2, ddof=1)
+        z[:, window:] = (growth[:, window:] - mean) / np.where(std > 0, std, np.nan)
+    return z
+
+
+def trend_slopes(matrix, quarters=TREND_QUARTERS, season=SEASON):
+    """
+    Slope of the log rolling 4-quarter sum over the last quarters periods.
+
+    Returns:
+    (slope_pct, t_stat): per-series growth in percent per quarter and the slope's t-statistic
+    """
+    rolling = sliding_window_view(np.clip(matrix, 0, None), season, axis=1).sum(axis=2)
+    y = np.log1p(rolling[:, -quarters:])
+    t = np.arange(y.shape[1], dtype=float)[None, :]
+
+    observed = ~np.isnan(y)
+    count = observed.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t_mean = (t * observed).sum(axis=1) / count
+        y_mean = np.nansum(y, axis=1) / count
+        t_dev = np.where(observed, t - t_mean[:, None], 0.0)
+        y_dev = np.where(observed, y - y_mean[:, None], 0.0)
+        variance = (t_dev ** 2).sum(axis=1)
+        slope = (t_dev * y_dev).sum(axis=1) / variance
+        residuals = y_dev - slope[:, None] * t_dev
+        sigma2 = (residuals ** 2).sum(axis=1) / (count - 2)
+        t_stat = slope / np.sqrt(sigma2 / variance)
+
+    slope = np.where(count >= 3, slope, np.nan)
+    t_stat = np.where(count >= 3, t_stat, np.nan)
+    return (np.expm1(slope) * 100).round(4), t_stat
+
+
+def classify_trends(slope_pct, t_stat, t_threshold=T_THRESHOLD, stagnation_pct=STAGNATION_PCT):
+    """
+    Label each series Declining, Stagnant or Growing from its slope and t-statistic.
+    """
+    declining = (slope_pct < 0) & (t_stat <= -t_threshold)
+    stagnant = ~declining & (slope_pct < stagnation_pct)
+    return np.select([np.isnan(slope_pct), declining, stagnant], ["Insufficient data", "Declining", "Stagnant"], "Growing")
+
+
+def detect_anomalies(slices_df, keys, value_column, window=Z_WINDOW, trend_quarters=TREND_QUARTERS,
+                     z_threshold=Z_THRESHOLD):
+    """
+    Score every series of slices_df (one row per keys, Year, Quarter) at once.
+
+    Returns:
+    (summary_df, flags_df)
+    summary_df: one row per series with [*keys, Latest_value, Latest_z, Max_abs_z, Spikes,
+    Drops, Slope_pct_per_quarter, Slope_t_stat, Trend]
+    flags_df: one row per flagged quarter with [*keys, Year, Quarter, Value, Z_score, Flag]
+    """
+    keys_df, periods, matrices = build_series_matrix(slices_df, keys, [value_column])
+    matrix = matrices[value_column]
+
+    z = rolling_z_scores(matrix, window)
+    slope_pct, t_stat = trend_slopes(matrix, trend_quarters)
+    spikes = z >= z_threshold
+    drops = z <= -z_threshold
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        max_abs_z = np.nanmax(np.abs(z), axis=1)
+
+    summary_df = keys_df.copy()
+    summary_df["Latest_value"] = matrix[:, -1]
+    summary_df["Latest_z"] = z[:, -1].round(2)
+    summary_df["Max_abs_z"] = max_abs_z.round(2)
+    summary_df["Spikes"] = spikes.sum(axis=1)
+    summary_df["Drops"] = drops.sum(axis=1)
+    summary_df["Slope_pct_per_quarter"] = slope_pct
+    summary_df["Slope_t_stat"] = np.round(t_stat, 2)
+    summary_df["Trend"] = classify_trends(slope_pct, t_stat)
+
+    rows, columns = np.nonzero(spikes | drops)
+    flags_df = keys_df.iloc[rows].reset_index(drop=True)
+    flags_df["Year"] = [periods[c][0] for c in columns]
+    flags_df["Quarter"] = [periods[c][1] for c in columns]
+    flags_df["Value"] = matrix[rows, columns]
+    flags_df["Z_score"] = z[rows, columns].round(2)
+    flags_df["Flag"] = np.where(spikes[rows, columns], "Spike", "Drop")
+
+    return summary_df, flags_df.sort_values(["Year", "Quarter"], ascending=False, ignore_index=True)
@@ -0,0 +1,399 @@
+"""
+api.py
+
+Read-only HTTP API over the query catalogue (ASGI, built on Starlette).
+
+    uvicorn api:app --host 0.0.0.0 --port 8000
+
+    GET /queries                                   list of queries and their parameters
+    GET /queries/get_states_contribution           JSON rows
+    GET /queries/get_district_transactions?state=Karnataka&year=2023&quarter=2
+    GET /queries/get_top_districts_by_state?year=2023&format=arrow
+    GET /simulations/insurance?percentile=50&states=Bihar,Assam
+    POST /simulations/insurance                    {"uplift_pct": [5, 10, 25]}
+
+Responses are JSON, or Arrow IPC streams with format=arrow or an
+"Accept: application/vnd.apache.arrow.stream" header (needs pyarrow). Every response
+carries an ETag derived from the live data version and the request, so a repeat
+request with If-None-Match is answered 304 without touching the database until the
+next load. Rendered bodies are also kept in memory per data version. Queries run on a
+read replica when db_connection has readers configured.
+
+/simulations/insurance evaluates insurance what-if scenarios (see insurance_simulator)
+in memory against per-state baselines read once per data version.
+"""
+import os
+import io
+import time
+import json
+import hashlib
+import inspect
+import threading
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+from starlette.concurrency import run_in_threadpool
+
+from db_connection import get_data_version, get_phonepe_engine, read_engine
+from insurance_simulator import (percentile_scenarios, rate_scenarios, scenario_summary, state_results,
+                                 uplift_scenarios)
+
+API_MAX_AGE = int(os.getenv("API_MAX_AGE", "60"))
+DATA_VERSION_TTL = 30
+RESPONSE_CACHE_SIZE = 512
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+# district_queries functions that return a DataFrame (get_latest_period returns a tuple).
+DISTRICT_QUERIES = [
+    "get_district_transactions",
+    "get_top_districts_by_state",
+    "get_district_map_data",
+    "get_available_periods",
+    "get_pincode_transactions",
+    "get_top_pincodes_by_state",
+]
+
+
+class BadRequest(Exception):
+    pass
+
+
+#Query catalogue
+
+
+def build_catalogue():
+    """
+    Map endpoint name -> query function: every engine-only get_* function of
+    data_queries plus the DataFrame lookups of district_queries.
+    """
+    import data_queries
+    import district_queries
+
+    catalogue = {
+        name: function for name, function in inspect.getmembers(data_queries, inspect.isfunction)
+        if name.startswith("get_") and function.__module__ == "data_queries"
+        and list(inspect.signature(function).parameters) == ["engine"]
+    }
+    for name in DISTRICT_QUERIES:
+        catalogue[name] = getattr(district_queries, name)
+    return catalogue
+
+
+def _int_parameter(low, high):
+    def parse(name, value):
+        try:
+            number = int(value)
+        except ValueError:
+            raise BadRequest(f"{name} must be an integer")
+        if not low <= number <= high:
+            raise BadRequest(f"{name} must be between {low} and {high}")
+        return number
+    return parse
+
+
+def _state_parameter(name, value):
+    if value not in _state_names(_data_version()):
+        raise BadRequest(f"unknown state {value!r}")
+    return value
+
+
+PARAMETERS = {
+    "state": _state_parameter,
+    "year": _int_parameter(2000, 2100),
+    "quarter": _int_parameter(1, 4),
+    "k": _int_parameter(1, 1000),
+}
+
+
+def query_parameters(function):
+    """
+    The request parameters of a query function: [(name, required)] after engine.
+    """
+    return [(name, parameter.default is inspect.Parameter.empty)
+            for name, parameter in list(inspect.signature(function).parameters.items())[1:]]
+
+
+def parse_parameters(function, query_params):
+    """
+    Validate the query string against the function signature.
+
+    Returns:
+    tuple of (name, value) in signature order, omitting parameters left at their default
+    """
+    expected = dict(query_parameters(function))
+    unknown = set(query_params) - set(expected) - {"format"}
+    if unknown:
+        raise BadRequest(f"unknown parameter(s): {', '.join(sorted(unknown))}")
+    parsed = []
+    for name, required in expected.items():
+        if name not in query_params:
+            if required:
+                raise BadRequest(f"missing parameter: {name}")
+            continue
+        parsed.append((name, PARAMETERS[name](name, query_params[name])))
+    return tuple(parsed)
+
+
+#Data version and rendering
+
+
+_engine = None
+_version = {"value": None, "checked_at": 0.0}
+_version_lock = threading.Lock()
+
+
+def _writer():
+    global _engine
+    if _engine is None:
+        _engine = get_phonepe_engine("writer")
+    return _engine
+
+
+def _reader(version):
+    # Only a replica that has replicated version (or the writer) answers for it, so
+    # responses cached under a version hold that version's data.
+    return read_engine(_writer(), version)
+
+
+def _data_version():
+    # Loads publish the version on the writer; a lagging replica would report an old one.
+    with _version_lock:
+        if _version["value"] is None or time.monotonic() - _version["checked_at"] >= DATA_VERSION_TTL:
+            _version["value"] = get_data_version(_writer())
+            _version["checked_at"] = time.monotonic()
+        return _version["value"]
+
+
+@lru_cache(maxsize=8)
+def _state_names(version):
+    with _reader(version).connect() as conn:
+        return frozenset(conn.execute(text("SELECT State FROM dim_state;")).scalars())
+
+
+def _etag(version, name, params, fmt):
+    digest = hashlib.sha1(repr((name, params, fmt)).encode()).hexdigest()[:16]
+    return f'"{version}-{digest}"'
+
+
+@lru_cache(maxsize=RESPONSE_CACHE_SIZE)
+def render(version, name, params, fmt):
+    """
+    Run a query and serialise the result; cached per data version.
+
+    Returns:
+    (body_bytes, media_type)
+    """
+    df = CATALOGUE[name](_reader(version), **dict(params))
+    if fmt == "arrow":
+        import pyarrow as pa
+        sink = io.BytesIO()
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue(), ARROW_MEDIA_TYPE
+    body = {"query": name, "data_version": version, "parameters": dict(params),
+            "columns": list(df.columns), "rows": json.loads(df.to_json(orient="records", date_format="iso"))}
+    return json.dumps(body, separators=(",", ":")).encode(), "application/json"
+
+
+def _format(request):
+    fmt = request.query_params.get("format")
+    if fmt is None:
+        fmt = "arrow" if ARROW_MEDIA_TYPE in request.headers.get("accept", "") else "json"
+    if fmt not in ("json", "arrow"):
+        raise BadRequest("format must be json or arrow")
+    if fmt == "arrow":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise BadRequest("Arrow responses need pyarrow on the server")
+    return fmt
+
+
+#Endpoints
+
+
+async def list_queries(request):
+    return JSONResponse({
+        "data_version": await run_in_threadpool(_data_version),
+        "queries": [{"name": name, "path": f"/queries/{name}",
+                     "parameters": [{"name": p, "required": required} for p, required in query_parameters(function)],
+                     "description": inspect.getdoc(function)}
+                    for name, function in sorted(CATALOGUE.items())],
+    })
+
+
+async def run_query(request):
+    name = request.path_params["name"]
+    if name not in CATALOGUE:
+        return JSONResponse({"error": f"unknown query {name!r}"}, status_code=404)
+
+    try:
+        version = await run_in_threadpool(_data_version)
+        fmt = _format(request)
+        params = await run_in_threadpool(parse_parameters, CATALOGUE[name], dict(request.query_params))
+    except BadRequest as error:
+        return JSONResponse({"error": str(error)}, status_code=400)
+
+    etag = _etag(version, name, params, fmt)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={API_MAX_AGE}",
+        "X-Data-Version": str(version),
+        "Vary": "Accept",
+    }
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    body, media_type = await run_in_threadpool(render, version, name, params, fmt)
+    return Response(body, media_type=media_type, headers=headers)
+
+
+#Insurance what-if simulations
+
+
+SCENARIO_KINDS = {
+    # kind: (smallest allowed value, builder)
+    "percentile": (0.0, percentile_scenarios),
+    "rate": (0.0, rate_scenarios),
+    "uplift_pct": (-100.0, uplift_scenarios),
+}
+MAX_SCENARIOS = 100000
+
+
+@lru_cache(maxsize=8)
+def _insurance_baselines(version):
+    from data_queries import get_insurance_baselines
+    return get_insurance_baselines(_reader(version))
+
+
+def _numbers(name, values, low):
+    # JSON numbers, or strings from the query string; bools and nested lists are not numbers.
+    values = values if isinstance(values, list) else [values]
+    if not all(isinstance(value, (int, float, str)) and not isinstance(value, bool) for value in values):
+        raise BadRequest(f"{name} must be a number or a list of numbers")
+    try:
+        numbers = np.asarray(values, dtype=float)
+    except (TypeError, ValueError):
+        raise BadRequest(f"{name} must be a number or a list of numbers")
+    if not np.isfinite(numbers).all() or (numbers < low).any() or (name == "percentile" and (numbers > 100).any()):
+        raise BadRequest(f"{name} out of range")
+    return numbers
+
+
+def build_scenarios(baseline_df, params):
+    """
+    Turn simulation parameters into a (scenarios x states) matrix of target adoption
+    rates. Exactly one of percentile, rate, uplift_pct (numbers, applied to the states
+    listed in states, default all; an empty list is rejected) or targets (a list of
+    {state: rate} objects; states left out keep their current rate) is expected.
+
+    Returns:
+    (target_rates, labels)
+    """
+    unknown = set(params) - set(SCENARIO_KINDS) - {"targets", "states"}
+    if unknown:
+        raise BadRequest(f"unknown parameter(s): {', '.join(sorted(unknown))}")
+    kinds = [kind for kind in list(SCENARIO_KINDS) + ["targets"] if kind in params]
+    if len(kinds) != 1:
+        raise BadRequest("give exactly one of percentile, rate, uplift_pct or targets")
+    kind = kinds[0]
+
+    if kind == "targets":
+        targets = params["targets"]
+        if not isinstance(targets, list) or not all(isinstance(target, dict) for target in targets):
+            raise BadRequest("targets must be a list of {state: rate} objects")
+        targets_df = pd.DataFrame(targets)
+        unknown_states = set(targets_df.columns) - set(baseline_df["State"])
+        if unknown_states:
+            raise BadRequest(f"unknown state(s): {', '.join(sorted(unknown_states))}")
+        targets_df = targets_df.reindex(columns=baseline_df["State"])
+        try:
+            target_rates = targets_df.to_numpy(dtype=float)
+        except (TypeError, ValueError):
+            raise BadRequest("target rates must be numbers")
+        given = ~np.isnan(target_rates)
+        if not np.isfinite(target_rates[given]).all() or (target_rates[given] < 0).any():
+            raise BadRequest("targets out of range")
+        target_rates = np.where(given, target_rates, baseline_df["Adoption_rate"].to_numpy())
+        labels = [f"targets[{i}]" for i in range(len(target_rates))]
+    else:
+        low, builder = SCENARIO_KINDS[kind]
+        values = _numbers(kind, params[kind], low)
+        states = params.get("states")
+        if isinstance(states, str):
+            states = [states]
+        if states is not None and (not isinstance(states, list)
+                                   or not all(isinstance(state, str) for state in states)):
+            raise BadRequest("states must be a state name or a list of state names")
+        if states == []:
+            # As on the what-if page, leaving states out means every state.
+            raise BadRequest("states must not be empty; leave it out to select every state")
+        try:
+            target_rates = builder(baseline_df, values, states)
+        except ValueError as error:
+            raise BadRequest(str(error))
+        labels = [f"{kind}={value:g}" for value in values]
+
+    if not 0 < len(target_rates) <= MAX_SCENARIOS:
+        raise BadRequest(f"between 1 and {MAX_SCENARIOS} scenarios are allowed")
+    return target_rates, labels
+
+
+def _query_string_parameters(query_params):
+    # Repeated or comma-separated values: ?percentile=50,75&states=Bihar&states=Assam
+    return {name: [value for item in query_params.getlist(name) for value in item.split(",")]
+            for name in query_params.keys()}
+
+
+def simulation_results(version, baseline_df, target_rates, labels):
+    """
+    The response body of a simulation: the national summary of every scenario, and the
+    per-state results when a single scenario was requested.
+    """
+    summary_df = scenario_summary(baseline_df, target_rates, labels)
+    body = {"data_version": version, "scenarios": json.loads(summary_df.to_json(orient="records"))}
+    if len(target_rates) == 1:
+        body["states"] = json.loads(state_results(baseline_df, target_rates[0]).to_json(orient="records"))
+    return body
+
+
+async def simulate_insurance(request):
+    try:
+        version = await run_in_threadpool(_data_version)
+        if request.method == "POST":
+            try:
+                params = await request.json()
+            except ValueError:
+                raise BadRequest("the request body must be JSON")
+            if not isinstance(params, dict):
+                raise BadRequest("the request body must be a JSON object")
+        else:
+            params = _query_string_parameters(request.query_params)
+        baseline_df = await run_in_threadpool(_insurance_baselines, version)
+        target_rates, labels = build_scenarios(baseline_df, params)
+    except BadRequest as error:
+        return JSONResponse({"error": str(error)}, status_code=400)
+
+    body = await run_in_threadpool(simulation_results, version, baseline_df, target_rates, labels)
+    return JSONResponse(body, headers={"X-Data-Version": str(version)})
+
+
+CATALOGUE = build_catalogue()
+
+app = Starlette(routes=[
+    Route("/queries", list_queries, methods=["GET"]),
+    Route("/queries/{name}", run_query, methods=["GET"]),
+    Route("/simulations/insurance", simulate_insurance, methods=["GET", "POST"]),
+])
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host=os.getenv("API_HOST", "127.0.0.1"), port=int(os.getenv("API_PORT", "8000")))
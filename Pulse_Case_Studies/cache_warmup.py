@@ -0,0 +1,157 @@
+"""
+cache_warmup.py
+
+This module pre-warms the dashboard caches of a Streamlit worker, so the first
+analyst to open a page after a reload or a worker restart does not pay the cold cost
+of every query.
+
+PAGE_QUERIES declares the cached queries each page runs on load. warm_caches runs all
+of them, the default district drill-down of 4_Market_Expansion.py for every state
+and the district GeoJSON shards on a thread pool, directly into the query_cache
+entries of one data version. start_cache_warmer runs warm_caches in a background
+thread when the worker boots (query_cache starts it on import), and again whenever a
+new data version is published. Warm-up timings are logged, including how long the
+boot warm-up took.
+"""
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from streamlit.logger import get_logger
+
+from db_connection import get_data_version, writer_engine
+
+logger = get_logger(__name__)
+
+WARMUP_JOBS = int(os.getenv("CACHE_WARMUP_JOBS", "8"))
+# Set CACHE_WARMUP=0 to disable the background warmer (e.g. for headless renders).
+WARMUP_ENABLED = os.getenv("CACHE_WARMUP", "1") != "0"
+VERSION_POLL_INTERVAL = 30
+
+# Queries each page runs through query_cache.cached_query(query, engine) on load.
+PAGE_QUERIES = {
+    "Phonepe_Analytics.py": [
+        "data_queries.get_transaction_slices",
+    ],
+    "1_Transaction_Dynamics.py": [
+        "data_queries.get_transaction_slices",
+        "data_queries.get_district_transaction_slices",
+    ],
+    "2_Device_Dominance.py": [
+        "data_queries.get_transaction_slices",
+        "data_queries.get_user_slices",
+        "data_queries.get_district_user_slices",
+        "data_queries.get_region_brand_preference",
+        "data_queries.get_underperforming_brands",
+        "data_queries.get_engagement_metro_vs_nonmetro",
+    ],
+    "3_Insurance_Penetration.py": [
+        "data_queries.get_transaction_slices",
+        "data_queries.get_state_user_slices",
+        "data_queries.get_insurance_slices",
+    ],
+    "4_Market_Expansion.py": [
+        "data_queries.get_transaction_slices",
+        "data_queries.get_top5_states_dominance",
+        "data_queries.get_concentration_metrics",
+        "data_queries.get_lorenz_curves",
+        "data_queries.get_underperforming_growth_states",
+        "data_queries.get_market_status",
+    ],
+    "5_User_Engagement.py": [
+        "data_queries.get_transaction_slices",
+        "data_queries.get_state_user_slices",
+        "data_queries.get_district_user_slices",
+        "data_queries.get_dormant_user_regions",
+        "data_queries.get_growth_states_by_engagement",
+        "data_queries.get_target_districts_low_engagement",
+        "data_queries.get_insurance_slices",
+        "data_queries.get_district_transaction_slices",
+    ],
+    "7_Insurance_What_If.py": [
+        "data_queries.get_transaction_slices",
+        "data_queries.get_state_user_slices",
+        "data_queries.get_insurance_slices",
+    ],
+}
+
+
+def declared_queries():
+    """
+    Every query declared in PAGE_QUERIES, once, in page order.
+    """
+    return list(dict.fromkeys(query for queries in PAGE_QUERIES.values() for query in queries))
+
+
+def _timed(name, function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return name, time.perf_counter() - start
+
+
+def warm_caches(engine, version=None, jobs=WARMUP_JOBS):
+    """
+    Populate the query cache of this process for version (default: the live data
+    version) with every declared page query, then the district drill-down data and
+    GeoJSON of every state for the period 4_Market_Expansion.py opens on.
+
+    Returns:
+    list of (task, seconds), slowest first
+    """
+    from query_cache import _run_query
+    from geo_shards import load_state_districts
+
+    if version is None:
+        version = get_data_version(writer_engine(engine))
+
+    def run(query, *args):
+        module_name, query_name = query.rsplit(".", 1)
+        return _run_query(module_name, query_name, version, engine, *args)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        timings = list(pool.map(lambda query: _timed(query, run, query), declared_queries()))
+
+        # The drill-down opens on the latest year with no quarter selected.
+        slices_df = run("data_queries.get_transaction_slices")
+        latest_year = int(slices_df["Year"].max())
+        states = sorted(slices_df["State"].unique())
+        drill = [pool.submit(_timed, f"district map {state}", run, "district_queries.get_district_map_data",
+                             state, latest_year, None) for state in states]
+        drill += [pool.submit(_timed, f"district GeoJSON {state}", load_state_districts, state) for state in states]
+        timings += [future.result() for future in drill]
+
+    timings.sort(key=lambda timing: timing[1], reverse=True)
+    logger.info("Cache warm-up for data version %s: %d tasks in %.2f s (slowest: %s)", version, len(timings),
+                time.perf_counter() - start, ", ".join(f"{task} {seconds:.2f} s" for task, seconds in timings[:3]))
+    return timings
+
+
+def _warm_loop(engine, started):
+    warmed = None
+    while True:
+        try:
+            version = get_data_version(writer_engine(engine))
+            if version != warmed:
+                warm_caches(engine, version)
+                if warmed is None:
+                    logger.info("Boot cache warm-up finished %.2f s after the warmer started",
+                                time.perf_counter() - started)
+                warmed = version
+        except Exception:
+            logger.exception("Cache warm-up failed")
+        time.sleep(VERSION_POLL_INTERVAL)
+
+
+def start_cache_warmer(engine):
+    """
+    Start the background warmer thread of this process, unless CACHE_WARMUP=0.
+    It warms the caches at once and again after every newly published data version.
+    """
+    if not WARMUP_ENABLED:
+        return None
+    thread = threading.Thread(target=_warm_loop, args=(engine, time.perf_counter()), name="cache-warmer",
+                              daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,97 @@
+"""
+concentration.py
+
+This module measures how concentrated a quantity is across the entities of a group,
+for example transaction value across states in each quarter:
+
+- top-N share: share of the total held by the N largest entities;
+- HHI: Herfindahl-Hirschman index, the sum of squared percentage shares (0-10000);
+- Gini coefficient, and the Lorenz curve it summarises.
+
+Every group is handled in the same pass: the rows are sorted once by group and value,
+and all metrics come from one cumulative sum over the sorted values, with group
+boundaries handled by offsets rather than a Python loop per group.
+"""
+import numpy as np
+import pandas as pd
+
+TOP_N = (1, 5, 10)
+
+
+def _sorted_cumulative(df, group_columns, value_column):
+    """
+    Sort df by group and ascending value and take the running total within each group.
+
+    Returns:
+    dict of arrays: order (row positions of df in sorted order), values, cumulative,
+    position (1-based ascending rank), counts and totals (per row), starts and sizes
+    (per group)
+    """
+    groups = df.groupby(group_columns, sort=True).ngroup().to_numpy()
+    values = np.nan_to_num(df[value_column].to_numpy(dtype=float).clip(min=0))
+    order = np.lexsort((values, groups))
+    groups, values = groups[order], values[order]
+
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]]) if len(groups) else np.array([], dtype=int)
+    sizes = np.diff(np.r_[starts, len(groups)])
+    running = np.cumsum(values)
+    before = np.r_[0.0, running][starts]
+    cumulative = running - np.repeat(before, sizes)
+    totals = cumulative[starts + sizes - 1] if len(starts) else np.array([])
+    position = np.arange(len(groups)) - np.repeat(starts, sizes) + 1
+    return {
+        "order": order, "values": values, "cumulative": cumulative, "position": position,
+        "counts": np.repeat(sizes, sizes), "totals": np.repeat(totals, sizes),
+        "starts": starts, "sizes": sizes, "group_totals": totals,
+    }
+
+
+def concentration_metrics(df, group_columns, value_column, entity_column, top_n=TOP_N):
+    """
+    Concentration of value_column across the entity_column values of every group.
+
+    Returns:
+    pandas.DataFrame with one row per group: the group columns, Entities, Total,
+    Top_<N>_share_pct for each N in top_n, HHI, Gini and Top_entity
+    """
+    if df.empty:
+        return pd.DataFrame(columns=group_columns + ["Entities", "Total"] +
+                            [f"Top_{n}_share_pct" for n in top_n] + ["HHI", "Gini", "Top_entity"])
+    s = _sorted_cumulative(df, group_columns, value_column)
+    starts, sizes, totals = s["starts"], s["sizes"], s["group_totals"]
+    safe_totals = np.where(totals > 0, totals, np.nan)
+    last = starts + sizes - 1
+
+    result = df.iloc[s["order"][last]][group_columns].reset_index(drop=True)
+    result["Entities"] = sizes
+    result["Total"] = totals
+
+    for n in top_n:
+        # The top n hold everything above the bottom (size - n) entities.
+        bottom = np.where(sizes > n, s["cumulative"][np.maximum(last - n, 0)], 0.0)
+        result[f"Top_{n}_share_pct"] = ((1 - bottom / safe_totals) * 100).round(2)
+
+    shares = s["values"] / np.where(s["totals"] > 0, s["totals"], np.nan)
+    result["HHI"] = (np.add.reduceat(np.nan_to_num(shares) ** 2, starts) * 10000).round(1)
+    # Gini from the ascending ranks: 2 * sum(i * x_i) / (n * total) - (n + 1) / n
+    weighted = np.add.reduceat(s["position"] * s["values"], starts)
+    result["Gini"] = (2 * weighted / (sizes * safe_totals) - (sizes + 1) / sizes).round(4)
+    result["Top_entity"] = df[entity_column].to_numpy()[s["order"][last]]
+    return result
+
+
+def lorenz_curves(df, group_columns, value_column):
+    """
+    Lorenz curve points of every group: the share of entities (smallest first) against
+    the share of the total they hold, starting at (0, 0).
+
+    Returns:
+    pandas.DataFrame with columns [*group_columns, Population_share, Value_share]
+    """
+    s = _sorted_cumulative(df, group_columns, value_column)
+    keys = df.iloc[s["order"]][group_columns].reset_index(drop=True)
+    points = keys.assign(Population_share=s["position"] / s["counts"],
+                         Value_share=s["cumulative"] / np.where(s["totals"] > 0, s["totals"], np.nan))
+    origins = keys.iloc[s["starts"]].assign(Population_share=0.0, Value_share=0.0)
+    return (pd.concat([origins, points], ignore_index=True)
+            .sort_values(group_columns + ["Population_share"], kind="stable", ignore_index=True))
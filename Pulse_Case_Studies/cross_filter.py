@@ -0,0 +1,124 @@
+"""
+cross_filter.py
+
+This module links the charts of a dashboard page: selecting states or categories in
+one chart (a click, shift-click, box or lasso) filters the other linked charts of the
+page.
+
+    xf = CrossFilter("transaction_dynamics")
+    xf.link("top_states", "State", field="y")
+    xf.link("categories", "Transaction_type", field="customdata")
+    ...
+    top_states_df = xf.filter(slices_df, exclude="top_states")
+    xf.plotly_chart("top_states", fig)
+
+Linked charts are drawn with on_select="rerun". Streamlit keeps each chart's selection
+in st.session_state under the chart key, so at the top of the rerun every selection on
+the page is known before any chart is drawn. filter() only filters frames already in
+memory (the page's cached slice frames), so a selection change never queries the
+database. A chart is not filtered by its own selection, so it keeps showing the
+choices it offers: filter() takes the chart (or group) to leave out.
+"""
+import time
+import streamlit as st
+
+SELECTION_MODES = ("points", "box", "lasso")
+
+
+class CrossFilter:
+    """
+    The linked selections of one page.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.links = {}
+        self.started = time.perf_counter()
+        # Clearing bumps the generation, which gives every linked chart a new key and
+        # so an empty selection.
+        self._generation = st.session_state.setdefault(f"{name}_generation", 0)
+
+    def _key(self, chart):
+        return f"{self.name}_{chart}_{self._generation}"
+
+    def link(self, chart, dimension, field="y", mapping=None, group=None):
+        """
+        Declare a linked chart: its selected points select values of the dimension
+        column, read from the point's field ("x", "y", "location", "customdata" for the
+        first custom_data column, ...). mapping translates point values to dimension
+        values, e.g. the choropleth Geo_name to State. Charts in the same group (e.g. a
+        value and a volume chart of the same states) share one selection.
+        """
+        self.links[chart] = (dimension, field, mapping, group or chart)
+        return self
+
+    def selected(self, chart):
+        """
+        The dimension values selected in one linked chart (empty when nothing is selected).
+        """
+        dimension, field, mapping, _ = self.links[chart]
+        state = st.session_state.get(self._key(chart))
+        points = state["selection"]["points"] if state else []
+        values = set()
+        for point in points:
+            value = point.get(field)
+            if field == "customdata" and isinstance(value, (list, tuple)):
+                value = value[0] if value else None
+            if mapping is not None:
+                value = mapping.get(value)
+            if value is not None:
+                values.add(value)
+        return values
+
+    def selections(self, exclude=None):
+        """
+        Selected values of every group of linked charts except exclude (a chart or
+        group name); the charts of a group add up to one selection.
+
+        Returns:
+        dict of group -> (dimension, set of values)
+        """
+        selections = {}
+        for chart, (dimension, _, _, group) in self.links.items():
+            values = self.selected(chart) if exclude not in (chart, group) else set()
+            if values:
+                selections[group] = (dimension, selections.get(group, (dimension, set()))[1] | values)
+        return selections
+
+    def filter(self, df, exclude=None):
+        """
+        Rows of df matching the selections of every linked chart except exclude (a
+        chart or group name). Selections on columns df does not have are ignored.
+        """
+        for dimension, values in self.selections(exclude).values():
+            if dimension in df.columns:
+                df = df[df[dimension].isin(values)]
+        return df
+
+    def plotly_chart(self, chart, fig, selection_mode=SELECTION_MODES, **kwargs):
+        """
+        Draw a linked chart; returns the selection event like st.plotly_chart.
+        """
+        return st.plotly_chart(fig, key=self._key(chart), on_select="rerun", selection_mode=selection_mode, **kwargs)
+
+    def clear(self):
+        st.session_state[f"{self.name}_generation"] = self._generation + 1
+
+    def controls(self):
+        """
+        Show the active selections and a button clearing them in the sidebar.
+        """
+        selections = self.selections()
+        if not selections:
+            return
+        st.sidebar.subheader("Linked selection")
+        for dimension, values in selections.values():
+            st.sidebar.caption(f"{dimension.replace('_', ' ')}: {', '.join(sorted(map(str, values)))}")
+        st.sidebar.button("Clear selection", on_click=self.clear, key=f"{self.name}_clear")
+
+    def elapsed_ms(self):
+        """
+        Milliseconds since the page's cross-filter was created, i.e. the time taken to
+        filter and redraw the linked charts so far.
+        """
+        return (time.perf_counter() - self.started) * 1000
@@ -0,0 +1,459 @@
+"""
+data_extraction.py
+
+This module walks the PhonePe Pulse data tree and builds the six dataframes that are
+loaded into the database (agg_transaction, map_transaction, top_transaction,
+insurance_transaction, agg_user, map_user).
+
+Files are read as bytes and parsed with the fastest JSON backend available
+(simdjson, orjson, then the stdlib json module). Only the subtrees of "data" that a
+dataset needs are pulled out of each document.
+
+The source can be an unpacked Pulse checkout, a zip or tar archive of the repository
+read without unpacking, or a single pack file built once with build_pack.
+"""
+import os
+import json
+import time
+import struct
+import tarfile
+import zipfile
+import pandas as pd
+from dotenv import load_dotenv
+
+
+#JSON parser backends
+
+
+def _stdlib_extract(raw, keys):
+    data = json.loads(raw)["data"]
+    return {key: data.get(key) for key in keys}
+
+
+def _make_orjson_extract():
+    import orjson
+
+    def extract(raw, keys):
+        data = orjson.loads(raw)["data"]
+        return {key: data.get(key) for key in keys}
+
+    return extract
+
+
+def _make_simdjson_extract():
+    import simdjson
+
+    parser = simdjson.Parser()
+
+    def extract(raw, keys):
+        # The parser reuses its buffer, so every subtree is converted to plain
+        # Python objects before the next document is parsed.
+        data = parser.parse(raw)["data"]
+        subtrees = {}
+        for key in keys:
+            node = data.get(key)
+            if isinstance(node, simdjson.Object):
+                node = node.as_dict()
+            elif isinstance(node, simdjson.Array):
+                node = node.as_list()
+            subtrees[key] = node
+        return subtrees
+
+    return extract
+
+
+JSON_BACKENDS = {
+    "simdjson": _make_simdjson_extract,
+    "orjson": _make_orjson_extract,
+    "json": lambda: _stdlib_extract,
+}
+
+DEFAULT_BACKEND_ORDER = ("simdjson", "orjson", "json")
+
+
+def get_json_backend(name=None):
+    """
+    Return (backend_name, extract) for the requested JSON backend.
+
+    extract(raw, keys) parses the bytes of one Pulse file and returns a dict with the
+    requested subtrees of its "data" object. When name is None the PULSE_JSON_PARSER
+    environment variable is used, otherwise the first installed backend from
+    DEFAULT_BACKEND_ORDER. Missing parsers fall back to the stdlib json module.
+    """
+    name = name or os.getenv("PULSE_JSON_PARSER")
+    candidates = (name,) if name else DEFAULT_BACKEND_ORDER
+    for candidate in candidates:
+        if candidate not in JSON_BACKENDS:
+            raise ValueError(f"Unknown JSON backend '{candidate}', choose from {list(JSON_BACKENDS)}")
+        try:
+            return candidate, JSON_BACKENDS[candidate]()
+        except ImportError:
+            continue
+    return "json", _stdlib_extract
+
+
+def read_bytes(path):
+    """
+    Read a whole file as bytes and close the handle before returning.
+    """
+    with open(path, "rb") as f:
+        return f.read()
+
+
+#Row builders, one per dataset
+
+
+def _agg_transaction_rows(state, year, quarter, subtrees, rows):
+    for category in subtrees["transactionData"] or []:
+        instrument = category["paymentInstruments"][0]
+        rows["State"].append(state)
+        rows["Year"].append(year)
+        rows["Quarter"].append(quarter)
+        rows["Transaction_type"].append(category["name"])
+        rows["Transaction_count"].append(instrument["count"])
+        rows["Transaction_amount"].append(instrument["amount"])
+
+
+def _map_transaction_rows(state, year, quarter, subtrees, rows):
+    for district in subtrees["hoverDataList"] or []:
+        metric = district["metric"][0]
+        rows["State"].append(state)
+        rows["Year"].append(year)
+        rows["Quarter"].append(quarter)
+        rows["District_name"].append(district["name"])
+        rows["Transaction_count"].append(metric["count"])
+        rows["Transaction_amount"].append(metric["amount"])
+
+
+def _top_transaction_rows(state, year, quarter, subtrees, rows):
+    for entity_type in ("states", "districts", "pincodes"):
+        for record in subtrees[entity_type] or []:
+            rows["State"].append(state)
+            rows["Year"].append(year)
+            rows["Quarter"].append(quarter)
+            rows["Entity_type"].append(entity_type[:-1])
+            rows["Entity_name"].append(record["entityName"])
+            rows["Transaction_count"].append(record["metric"]["count"])
+            rows["Transaction_amount"].append(record["metric"]["amount"])
+
+
+def _insurance_transaction_rows(state, year, quarter, subtrees, rows):
+    for category in subtrees["transactionData"] or []:
+        instrument = category["paymentInstruments"][0]
+        rows["State"].append(state)
+        rows["Year"].append(year)
+        rows["Quarter"].append(quarter)
+        rows["Insurance_txn_count"].append(instrument["count"])
+        rows["Insurance_txn_amount"].append(instrument["amount"])
+
+
+def _agg_user_rows(state, year, quarter, subtrees, rows):
+    aggregated = subtrees["aggregated"]
+    for device in subtrees["usersByDevice"] or []:
+        rows["State"].append(state)
+        rows["Year"].append(year)
+        rows["Quarter"].append(quarter)
+        rows["Registered_users"].append(aggregated["registeredUsers"])
+        rows["App_opens"].append(aggregated["appOpens"])
+        rows["Brand"].append(device["brand"])
+        rows["Brand_count"].append(device["count"])
+        rows["Brand_percentage"].append(device["percentage"])
+
+
+def _map_user_rows(state, year, quarter, subtrees, rows):
+    for district, values in (subtrees["hoverData"] or {}).items():
+        rows["State"].append(state)
+        rows["Year"].append(year)
+        rows["Quarter"].append(quarter)
+        rows["District"].append(district)
+        rows["Registered_users"].append(values["registeredUsers"])
+        rows["App_opens"].append(values["appOpens"])
+
+
+#Dataset catalogue: relative path, subtrees of "data", output columns, row builder
+
+
+DATASETS = {
+    "agg_transaction": {
+        "path": "aggregated/transaction/country/india/state",
+        "subtrees": ("transactionData",),
+        "columns": ["State", "Year", "Quarter", "Transaction_type", "Transaction_count", "Transaction_amount"],
+        "rows": _agg_transaction_rows,
+    },
+    "map_transaction": {
+        "path": "map/transaction/hover/country/india/state",
+        "subtrees": ("hoverDataList",),
+        "columns": ["State", "Year", "Quarter", "District_name", "Transaction_count", "Transaction_amount"],
+        "rows": _map_transaction_rows,
+    },
+    "top_transaction": {
+        "path": "top/transaction/country/india/state",
+        "subtrees": ("states", "districts", "pincodes"),
+        "columns": ["State", "Year", "Quarter", "Entity_type", "Entity_name", "Transaction_count", "Transaction_amount"],
+        "rows": _top_transaction_rows,
+    },
+    "insurance_transaction": {
+        "path": "aggregated/insurance/country/india/state",
+        "subtrees": ("transactionData",),
+        "columns": ["State", "Year", "Quarter", "Insurance_txn_count", "Insurance_txn_amount"],
+        "rows": _insurance_transaction_rows,
+    },
+    "agg_user": {
+        "path": "aggregated/user/country/india/state",
+        "subtrees": ("aggregated", "usersByDevice"),
+        "columns": ["State", "Year", "Quarter", "Registered_users", "App_opens", "Brand", "Brand_count", "Brand_percentage"],
+        "rows": _agg_user_rows,
+    },
+    "map_user": {
+        "path": "map/user/hover/country/india/state",
+        "subtrees": ("hoverData",),
+        "columns": ["State", "Year", "Quarter", "District", "Registered_users", "App_opens"],
+        "rows": _map_user_rows,
+    },
+}
+
+
+#Pulse sources: an unpacked checkout, a zip/tar archive of it, or a pack file
+
+
+PACK_MAGIC = b"PULSEPK1"
+_PACK_HEADER = struct.Struct(">IQ")
+
+
+def get_data_root():
+    """
+    Return the Pulse source configured by PULSE_DATA_ROOT (.env supported).
+
+    The value may point at the Pulse checkout, its "data" folder, a zip or tar archive
+    of the repository, or a pack file written by build_pack.
+    """
+    load_dotenv()
+    return os.getenv("PULSE_DATA_ROOT", os.path.join("pulse", "data"))
+
+
+def _data_relative(name):
+    name = name.replace("\\", "/")
+    if name.startswith("data/"):
+        return name[len("data/"):]
+    index = name.find("/data/")
+    return name[index + len("/data/"):] if index >= 0 else None
+
+
+def _source_kind(source):
+    if os.path.isdir(source):
+        return "dir"
+    if zipfile.is_zipfile(source):
+        return "zip"
+    with open(source, "rb") as f:
+        if f.read(len(PACK_MAGIC)) == PACK_MAGIC:
+            return "pack"
+    if tarfile.is_tarfile(source):
+        return "tar"
+    raise ValueError(f"{source} is not a Pulse directory, zip/tar archive or pack file")
+
+
+def _iter_dir(source, prefixes):
+    if os.path.isdir(os.path.join(source, "data")):
+        source = os.path.join(source, "data")
+    for prefix in prefixes:
+        for dirpath, dirnames, filenames in os.walk(os.path.join(source, prefix)):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if filename.endswith(".json"):
+                    path = os.path.join(dirpath, filename)
+                    yield os.path.relpath(path, source).replace(os.sep, "/"), read_bytes(path)
+
+
+def _iter_zip(source, prefixes):
+    with zipfile.ZipFile(source) as archive:
+        # Members are read in the order they are stored so the archive is scanned sequentially.
+        for info in sorted(archive.infolist(), key=lambda i: i.header_offset):
+            relative = _data_relative(info.filename)
+            if relative and relative.endswith(".json") and relative.startswith(prefixes):
+                yield relative, archive.read(info)
+
+
+def _iter_tar(source, prefixes):
+    with tarfile.open(source, "r|*") as archive:
+        for member in archive:
+            relative = _data_relative(member.name)
+            if member.isfile() and relative and relative.endswith(".json") and relative.startswith(prefixes):
+                yield relative, archive.extractfile(member).read()
+
+
+def _iter_pack(source, prefixes):
+    with open(source, "rb", buffering=1 << 20) as f:
+        f.read(len(PACK_MAGIC))
+        while True:
+            header = f.read(_PACK_HEADER.size)
+            if not header:
+                break
+            name_length, data_length = _PACK_HEADER.unpack(header)
+            relative = f.read(name_length).decode("utf-8")
+            if relative.startswith(prefixes):
+                yield relative, f.read(data_length)
+            else:
+                f.seek(data_length, os.SEEK_CUR)
+
+
+_SOURCE_READERS = {"dir": _iter_dir, "zip": _iter_zip, "tar": _iter_tar, "pack": _iter_pack}
+
+
+def iter_source_files(source, prefixes=("",)):
+    """
+    Yield (relative_path, raw_bytes) for every JSON file of a Pulse source whose path
+    relative to the "data" folder starts with one of prefixes.
+    """
+    return _SOURCE_READERS[_source_kind(source)](source, tuple(prefixes))
+
+
+def build_pack(source, pack_path):
+    """
+    Copy every dataset file of a Pulse source into a single pack file.
+
+    The pack stores length-prefixed (path, bytes) records back to back, so later
+    extractions read one file sequentially instead of opening ~50k small files.
+
+    Returns:
+    int, the number of files written
+    """
+    prefixes = [spec["path"] + "/" for spec in DATASETS.values()]
+    temp_path = pack_path + ".tmp"
+    count = 0
+    with open(temp_path, "wb", buffering=1 << 20) as f:
+        f.write(PACK_MAGIC)
+        for relative, raw in iter_source_files(source, prefixes):
+            name = relative.encode("utf-8")
+            f.write(_PACK_HEADER.pack(len(name), len(raw)))
+            f.write(name)
+            f.write(raw)
+            count += 1
+    os.replace(temp_path, pack_path)
+    return count
+
+
+def _locate(relative):
+    for dataset, spec in DATASETS.items():
+        base = spec["path"] + "/"
+        if relative.startswith(base):
+            parts = relative[len(base):].split("/")
+            if len(parts) == 3 and parts[2].endswith(".json"):
+                return dataset, parts[0], parts[1], int(parts[2][:-len(".json")])
+    return None
+
+
+def iter_dataset_files(source, datasets):
+    """
+    Yield (dataset, state, year, quarter, raw_bytes) for every quarter file of the
+    given datasets, reading the source in a single pass.
+    """
+    prefixes = [DATASETS[dataset]["path"] + "/" for dataset in datasets]
+    for relative, raw in iter_source_files(source, prefixes):
+        located = _locate(relative)
+        if located and located[0] in datasets:
+            yield located + (raw,)
+
+
+def clean_dataset(dataset, df):
+    """
+    Apply the type casts and name normalisation used for each table before loading.
+    """
+    if df.empty:
+        # Nothing to normalise, e.g. an incremental extract with no new quarters.
+        return df
+    df["Year"] = df["Year"].astype(int)
+    df["State"] = df["State"].str.replace("-", " ").str.title()
+
+    if dataset == "map_transaction":
+        df["District_name"] = df["District_name"].str.title()
+    elif dataset == "top_transaction":
+        df["Entity_name"] = df["Entity_name"].fillna("Unknown")
+        df["Entity_type"] = df["Entity_type"].str.title()
+        df["Entity_name"] = df["Entity_name"].str.title()
+    elif dataset == "map_user":
+        df["District"] = df["District"].str.title()
+    return df
+
+
+def extract_datasets(source, datasets=None, backend=None, clean=True, since=None):
+    """
+    Build the dataframes for several datasets in one pass over the source, keyed by
+    table name. Frames are cleaned with clean_dataset unless clean is False. With
+    since=(year, quarter), only the quarters after it are parsed.
+    """
+    datasets = list(datasets or DATASETS)
+    _, extract = get_json_backend(backend)
+    rows = {dataset: {column: [] for column in DATASETS[dataset]["columns"]} for dataset in datasets}
+
+    for dataset, state, year, quarter, raw in iter_dataset_files(source, datasets):
+        if since is not None and (int(year), quarter) <= tuple(since):
+            continue
+        spec = DATASETS[dataset]
+        spec["rows"](state, year, quarter, extract(raw, spec["subtrees"]), rows[dataset])
+
+    # Archives yield files in storage order; sorting keeps the output identical to a
+    # directory walk whatever the source.
+    frames = {
+        dataset: pd.DataFrame(rows[dataset]).sort_values(["State", "Year", "Quarter"], kind="stable", ignore_index=True)
+        for dataset in datasets
+    }
+    if clean:
+        frames = {dataset: clean_dataset(dataset, df) for dataset, df in frames.items()}
+    return frames
+
+
+def extract_dataset(source, dataset, backend=None, clean=True, since=None):
+    """
+    Build the dataframe for one dataset, cleaned with clean_dataset unless clean is False.
+
+    Returns:
+    pandas.DataFrame with the columns listed in DATASETS[dataset]["columns"]
+    """
+    return extract_datasets(source, [dataset], backend, clean, since)[dataset]
+
+
+def extract_all(source, backend=None):
+    """
+    Build the cleaned dataframes for every dataset, keyed by table name.
+    """
+    return extract_datasets(source, backend=backend)
+
+
+def benchmark_parsers(source, datasets=None, backends=None):
+    """
+    Measure parse throughput of each installed JSON backend on every dataset.
+
+    File contents are read into memory first so the timings cover parsing and subtree
+    extraction only.
+
+    Returns:
+    pandas.DataFrame with columns [Dataset, Backend, Files, MB, Seconds, Files_per_sec, MB_per_sec]
+    """
+    datasets = datasets or list(DATASETS)
+    backends = backends or list(DEFAULT_BACKEND_ORDER)
+    results = []
+
+    for dataset in datasets:
+        keys = DATASETS[dataset]["subtrees"]
+        blobs = [raw for *_, raw in iter_dataset_files(source, [dataset])]
+        size_mb = sum(len(blob) for blob in blobs) / 1e6
+
+        for name in backends:
+            resolved, extract = get_json_backend(name)
+            if resolved != name:
+                continue
+            start = time.perf_counter()
+            for blob in blobs:
+                extract(blob, keys)
+            seconds = time.perf_counter() - start
+            results.append({
+                "Dataset": dataset,
+                "Backend": name,
+                "Files": len(blobs),
+                "MB": round(size_mb, 2),
+                "Seconds": round(seconds, 4),
+                "Files_per_sec": round(len(blobs) / seconds, 1) if seconds else None,
+                "MB_per_sec": round(size_mb / seconds, 2) if seconds else None,
+            })
+
+    return pd.DataFrame(results)
@@ -0,0 +1,329 @@
+"""
+data_loader.py
+
+This module loads the dataframes built by data_extraction into the database and runs
+the derived stages that follow each load (dimensions, growth metrics, lookup indexes).
+All functions expect an SQLAlchemy engine object for the database connection.
+
+load_all is blue/green: every table of a load is written, indexed and rolled up under
+a versioned shadow name (agg_transaction__v7), then all shadow tables are renamed
+over the live ones in one statement and the new data version is published in
+pulse_data_version. Dashboards never see a missing or half-loaded table, and caches
+key on the data version.
+
+load_incremental appends a new quarter instead: its rows go into the live tables, its
+sums are folded into the growth tables and the version is published in one
+transaction, so loaded history is neither rewritten nor reindexed.
+"""
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from sqlalchemy import text, inspect
+
+from db_connection import DATA_VERSION_TABLE, get_data_version
+from dimensions import build_dimensions, extend_dimensions
+from data_validation import check_frames, check_keys
+from growth_metrics import build_growth_metrics, update_growth_metrics
+
+# to_sql creates string columns as TEXT, so MySQL needs a prefix length on them.
+GROWTH_INDEXES = {
+    "growth_quarterly": {
+        "idx_growth_quarterly_lookup": "Level(16), State(64), Year, Quarter",
+    },
+    "growth_yearly": {
+        "idx_growth_yearly_lookup": "Level(16), Is_latest_year, State(64)",
+        "idx_growth_yearly_period": "Level(16), Year",
+    },
+}
+
+DIMENSION_INDEXES = {
+    "dim_state": {
+        "idx_dim_state_id": "State_id",
+    },
+    "dim_district": {
+        "idx_dim_district_id": "District_id",
+        "idx_dim_district_metro": "Is_metro, District_id",
+    },
+    "map_transaction": {
+        "idx_map_transaction_district_id": "District_id, Year, Quarter",
+    },
+    "map_user": {
+        "idx_map_user_district_id": "District_id, Year, Quarter",
+    },
+    "agg_transaction": {
+        "idx_agg_transaction_state_id": "State_id, Year, Quarter",
+    },
+    "insurance_transaction": {
+        "idx_insurance_transaction_state_id": "State_id, Year, Quarter",
+    },
+    "agg_user": {
+        "idx_agg_user_state_id": "State_id, Year, Quarter",
+    },
+}
+
+
+def shadow_name(table, version):
+    return f"{table}__v{version}"
+
+
+def create_indexes(engine, table_indexes, suffix=""):
+    """
+    Create the named indexes in table_indexes ({table: {index_name: columns}}) that do
+    not exist yet. suffix is appended to table and index names, to index the shadow
+    tables of a load. The TEXT prefix lengths are MySQL only and are dropped for other
+    databases.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table, indexes in table_indexes.items():
+            existing = {index["name"] for index in inspector.get_indexes(table + suffix)}
+            for name, columns in indexes.items():
+                if engine.dialect.name != "mysql":
+                    columns = re.sub(r"\(\d+\)", "", columns)
+                if name + suffix not in existing:
+                    conn.execute(text(f"CREATE INDEX {name + suffix} ON {table + suffix} ({columns});"))
+
+
+def load_tables(engine, frames, chunksize=10000, suffix="", jobs=1):
+    """
+    Write every dataframe in frames ({table: DataFrame}) to the database, replacing the
+    existing table. suffix is appended to the table names; with jobs > 1 tables are
+    written concurrently, each on its own connection.
+    """
+    def write(table):
+        frames[table].to_sql(name=table + suffix, con=engine, if_exists="replace", index=False, chunksize=chunksize)
+
+    if jobs <= 1:
+        for table in frames:
+            write(table)
+        return
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        list(pool.map(write, frames))
+
+
+def read_tables(engine, tables, after=None):
+    """
+    Read live tables back into dataframes without the surrogate key columns added by
+    the dimension stage. With after (a period index, Year * 4 + Quarter - 1), only the
+    quarters after it are read.
+    """
+    where = "" if after is None else f" WHERE Year * 4 + Quarter - 1 > {int(after)}"
+    return {
+        table: pd.read_sql(f"SELECT * FROM {table}{where}", engine).drop(columns=["State_id", "District_id"], errors="ignore")
+        for table in tables
+    }
+
+
+def latest_periods(engine, tables):
+    """
+    Period index of the latest quarter loaded into each of tables (None when empty).
+    """
+    with engine.connect() as conn:
+        return {table: conn.execute(text(f"SELECT MAX(Year * 4 + Quarter - 1) FROM {table};")).scalar()
+                for table in tables}
+
+
+def load_growth_metrics(engine, frames, suffix="", chunksize=10000):
+    """
+    Build growth_quarterly and growth_yearly from the agg_transaction and
+    map_transaction frames and load them with their lookup indexes.
+    """
+    growth_frames = build_growth_metrics(frames["agg_transaction"], frames["map_transaction"])
+    load_tables(engine, growth_frames, chunksize, suffix)
+    create_indexes(engine, GROWTH_INDEXES, suffix)
+    return growth_frames
+
+
+def append_growth_metrics(conn, previous, agg_transaction_df, map_transaction_df, chunksize=10000):
+    """
+    Fold the quarters of agg_transaction_df and map_transaction_df that are newer than
+    the live growth tables (previous, see read_growth_tables) into those tables on conn.
+    The new growth_quarterly rows are appended; in growth_yearly only the rows of the
+    years that received data are replaced and Is_latest_year is moved.
+
+    Returns:
+    list of the growth tables that changed
+    """
+    quarterly_df = previous["growth_quarterly"]
+    latest = int((quarterly_df["Year"] * 4 + quarterly_df["Quarter"] - 1).max())
+    updated = update_growth_metrics(previous, agg_transaction_df, map_transaction_df)
+    quarterly_df = updated["growth_quarterly"]
+    new_quarterly = quarterly_df[quarterly_df["Year"] * 4 + quarterly_df["Quarter"] - 1 > latest]
+    if new_quarterly.empty:
+        return []
+    first_year = int(new_quarterly["Year"].min())
+    yearly_df = updated["growth_yearly"]
+
+    new_quarterly.to_sql(name="growth_quarterly", con=conn, if_exists="append", index=False, chunksize=chunksize)
+    conn.execute(text("DELETE FROM growth_yearly WHERE Year >= :first_year;"), {"first_year": first_year})
+    yearly_df[yearly_df["Year"] >= first_year].to_sql(name="growth_yearly", con=conn, if_exists="append",
+                                                      index=False, chunksize=chunksize)
+    conn.execute(text("UPDATE growth_yearly SET Is_latest_year = 0 WHERE Year < :latest_year AND Is_latest_year = 1;"),
+                 {"latest_year": int(yearly_df["Year"].max())})
+    return list(GROWTH_INDEXES)
+
+
+#Data version
+
+
+def publish_data_version(engine, version, tables):
+    """
+    Record version as the live data version.
+    """
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {DATA_VERSION_TABLE} "
+            "(Version INTEGER NOT NULL, Loaded_at VARCHAR(32) NOT NULL, Tables TEXT NOT NULL);"))
+        record_data_version(conn, version, tables)
+
+
+def record_data_version(conn, version, tables):
+    """
+    Insert the version row on conn, inside the caller's transaction.
+    """
+    conn.execute(
+        text(f"INSERT INTO {DATA_VERSION_TABLE} (Version, Loaded_at, Tables) VALUES (:version, :loaded_at, :tables);"),
+        {"version": version, "loaded_at": time.strftime("%Y-%m-%d %H:%M:%S"), "tables": ",".join(sorted(tables))})
+
+
+def swap_tables(engine, tables, version):
+    """
+    Rename the shadow tables of version over the live tables. On MySQL this is a single
+    RENAME TABLE statement, which is atomic across all tables; other databases do the
+    renames in one transaction. The replaced tables are dropped afterwards.
+    """
+    existing = set(inspect(engine).get_table_names())
+    retired = [table + "__old" for table in tables if table in existing]
+    with engine.begin() as conn:
+        # Left behind by an interrupted swap.
+        for table in retired:
+            if table in existing:
+                conn.execute(text(f"DROP TABLE {table};"))
+
+    renames = []
+    for table in tables:
+        if table in existing:
+            renames.append((table, table + "__old"))
+        renames.append((shadow_name(table, version), table))
+
+    with engine.begin() as conn:
+        if engine.dialect.name == "mysql":
+            conn.execute(text("RENAME TABLE " + ", ".join(f"{old} TO {new}" for old, new in renames) + ";"))
+        else:
+            for old, new in renames:
+                conn.execute(text(f"ALTER TABLE {old} RENAME TO {new};"))
+
+    with engine.begin() as conn:
+        for table in retired:
+            conn.execute(text(f"DROP TABLE IF EXISTS {table};"))
+
+
+def read_growth_tables(engine):
+    """
+    The live growth tables, or None when they have not been built yet.
+    """
+    if not all(inspect(engine).has_table(table) for table in GROWTH_INDEXES):
+        return None
+    return read_tables(engine, list(GROWTH_INDEXES))
+
+
+def load_all(engine, frames, chunksize=10000, jobs=1, validate=True):
+    """
+    Load the extracted tables and run every derived stage into shadow tables, then
+    swap them in and publish the new data version. Unless validate is False the
+    frames first go through the validation gate, and nothing is written if it raises
+    ValidationError.
+
+    Returns:
+    int, the published data version
+    """
+    from district_queries import create_district_indexes
+
+    if validate:
+        check_frames(frames)
+    version = get_data_version(engine) + 1
+    suffix = shadow_name("", version)
+
+    frames = build_dimensions(frames)
+    if validate:
+        check_keys(frames)
+    load_tables(engine, frames, chunksize, suffix, jobs)
+    create_indexes(engine, DIMENSION_INDEXES, suffix)
+    growth_frames = load_growth_metrics(engine, frames, suffix, chunksize)
+    create_district_indexes(engine, suffix)
+
+    tables = list(frames) + list(growth_frames)
+    swap_tables(engine, tables, version)
+    publish_data_version(engine, version, tables)
+    return version
+
+
+def load_incremental(engine, frames, chunksize=10000, jobs=1, validate=True):
+    """
+    Append newly extracted quarters to the live tables. frames must only hold quarters
+    that are not loaded yet (see data_extraction.extract_datasets(since=...)); unless
+    validate is False, the validation gate rejects rows of quarters already loaded.
+
+    The new rows are keyed on the live dimensions (extended with any new state or
+    district) and appended to the live fact tables, their sums are folded into the
+    growth tables (append_growth_metrics) and the new data version is recorded, all in
+    one transaction: readers see the previous version or all of the new one. Before
+    the first load this is load_all.
+
+    Returns:
+    int, the published data version
+    """
+    version = get_data_version(engine) + 1
+    if version == 1:
+        return load_all(engine, frames, chunksize, jobs, validate=validate)
+    if validate:
+        check_frames(frames, loaded=latest_periods(engine, frames))
+
+    dim_state_df = pd.read_sql("SELECT * FROM dim_state", engine)
+    dim_district_df = pd.read_sql("SELECT * FROM dim_district", engine)
+    frames, new_dimensions = extend_dimensions(frames, dim_state_df, dim_district_df)
+    if validate:
+        check_keys(frames)
+    appended = {**new_dimensions, **{table: df for table, df in frames.items() if len(df)}}
+    previous_growth = read_growth_tables(engine)
+
+    with engine.begin() as conn:
+        for table, df in appended.items():
+            df.to_sql(name=table, con=conn, if_exists="append", index=False, chunksize=chunksize)
+        tables = list(appended)
+        if "agg_transaction" in frames and "map_transaction" in frames:
+            tables += append_growth_metrics(conn, previous_growth, frames["agg_transaction"],
+                                            frames["map_transaction"], chunksize)
+        record_data_version(conn, version, tables)
+    return version
+
+
+def refresh_rollups(engine, chunksize=10000, incremental=False):
+    """
+    Rebuild growth_quarterly and growth_yearly from the live agg_transaction and
+    map_transaction tables and swap them in as a new data version. With
+    incremental=True only the quarters missing from the live growth tables are read
+    and folded into them in place (append_growth_metrics).
+
+    Returns:
+    int, the published data version
+    """
+    version = get_data_version(engine) + 1
+    previous = read_growth_tables(engine) if incremental else None
+    if previous is not None:
+        quarterly_df = previous["growth_quarterly"]
+        latest = int((quarterly_df["Year"] * 4 + quarterly_df["Quarter"] - 1).max())
+        frames = read_tables(engine, ["agg_transaction", "map_transaction"], after=latest)
+        with engine.begin() as conn:
+            tables = append_growth_metrics(conn, previous, frames["agg_transaction"], frames["map_transaction"],
+                                           chunksize)
+            record_data_version(conn, version, tables)
+        return version
+
+    suffix = shadow_name("", version)
+    frames = read_tables(engine, ["agg_transaction", "map_transaction"])
+    growth_frames = load_growth_metrics(engine, frames, suffix, chunksize)
+    swap_tables(engine, list(growth_frames), version)
+    publish_data_version(engine, version, list(growth_frames))
+    return version
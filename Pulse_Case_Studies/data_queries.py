@@ -12,6 +12,9 @@ from sqlalchemy import text
 sys.path.append(os.path.abspath("D:/D26_Files/Phonepe_Analytics/Pulse_Case_Studies/"))
 
 from db_connection import get_phonepe_engine
+from concentration import concentration_metrics, lorenz_curves
+from segmentation import resolve_period, segment_districts, segment_states
+from insurance_simulator import state_baselines
 
 engine = get_phonepe_engine()
 
@@ -86,11 +89,12 @@ def get_top_contributing_states(engine):
     """
     query = """
         SELECT
-            State,
-            SUM(Transaction_count) AS Total_volume,
-            SUM(Transaction_amount) AS Total_value
-        FROM agg_transaction
-        GROUP BY State
+            s.State,
+            SUM(a.Transaction_count) AS Total_volume,
+            SUM(a.Transaction_amount) AS Total_value
+        FROM agg_transaction a
+        JOIN dim_state s ON s.State_id = a.State_id
+        GROUP BY a.State_id, s.State
         ORDER BY Total_value DESC
         LIMIT 10;
     """
@@ -103,10 +107,11 @@ def get_state_transaction_trends(engine):
     """
     query = """
         SELECT 
-            State,
-            SUM(Transaction_count) AS Total_Volume
-        FROM agg_transaction
-        GROUP BY State
+            s.State,
+            SUM(a.Transaction_count) AS Total_Volume
+        FROM agg_transaction a
+        JOIN dim_state s ON s.State_id = a.State_id
+        GROUP BY a.State_id, s.State
         ORDER BY Total_Volume ASC
         LIMIT 10;
     """
@@ -138,14 +143,17 @@ def get_top_district_user_engagement(engine):
     """
     query = """
         SELECT 
-            State,
-            District,
-            SUM(Registered_users) AS Total_users,
-            SUM(App_opens) AS Total_opens,
-            ROUND(SUM(App_opens) * 1.0 / SUM(Registered_users), 2) AS Engagement_score
-        FROM map_user
-        WHERE Registered_users > 0 AND Year = (SELECT MAX(Year) FROM map_user)
-        GROUP BY State, District
+            d.State,
+            d.District,
+            SUM(m.Registered_users) AS Total_users,
+            SUM(m.App_opens) AS Total_opens,
+            ROUND(SUM(m.App_opens) * 1.0 / SUM(m.Registered_users), 2) AS Engagement_score,
+            CASE WHEN d.Is_metro = 1 THEN 'Metro' ELSE 'Non-Metro' END AS Area_type,
+            d.Tier
+        FROM map_user m
+        JOIN dim_district d ON d.District_id = m.District_id
+        WHERE m.Registered_users > 0 AND m.Year = (SELECT MAX(Year) FROM map_user)
+        GROUP BY m.District_id, d.State, d.District, d.Is_metro, d.Tier
         ORDER BY Engagement_score DESC
         LIMIT 10;
     """
@@ -158,17 +166,18 @@ def get_region_brand_preference(engine):
     """
     query = """
         SELECT 
-            State,
-            Brand,
-            SUM(Brand_count) AS Total_users,
+            s.State,
+            u.Brand,
+            SUM(u.Brand_count) AS Total_users,
             CASE 
-                WHEN Brand IN ('Apple', 'OnePlus') THEN 'Premium'
-                WHEN Brand IN ('Xiaomi', 'Vivo', 'Samsung') THEN 'Budget'
+                WHEN u.Brand IN ('Apple', 'OnePlus') THEN 'Premium'
+                WHEN u.Brand IN ('Xiaomi', 'Vivo', 'Samsung') THEN 'Budget'
             END AS Brand_category     
-        FROM agg_user 
-        WHERE Brand IN ('Apple', 'OnePlus', 'Xiaomi', 'Vivo', 'Samsung') AND Year = (SELECT MAX(Year) FROM agg_user)
-        GROUP BY State, Brand, Brand_category
-        ORDER BY State, Total_users DESC;
+        FROM agg_user u
+        JOIN dim_state s ON s.State_id = u.State_id
+        WHERE u.Brand IN ('Apple', 'OnePlus', 'Xiaomi', 'Vivo', 'Samsung') AND u.Year = (SELECT MAX(Year) FROM agg_user)
+        GROUP BY u.State_id, s.State, u.Brand
+        ORDER BY s.State, Total_users DESC;
     """
     return pd.read_sql(query, engine)
 
@@ -182,7 +191,7 @@ def get_underperforming_brands(engine):
             Brand,
             SUM(Brand_count) AS Total_brand_users,
             AVG(Brand_percentage) AS Avg_market_share,
-            COUNT(DISTINCT State) AS States_present
+            COUNT(DISTINCT State_id) AS States_present
         FROM agg_user
         WHERE Year = (SELECT MAX(Year) FROM agg_user)
         GROUP BY Brand
@@ -194,21 +203,20 @@ def get_underperforming_brands(engine):
 def get_engagement_metro_vs_nonmetro(engine):
     """
     Fetch average registered users and engagement scores comparing major metropolitan and smaller districts.
+    Districts are classified by the Is_metro flag of dim_district (see district_classification.csv).
     """
     query = """
         SELECT 
-            State,
-            District,
-            ROUND(AVG(Registered_users), 0) AS Avg_users,
-            ROUND(AVG(App_opens * 1.0 / Registered_users), 2) AS Engagement_score,
-            CASE 
-                WHEN District IN ('Ahmedabad District', 'Bengaluru Urban District', 'Chennai District', 'Hyderabad District', 'Kolkata District', 'Mumbai District', 'Mumbai Suburban District', 'Pune District', 'Thane District', 'Gautam Buddha Nagar District', 'Ghaziabad District', 'Gurugram District', 'Faridabad District', 'Kamrup Metropolitan District', 'New Delhi District', 'South East Delhi District', 'North East District', 'South West District', 'North West District', 'Sas Nagar District', 'Chandigarh District', 'Rangareddy District', 'Medchal Malkajgiri District', 'Sangareddy District', 'North Twenty Four Parganas District', 'South Twenty Four Parganas District', 'Howrah District', 'Hooghly District') 
-                THEN 'Metro'
-                ELSE 'Non-Metro'
-            END AS Area_type
-        FROM map_user
-        WHERE Registered_users > 0 AND Year = (SELECT MAX(Year) FROM map_user)
-        GROUP BY State, District, Area_type
+            d.State,
+            d.District,
+            ROUND(AVG(m.Registered_users), 0) AS Avg_users,
+            ROUND(AVG(m.App_opens * 1.0 / m.Registered_users), 2) AS Engagement_score,
+            CASE WHEN d.Is_metro = 1 THEN 'Metro' ELSE 'Non-Metro' END AS Area_type,
+            d.Tier
+        FROM map_user m
+        JOIN dim_district d ON d.District_id = m.District_id
+        WHERE m.Registered_users > 0 AND m.Year = (SELECT MAX(Year) FROM map_user)
+        GROUP BY m.District_id, d.State, d.District, d.Is_metro, d.Tier
         ORDER BY Engagement_score DESC;
     """
     return pd.read_sql(query, engine)
@@ -224,16 +232,17 @@ def get_insurance_adoption_by_state(engine):
     """
     query = """
     SELECT 
-        i.State,
+        s.State,
         SUM(i.Insurance_txn_count) AS Total_Insurance_Transactions,
         MAX(u.Registered_users) AS Total_Registered_Users,
         ROUND((SUM(i.Insurance_txn_count) * 100.0 / MAX(u.Registered_users)), 4) AS Insurance_Adoption_Rate_Percentage
     FROM insurance_transaction i
     JOIN agg_user u 
-        ON i.State = u.State 
+        ON i.State_id = u.State_id 
         AND i.Year = u.Year 
         AND i.Quarter = u.Quarter
-    GROUP BY i.State
+    JOIN dim_state s ON s.State_id = i.State_id
+    GROUP BY i.State_id, s.State
     HAVING MAX(u.Registered_users) > 0
     ORDER BY Insurance_Adoption_Rate_Percentage DESC;
     """
@@ -246,16 +255,17 @@ def get_lagging_insurance_penetration_states(engine):
     """
     query = """
         SELECT 
-            i.State,
+            s.State,
             MAX(u.Registered_users) AS Total_Registered_Users,
             SUM(i.Insurance_txn_count) AS Total_Insurance_Transactions,
             ROUND((SUM(i.Insurance_txn_count) * 100.0 / MAX(u.Registered_users)), 4) AS Insurance_Adoption_Rate_Percentage
         FROM insurance_transaction i
         JOIN agg_user u 
-            ON i.State = u.State 
+            ON i.State_id = u.State_id 
             AND i.Year = u.Year 
             AND i.Quarter = u.Quarter
-        GROUP BY i.State
+        JOIN dim_state s ON s.State_id = i.State_id
+        GROUP BY i.State_id, s.State
         HAVING MAX(u.Registered_users) > 10000000
         ORDER BY Total_Registered_Users DESC, Insurance_Adoption_Rate_Percentage ASC;
     """
@@ -285,16 +295,17 @@ def get_top_10_insurance_adoption_states(engine):
     """
     query = """
         SELECT 
-            i.State,
+            s.State,
             MAX(u.Registered_users) as Total_Registered_Users,
             SUM(i.Insurance_txn_count) as Total_Insurance_Transactions,
             ROUND((SUM(i.Insurance_txn_count) * 100.0 / MAX(u.Registered_users)), 2) as Insurance_Adoption_Rate_Percentage
         FROM insurance_transaction i
         JOIN agg_user u 
-            ON i.State = u.State 
+            ON i.State_id = u.State_id 
             AND i.Year = u.Year 
             AND i.Quarter = u.Quarter
-        GROUP BY i.State
+        JOIN dim_state s ON s.State_id = i.State_id
+        GROUP BY i.State_id, s.State
         ORDER BY Insurance_Adoption_Rate_Percentage DESC
         LIMIT 10;
     """
@@ -306,16 +317,17 @@ def get_bottom_10_insurance_adoption_states(engine):
     """
     query = """
         SELECT 
-            i.State,
+            s.State,
             MAX(u.Registered_users) as Total_Registered_Users,
             SUM(i.Insurance_txn_count) as Total_Insurance_Transactions,
             ROUND((SUM(i.Insurance_txn_count) * 100.0 / MAX(u.Registered_users)), 2) as Insurance_Adoption_Rate_Percentage
         FROM insurance_transaction i
         JOIN agg_user u 
-            ON i.State = u.State 
+            ON i.State_id = u.State_id 
             AND i.Year = u.Year 
             AND i.Quarter = u.Quarter
-        GROUP BY i.State
+        JOIN dim_state s ON s.State_id = i.State_id
+        GROUP BY i.State_id, s.State
         ORDER BY Insurance_Adoption_Rate_Percentage ASC
         LIMIT 10;
     """
@@ -328,7 +340,7 @@ def get_insurance_untapped_opportunities(engine):
     """
     query = """
         SELECT 
-            i.State,
+            s.State,
             MAX(u.Registered_users) as Total_Registered_Users,
             SUM(u.App_opens) as App_Engagement,
             SUM(i.Insurance_txn_count) as Total_Insurance_Transactions,
@@ -336,10 +348,11 @@ def get_insurance_untapped_opportunities(engine):
             MAX(u.Registered_users) - SUM(i.Insurance_txn_count) as Untapped_Users
         FROM insurance_transaction i
         JOIN agg_user u 
-            ON i.State = u.State 
+            ON i.State_id = u.State_id 
             AND i.Year = u.Year 
             AND i.Quarter = u.Quarter
-        GROUP BY i.State
+        JOIN dim_state s ON s.State_id = i.State_id
+        GROUP BY i.State_id, s.State
         HAVING Total_Registered_Users > 1000000 AND Insurance_Adoption_Rate_Percentage < 10
         ORDER BY Untapped_Users DESC, App_Engagement DESC;
     """
@@ -355,12 +368,13 @@ def get_states_contribution(engine):
     """
     query = """
         SELECT 
-            State,
-            SUM(Transaction_count) AS Total_Transaction_Volume,
-            SUM(Transaction_amount) AS Total_Transaction_Value,
-            ROUND(AVG(Transaction_amount/Transaction_count), 2) AS Avg_Transaction_Value
-        FROM agg_transaction
-        GROUP BY State
+            s.State,
+            SUM(a.Transaction_count) AS Total_Transaction_Volume,
+            SUM(a.Transaction_amount) AS Total_Transaction_Value,
+            ROUND(AVG(a.Transaction_amount/a.Transaction_count), 2) AS Avg_Transaction_Value
+        FROM agg_transaction a
+        JOIN dim_state s ON s.State_id = a.State_id
+        GROUP BY a.State_id, s.State
         ORDER BY Total_Transaction_Value DESC, Total_Transaction_Volume DESC;
     """
     return pd.read_sql(query, engine)
@@ -373,15 +387,15 @@ def get_top5_states_dominance(engine):
     query = """
     WITH state_totals AS (
         SELECT 
-            State,
+            State_id,
             SUM(Transaction_count) as Total_Volume,
             SUM(Transaction_amount) as Total_Value
         FROM agg_transaction 
-        GROUP BY State
+        GROUP BY State_id
     ),
     ranked_states AS (
         SELECT 
-            State,
+            State_id,
             Total_Volume,
             Total_Value,
             ROW_NUMBER() OVER (ORDER BY Total_Value DESC) as state_rank
@@ -412,23 +426,18 @@ def get_underperforming_growth_states(engine):
     """
     Retrieves states with transaction amount growth rates comparing the most recent year 
     to the previous year, including total overall value.
+
+    Reads the growth_yearly table built by the growth metrics stage of the load.
     """
     query = """
     SELECT 
         State,
-        SUM(CASE WHEN Year = (SELECT MAX(Year) FROM agg_transaction) 
-            THEN Transaction_amount ELSE 0 END) as Recent_Year_Value,
-        SUM(CASE WHEN Year = (SELECT MAX(Year) - 1 FROM agg_transaction) 
-            THEN Transaction_amount ELSE 0 END) as Previous_Year_Value,
-        SUM(Transaction_amount) as Total_Overall_Value,
-        ROUND(
-            ((SUM(CASE WHEN Year = (SELECT MAX(Year) FROM agg_transaction) THEN Transaction_amount ELSE 0 END) - 
-              SUM(CASE WHEN Year = (SELECT MAX(Year) - 1 FROM agg_transaction) THEN Transaction_amount ELSE 0 END)) * 100.0 /
-             SUM(CASE WHEN Year = (SELECT MAX(Year) - 1 FROM agg_transaction) THEN Transaction_amount ELSE 0 END)), 2
-        ) as Growth_Rate
-    FROM agg_transaction
-    GROUP BY State
-    HAVING Previous_Year_Value > 0
+        Value as Recent_Year_Value,
+        Prev_year_value as Previous_Year_Value,
+        Cumulative_value as Total_Overall_Value,
+        ROUND(Value_YoY_pct, 2) as Growth_Rate
+    FROM growth_yearly
+    WHERE Level = 'State' AND Is_latest_year = 1 AND Prev_year_value > 0
     ORDER BY Growth_Rate DESC
     LIMIT 10;
     """
@@ -438,20 +447,18 @@ def get_market_status(engine):
     """
     Retrieves market status by state including total transaction value, 
     average transaction size, and growth percentage between the most recent two years.
+
+    Growth compares the yearly totals of the two most recent years, read from the
+    growth_yearly table built by the growth metrics stage of the load.
     """
     query = """
     SELECT 
         State,
-        SUM(Transaction_amount) as Total_Value,
-        ROUND(AVG(Transaction_amount/Transaction_count), 2) as Avg_Transaction_Size,
-        ROUND(
-            (MAX(CASE WHEN Year = (SELECT MAX(Year) FROM agg_transaction) THEN Transaction_amount END) -
-             MAX(CASE WHEN Year = (SELECT MAX(Year) - 1 FROM agg_transaction) THEN Transaction_amount END))
-            * 100.0 /
-            MAX(CASE WHEN Year = (SELECT MAX(Year) - 1 FROM agg_transaction) THEN Transaction_amount END), 2) as Growth_Percentage
-    FROM agg_transaction
-    GROUP BY State
-    HAVING MAX(Year) >= (SELECT MAX(Year) - 1 FROM agg_transaction)
+        Cumulative_value as Total_Value,
+        ROUND(Cumulative_value / Cumulative_volume, 2) as Avg_Transaction_Size,
+        ROUND(Value_YoY_pct, 2) as Growth_Percentage
+    FROM growth_yearly
+    WHERE Level = 'State' AND Is_latest_year = 1
     ORDER BY Total_Value DESC;
     """
     return pd.read_sql(query, engine)
@@ -462,10 +469,11 @@ def get_top_transaction_volume_states(engine):
     """
     query = """
     SELECT 
-        State,
-        SUM(Transaction_count) as Total_Transaction_Volume
-    FROM agg_transaction
-    GROUP BY State
+        s.State,
+        SUM(a.Transaction_count) as Total_Transaction_Volume
+    FROM agg_transaction a
+    JOIN dim_state s ON s.State_id = a.State_id
+    GROUP BY a.State_id, s.State
     ORDER BY Total_Transaction_Volume DESC
     LIMIT 10;
     """
@@ -477,10 +485,11 @@ def get_top_transaction_value_states(engine):
     """
     query = """
     SELECT 
-         State,
-         SUM(Transaction_amount) as Total_Transaction_Value
-    FROM agg_transaction
-    GROUP BY State
+         s.State,
+         SUM(a.Transaction_amount) as Total_Transaction_Value
+    FROM agg_transaction a
+    JOIN dim_state s ON s.State_id = a.State_id
+    GROUP BY a.State_id, s.State
     ORDER BY Total_Transaction_Value DESC
     LIMIT 10;
     """
@@ -496,11 +505,12 @@ def get_top_states_by_registered_users(engine):
     """
     query = """
         SELECT 
-            State,
-            SUM(Registered_users) as Total_Users
-        FROM agg_user
-        WHERE Year = (SELECT MAX(Year) FROM agg_user)  
-        GROUP BY State 
+            s.State,
+            SUM(u.Registered_users) as Total_Users
+        FROM agg_user u
+        JOIN dim_state s ON s.State_id = u.State_id
+        WHERE u.Year = (SELECT MAX(Year) FROM agg_user)  
+        GROUP BY u.State_id, s.State 
         ORDER BY Total_Users DESC
         LIMIT 10;
     """
@@ -512,12 +522,15 @@ def get_top_districts_by_registered_users(engine):
     """
     query = """
         SELECT 
-            State,
-            District,
-            SUM(Registered_users) as Total_Users
-        FROM map_user
-        WHERE Year = (SELECT MAX(Year) FROM map_user)  
-        GROUP BY State, District 
+            d.State,
+            d.District,
+            SUM(m.Registered_users) as Total_Users,
+            CASE WHEN d.Is_metro = 1 THEN 'Metro' ELSE 'Non-Metro' END AS Area_type,
+            d.Tier
+        FROM map_user m
+        JOIN dim_district d ON d.District_id = m.District_id
+        WHERE m.Year = (SELECT MAX(Year) FROM map_user)  
+        GROUP BY m.District_id, d.State, d.District, d.Is_metro, d.Tier
         ORDER BY Total_Users DESC
         LIMIT 10;
     """
@@ -530,13 +543,14 @@ def get_state_engagement_ratio(engine):
     """
     query = """
     SELECT 
-        State,
-        SUM(Registered_users) as Total_Registered,
-        SUM(App_opens) as Total_App_Opens,
-        ROUND((SUM(App_opens) * 1.0 / SUM(Registered_users)) * 100, 2) as Engagement_Ratio_Percent
-    FROM agg_user 
-    WHERE Registered_users > 0 AND Year = (SELECT MAX(Year) FROM agg_user)
-    GROUP BY State 
+        s.State,
+        SUM(u.Registered_users) as Total_Registered,
+        SUM(u.App_opens) as Total_App_Opens,
+        ROUND((SUM(u.App_opens) * 1.0 / SUM(u.Registered_users)) * 100, 2) as Engagement_Ratio_Percent
+    FROM agg_user u
+    JOIN dim_state s ON s.State_id = u.State_id
+    WHERE u.Registered_users > 0 AND u.Year = (SELECT MAX(Year) FROM agg_user)
+    GROUP BY u.State_id, s.State 
     ORDER BY Engagement_Ratio_Percent DESC
     LIMIT 10;
     """
@@ -548,14 +562,17 @@ def get_district_engagement_ratio(engine):
     """
     query = """
     SELECT 
-        State,
-        District,
-        SUM(Registered_users) as Total_Registered,
-        SUM(App_opens) as Total_App_Opens,
-        ROUND((SUM(App_opens) * 1.0 / SUM(Registered_users)) * 100, 2) as Engagement_Ratio_Percent
-    FROM map_user 
-    WHERE Registered_users > 0 AND Year = (SELECT MAX(Year) FROM map_user)
-    GROUP BY State, District 
+        d.State,
+        d.District,
+        SUM(m.Registered_users) as Total_Registered,
+        SUM(m.App_opens) as Total_App_Opens,
+        ROUND((SUM(m.App_opens) * 1.0 / SUM(m.Registered_users)) * 100, 2) as Engagement_Ratio_Percent,
+        CASE WHEN d.Is_metro = 1 THEN 'Metro' ELSE 'Non-Metro' END AS Area_type,
+        d.Tier
+    FROM map_user m
+    JOIN dim_district d ON d.District_id = m.District_id
+    WHERE m.Registered_users > 0 AND m.Year = (SELECT MAX(Year) FROM map_user)
+    GROUP BY m.District_id, d.State, d.District, d.Is_metro, d.Tier
     ORDER BY Engagement_Ratio_Percent DESC
     LIMIT 10;
     """
@@ -568,14 +585,15 @@ def get_dormant_user_regions(engine):
     """
     query = """
         SELECT 
-            State,
-            SUM(Registered_users) as Total_Registered,
-            SUM(App_opens) as Total_App_Opens,
-            ROUND((SUM(App_opens) * 1.0 / SUM(Registered_users)) * 100, 2) as Engagement_Ratio_Percent,
+            s.State,
+            SUM(u.Registered_users) as Total_Registered,
+            SUM(u.App_opens) as Total_App_Opens,
+            ROUND((SUM(u.App_opens) * 1.0 / SUM(u.Registered_users)) * 100, 2) as Engagement_Ratio_Percent,
             'Dormant Region' as Category
-        FROM agg_user 
-        WHERE Registered_users > 0 AND Year = (SELECT MAX(Year) FROM agg_user)
-        GROUP BY State 
+        FROM agg_user u
+        JOIN dim_state s ON s.State_id = u.State_id
+        WHERE u.Registered_users > 0 AND u.Year = (SELECT MAX(Year) FROM agg_user)
+        GROUP BY u.State_id, s.State 
         ORDER BY Total_Registered DESC, Engagement_Ratio_Percent ASC
         LIMIT 10;
     """
@@ -588,13 +606,14 @@ def get_growth_states_by_engagement(engine):
     """
     query = """
         SELECT 
-            State,
-            Year,
+            s.State,
+            u.Year,
             ROUND(
-                (SUM(App_opens) * 1.0 / SUM(Registered_users)) * 100, 2
+                (SUM(u.App_opens) * 1.0 / SUM(u.Registered_users)) * 100, 2
             ) as Yearly_Engagement_Percent
-        FROM agg_user 
-        GROUP BY State, Year 
+        FROM agg_user u
+        JOIN dim_state s ON s.State_id = u.State_id
+        GROUP BY u.State_id, s.State, u.Year 
         ORDER BY Yearly_Engagement_Percent DESC;
     """
     return pd.read_sql(query, engine)
@@ -606,14 +625,17 @@ def get_target_districts_low_engagement(engine):
     """
     query = """
         SELECT
-            State,
-            District,
-            SUM(Registered_users) AS Total_Registered,
-            SUM(App_opens) AS Total_App_Opens,
-            ROUND((SUM(App_opens) * 1.0 / NULLIF(SUM(Registered_users), 0)) * 100, 2) AS Engagement_Ratio_Percent
-        FROM map_user
-        WHERE Year = (SELECT MAX(Year) FROM map_user)
-        GROUP BY State, District
+            d.State,
+            d.District,
+            SUM(m.Registered_users) AS Total_Registered,
+            SUM(m.App_opens) AS Total_App_Opens,
+            ROUND((SUM(m.App_opens) * 1.0 / NULLIF(SUM(m.Registered_users), 0)) * 100, 2) AS Engagement_Ratio_Percent,
+            CASE WHEN d.Is_metro = 1 THEN 'Metro' ELSE 'Non-Metro' END AS Area_type,
+            d.Tier
+        FROM map_user m
+        JOIN dim_district d ON d.District_id = m.District_id
+        WHERE m.Year = (SELECT MAX(Year) FROM map_user)
+        GROUP BY m.District_id, d.State, d.District, d.Is_metro, d.Tier
         HAVING Engagement_Ratio_Percent > 0
         ORDER BY Engagement_Ratio_Percent ASC
         LIMIT 20;
@@ -621,6 +643,299 @@ def get_target_districts_low_engagement(engine):
     return pd.read_sql(query, engine)
 
 
+#Period slices: every (Year, Quarter) in one query, sliced in memory by the dashboard
+
+
+def get_transaction_slices(engine):
+    """
+    Fetch transaction volume and value for every State, Year, Quarter and Transaction_type.
+    Geo_name is the state's name in the choropleth GeoJSON (see dimensions.STATE_NAMES).
+
+    Returns:
+    pandas.DataFrame with columns [State, Geo_name, Year, Quarter, Transaction_type, Total_volume, Total_value]
+    """
+    query = """
+        SELECT 
+            s.State,
+            s.Geo_name,
+            t.Year,
+            t.Quarter,
+            t.Transaction_type,
+            t.Total_volume,
+            t.Total_value
+        FROM (
+            SELECT State_id, Year, Quarter, Transaction_type,
+                   SUM(Transaction_count) AS Total_volume,
+                   SUM(Transaction_amount) AS Total_value
+            FROM agg_transaction
+            GROUP BY State_id, Year, Quarter, Transaction_type
+        ) t
+        JOIN dim_state s ON s.State_id = t.State_id
+        ORDER BY t.Year, t.Quarter, s.State;
+    """
+    return pd.read_sql(query, engine)
+
+
+def get_user_slices(engine):
+    """
+    Fetch registered users, app opens and device brand users for every State, Year and Quarter.
+
+    Returns:
+    pandas.DataFrame with columns [State, Year, Quarter, Registered_users, App_opens, Brand, Brand_count, Brand_percentage]
+    """
+    query = """
+        SELECT 
+            State,
+            Year,
+            Quarter,
+            Registered_users,
+            App_opens,
+            Brand,
+            Brand_count,
+            Brand_percentage
+        FROM agg_user
+        ORDER BY Year, Quarter, State;
+    """
+    return pd.read_sql(query, engine)
+
+
+def get_state_user_slices(engine):
+    """
+    Fetch registered users and app opens for every State, Year and Quarter, summed over
+    the districts of map_user. agg_user only has rows while PhonePe publishes the device
+    breakdown (up to 2022 Q1), so state user totals for later quarters come from here.
+
+    Returns:
+    pandas.DataFrame with columns [State, Year, Quarter, Registered_users, App_opens]
+    """
+    query = """
+        SELECT 
+            s.State,
+            u.Year,
+            u.Quarter,
+            u.Registered_users,
+            u.App_opens
+        FROM (
+            SELECT State_id, Year, Quarter,
+                   SUM(Registered_users) AS Registered_users,
+                   SUM(App_opens) AS App_opens
+            FROM map_user
+            GROUP BY State_id, Year, Quarter
+        ) u
+        JOIN dim_state s ON s.State_id = u.State_id
+        ORDER BY u.Year, u.Quarter, s.State;
+    """
+    return pd.read_sql(query, engine)
+
+
+def get_district_user_slices(engine):
+    """
+    Fetch registered users and app opens for every District, Year and Quarter, with the
+    district classification from dim_district.
+
+    Returns:
+    pandas.DataFrame with columns [District_id, State, District, Area_type, Tier, Year, Quarter,
+    Registered_users, App_opens]
+    """
+    query = """
+        SELECT 
+            d.District_id,
+            d.State,
+            d.District,
+            CASE WHEN d.Is_metro = 1 THEN 'Metro' ELSE 'Non-Metro' END AS Area_type,
+            d.Tier,
+            u.Year,
+            u.Quarter,
+            u.Registered_users,
+            u.App_opens
+        FROM (
+            SELECT District_id, Year, Quarter,
+                   SUM(Registered_users) AS Registered_users,
+                   SUM(App_opens) AS App_opens
+            FROM map_user
+            GROUP BY District_id, Year, Quarter
+        ) u
+        JOIN dim_district d ON d.District_id = u.District_id
+        ORDER BY u.Year, u.Quarter, d.State;
+    """
+    return pd.read_sql(query, engine)
+
+
+def get_district_transaction_slices(engine):
+    """
+    Fetch transaction volume and value for every District, Year and Quarter, with the
+    district classification from dim_district.
+
+    Returns:
+    pandas.DataFrame with columns [District_id, State, District, Area_type, Tier, Year, Quarter,
+    Total_volume, Total_value]
+    """
+    query = """
+        SELECT 
+            d.District_id,
+            d.State,
+            d.District,
+            CASE WHEN d.Is_metro = 1 THEN 'Metro' ELSE 'Non-Metro' END AS Area_type,
+            d.Tier,
+            t.Year,
+            t.Quarter,
+            t.Total_volume,
+            t.Total_value
+        FROM (
+            SELECT District_id, Year, Quarter,
+                   SUM(Transaction_count) AS Total_volume,
+                   SUM(Transaction_amount) AS Total_value
+            FROM map_transaction
+            GROUP BY District_id, Year, Quarter
+        ) t
+        JOIN dim_district d ON d.District_id = t.District_id
+        ORDER BY t.Year, t.Quarter, d.State;
+    """
+    return pd.read_sql(query, engine)
+
+
+def get_insurance_slices(engine):
+    """
+    Fetch insurance transaction counts and values for every State, Year and Quarter.
+
+    Returns:
+    pandas.DataFrame with columns [State, Year, Quarter, Insurance_txn_count, Insurance_txn_amount]
+    """
+    query = """
+        SELECT 
+            s.State,
+            i.Year,
+            i.Quarter,
+            i.Insurance_txn_count,
+            i.Insurance_txn_amount
+        FROM (
+            SELECT State_id, Year, Quarter,
+                   SUM(Insurance_txn_count) AS Insurance_txn_count,
+                   SUM(Insurance_txn_amount) AS Insurance_txn_amount
+            FROM insurance_transaction
+            GROUP BY State_id, Year, Quarter
+        ) i
+        JOIN dim_state s ON s.State_id = i.State_id
+        ORDER BY i.Year, i.Quarter, s.State;
+    """
+    return pd.read_sql(query, engine)
+
+
+#Concentration: top-N share, HHI, Gini and Lorenz curves per quarter (see concentration.py)
+
+CONCENTRATION_GROUPS = ["Entity_type", "Year", "Quarter"]
+
+
+def get_entity_shares(engine):
+    """
+    Fetch the value held by every state, district, pincode and device brand in every
+    Year and Quarter: transaction value for states, districts and pincodes, registered
+    users for brands. Pincodes cover only the top 10 pincodes PhonePe publishes per state.
+
+    Returns:
+    pandas.DataFrame with columns [Entity_type, Entity, Year, Quarter, Value]
+    """
+    query = """
+        SELECT 'State' AS Entity_type, s.State AS Entity, t.Year, t.Quarter, t.Value
+        FROM (
+            SELECT State_id, Year, Quarter, SUM(Transaction_amount) AS Value
+            FROM agg_transaction
+            GROUP BY State_id, Year, Quarter
+        ) t
+        JOIN dim_state s ON s.State_id = t.State_id
+        UNION ALL
+        SELECT 'District' AS Entity_type, d.District AS Entity, t.Year, t.Quarter, t.Value
+        FROM (
+            SELECT District_id, Year, Quarter, SUM(Transaction_amount) AS Value
+            FROM map_transaction
+            GROUP BY District_id, Year, Quarter
+        ) t
+        JOIN dim_district d ON d.District_id = t.District_id
+        UNION ALL
+        SELECT 'Pincode' AS Entity_type, Entity_name AS Entity, Year, Quarter, SUM(Transaction_amount) AS Value
+        FROM top_transaction
+        WHERE Entity_type = 'Pincode'
+        GROUP BY Entity_name, Year, Quarter
+        UNION ALL
+        SELECT 'Brand' AS Entity_type, Brand AS Entity, Year, Quarter, SUM(Brand_count) AS Value
+        FROM agg_user
+        WHERE Brand IS NOT NULL
+        GROUP BY Brand, Year, Quarter;
+    """
+    return pd.read_sql(query, engine)
+
+
+def get_concentration_metrics(engine):
+    """
+    Concentration of states, districts, pincodes and device brands in every Year and
+    Quarter, generalising get_top5_states_dominance to any N and to inequality indices.
+
+    Returns:
+    pandas.DataFrame with columns [Entity_type, Year, Quarter, Entities, Total, Top_1_share_pct,
+    Top_5_share_pct, Top_10_share_pct, HHI, Gini, Top_entity]
+    """
+    return concentration_metrics(get_entity_shares(engine), CONCENTRATION_GROUPS, "Value", "Entity")
+
+
+def get_lorenz_curves(engine):
+    """
+    Lorenz curve points of states, districts, pincodes and device brands in every Year
+    and Quarter.
+
+    Returns:
+    pandas.DataFrame with columns [Entity_type, Year, Quarter, Population_share, Value_share]
+    """
+    return lorenz_curves(get_entity_shares(engine), CONCENTRATION_GROUPS, "Value")
+
+
+#Segments: states and districts clustered on engagement, growth and insurance (see segmentation.py)
+
+
+def get_state_segments(engine):
+    """
+    Segment the states on engagement, transaction value growth, insurance adoption and
+    average transaction value over the latest four quarters.
+
+    Returns:
+    pandas.DataFrame with columns [State, Engagement_ratio, Value_growth_pct, Insurance_per_1k_users,
+    Avg_transaction_value, Total_value, Registered_users, Segment, Segment_name]
+    """
+    transaction_slices_df = get_transaction_slices(engine)
+    segments_df, _ = segment_states(transaction_slices_df, get_state_user_slices(engine), get_insurance_slices(engine),
+                                    resolve_period(transaction_slices_df))
+    return segments_df
+
+
+def get_district_segments(engine):
+    """
+    Segment the districts on engagement, transaction value growth, insurance adoption
+    (of their state) and average transaction value over the latest four quarters.
+
+    Returns:
+    pandas.DataFrame with columns [District_id, State, District, Engagement_ratio, Value_growth_pct,
+    Insurance_per_1k_users, Avg_transaction_value, Total_value, Registered_users, Segment, Segment_name]
+    """
+    district_transaction_slices_df = get_district_transaction_slices(engine)
+    segments_df, _ = segment_districts(district_transaction_slices_df, get_district_user_slices(engine),
+                                       get_insurance_slices(engine), resolve_period(district_transaction_slices_df))
+    return segments_df
+
+
+#Insurance what-if baselines (see insurance_simulator.py)
+
+
+def get_insurance_baselines(engine):
+    """
+    Per-state registered users, insurance adoption rate and average premium over the
+    latest four quarters: the inputs of the insurance what-if simulator.
+
+    Returns:
+    pandas.DataFrame with columns [State, Registered_users, Insurance_txn_count, Insurance_txn_amount,
+    Adoption_rate, Avg_premium]
+    """
+    return state_baselines(get_insurance_slices(engine), get_state_user_slices(engine))
+
+
 #Indian curreny format
 
 def indian_number_format(n):
@@ -0,0 +1,293 @@
+"""
+data_validation.py
+
+This module is the validation gate between extraction and load. Every check runs as
+column operations over the extracted frames, so the full dataset validates in a few
+seconds:
+
+- schema: expected columns, column dtypes and nulls in required columns
+- duplicates: more than one row per (State, Year, Quarter, key)
+- counts: negative counts or amounts (errors) and zero counts (warnings)
+- reconciliation: map_transaction state totals against agg_transaction (warnings)
+- missing quarters: gaps in a state's own run of quarters (warnings)
+- appended quarters: on an incremental load, rows for quarters already loaded (errors)
+- dimension keys: after the dimension stage, state or district names that matched no
+  dimension row (errors; see check_keys)
+
+Errors block the load (data_loader.load_all raises ValidationError); warnings are
+only reported. The published Pulse data has real gaps and small map-vs-agg
+differences (e.g. insurance_transaction lacks a few state-quarters), so those are
+warnings: a clean official extract must load.
+"""
+import numpy as np
+import pandas as pd
+
+from data_extraction import DATASETS
+
+# Columns that identify one row within a (State, Year, Quarter).
+ROW_KEYS = {
+    "agg_transaction": ["Transaction_type"],
+    "map_transaction": ["District_name"],
+    "top_transaction": ["Entity_type", "Entity_name"],
+    "insurance_transaction": [],
+    "agg_user": ["Brand"],
+    "map_user": ["District"],
+}
+
+# Column dtype kinds: text, integer, or numeric (integer or float).
+COLUMN_KINDS = {
+    "State": "text", "Year": "integer", "Quarter": "integer",
+    "Transaction_type": "text", "District_name": "text", "Entity_type": "text", "Entity_name": "text",
+    "Brand": "text", "District": "text",
+    "Transaction_count": "integer", "Transaction_amount": "numeric",
+    "Insurance_txn_count": "integer", "Insurance_txn_amount": "numeric",
+    "Registered_users": "integer", "App_opens": "integer",
+    "Brand_count": "integer", "Brand_percentage": "numeric",
+}
+
+# Count and amount columns that must not be negative; zeros are reported as warnings.
+MEASURE_COLUMNS = {
+    "agg_transaction": ["Transaction_count", "Transaction_amount"],
+    "map_transaction": ["Transaction_count", "Transaction_amount"],
+    "top_transaction": ["Transaction_count", "Transaction_amount"],
+    "insurance_transaction": ["Insurance_txn_count", "Insurance_txn_amount"],
+    "agg_user": ["Registered_users", "App_opens", "Brand_count", "Brand_percentage"],
+    "map_user": ["Registered_users", "App_opens"],
+}
+
+# District name column of the keyed frames (District_id lookups, see dimensions.py).
+DISTRICT_KEY_COLUMNS = {
+    "map_transaction": "District_name",
+    "map_user": "District",
+    "top_transaction": "Entity_name",
+}
+
+# Largest relative gap allowed between the map_transaction and agg_transaction
+# totals of a state and quarter.
+RECONCILE_TOLERANCE = 0.01
+
+_DTYPE_CHECKS = {
+    "text": lambda s: pd.api.types.is_object_dtype(s) or pd.api.types.is_string_dtype(s),
+    "integer": pd.api.types.is_integer_dtype,
+    "numeric": lambda s: pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s),
+}
+
+REPORT_COLUMNS = ["Dataset", "Check", "Severity", "Rows", "Detail"]
+
+
+class ValidationError(Exception):
+    """
+    Raised when extracted frames fail validation; report holds every issue found.
+    """
+
+    def __init__(self, report):
+        self.report = report
+        errors = report[report["Severity"] == "error"]
+        super().__init__(f"{len(errors)} validation error(s):\n" + errors.to_string(index=False))
+
+
+def _issue(dataset, check, severity, rows, detail):
+    return {"Dataset": dataset, "Check": check, "Severity": severity, "Rows": int(rows), "Detail": detail}
+
+
+def _examples(df, columns, limit=3):
+    return "; ".join(", ".join(str(value) for value in row) for row in df[columns].head(limit).itertuples(index=False))
+
+
+#Checks
+
+
+def check_schema(dataset, df):
+    issues = []
+    expected = DATASETS[dataset]["columns"]
+    missing = [column for column in expected if column not in df.columns]
+    if missing:
+        return [_issue(dataset, "schema", "error", len(df), f"missing columns: {', '.join(missing)}")]
+
+    for column in expected:
+        kind = COLUMN_KINDS[column]
+        if len(df) and not _DTYPE_CHECKS[kind](df[column]):
+            issues.append(_issue(dataset, "dtype", "error", len(df), f"{column} is {df[column].dtype}, expected {kind}"))
+
+    required = ["State", "Year", "Quarter"] + ROW_KEYS[dataset]
+    nulls = df[required].isna().sum()
+    for column, count in nulls[nulls > 0].items():
+        issues.append(_issue(dataset, "nulls", "error", count, f"{column} has {count} null value(s)"))
+    measure_nulls = df[MEASURE_COLUMNS[dataset]].isna().sum()
+    for column, count in measure_nulls[measure_nulls > 0].items():
+        issues.append(_issue(dataset, "nulls", "warning", count, f"{column} has {count} null value(s)"))
+
+    bad_quarter = ~df["Quarter"].isin([1, 2, 3, 4])
+    if bad_quarter.any():
+        issues.append(_issue(dataset, "schema", "error", bad_quarter.sum(), "Quarter outside 1-4"))
+    return issues
+
+
+def check_duplicates(dataset, df):
+    keys = ["State", "Year", "Quarter"] + ROW_KEYS[dataset]
+    duplicated = df.duplicated(keys, keep=False)
+    if not duplicated.any():
+        return []
+    return [_issue(dataset, "duplicates", "error", duplicated.sum(),
+                   f"duplicate ({', '.join(keys)}), e.g. {_examples(df[duplicated], keys)}")]
+
+
+def check_measures(dataset, df):
+    issues = []
+    for column in MEASURE_COLUMNS[dataset]:
+        values = df[column]
+        negative = values < 0
+        if negative.any():
+            issues.append(_issue(dataset, "negative", "error", negative.sum(), f"{column} < 0"))
+        zero = values == 0
+        if zero.any():
+            issues.append(_issue(dataset, "zero", "warning", zero.sum(), f"{column} == 0"))
+    return issues
+
+
+def check_missing_quarters(dataset, df):
+    """
+    Every state should have rows for every quarter between its own first and last
+    quarter. Datasets start and end at different quarters per state (insurance from
+    2020, agg_user brand rows only up to 2022), so only gaps inside a state's own range
+    are reported, as warnings.
+    """
+    if df.empty:
+        return []
+    periods = df["Year"] * 4 + df["Quarter"] - 1
+    present = pd.MultiIndex.from_arrays([df["State"].to_numpy(), periods.to_numpy()]).unique()
+    ranges = periods.groupby(df["State"].to_numpy()).agg(["min", "max"])
+    lengths = (ranges["max"] - ranges["min"] + 1).to_numpy()
+    states = np.repeat(ranges.index.to_numpy(), lengths)
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    expected = pd.MultiIndex.from_arrays([states, np.repeat(ranges["min"].to_numpy(), lengths) + offsets])
+    missing = expected.difference(present)
+    if missing.empty:
+        return []
+    missing = pd.DataFrame({"State": missing.get_level_values(0),
+                            "Year": missing.get_level_values(1) // 4,
+                            "Quarter": missing.get_level_values(1) % 4 + 1})
+    return [_issue(dataset, "missing quarters", "warning", len(missing),
+                   f"no rows for {len(missing)} state-quarter(s), e.g. {_examples(missing, ['State', 'Year', 'Quarter'])}")]
+
+
+def check_appended_quarters(dataset, df, latest):
+    """
+    Rows appended to a loaded table must all be newer than its latest loaded quarter
+    (period index latest); older rows would duplicate or restate loaded data.
+    """
+    stale = df["Year"] * 4 + df["Quarter"] - 1 <= latest
+    if not stale.any():
+        return []
+    return [_issue(dataset, "appended quarters", "error", stale.sum(),
+                   f"{stale.sum()} row(s) for quarters already loaded (up to {latest // 4} Q{latest % 4 + 1}), "
+                   f"e.g. {_examples(df[stale], ['State', 'Year', 'Quarter'])}")]
+
+
+def check_dimension_keys(dataset, df):
+    """
+    Rows of a keyed frame whose State or district name matched no dimension row. Queries
+    join and group on State_id / District_id, so these rows would drop out of every
+    result. On top_transaction only District rows carry a District_id.
+    """
+    issues = []
+    keys = {"State_id": ["State"]}
+    if dataset in DISTRICT_KEY_COLUMNS:
+        keys["District_id"] = ["State", DISTRICT_KEY_COLUMNS[dataset]]
+    for key, names in keys.items():
+        if key not in df.columns:
+            continue
+        keyed = df[df["Entity_type"] == "District"] if key == "District_id" and dataset == "top_transaction" else df
+        unmatched = keyed[key].isna()
+        if unmatched.any():
+            names_df = keyed.loc[unmatched, names].drop_duplicates()
+            issues.append(_issue(dataset, "dimension keys", "error", unmatched.sum(),
+                                 f"{len(names_df)} name(s) without a {key}, e.g. {_examples(names_df, names)}"))
+    return issues
+
+
+def reconcile_map_transactions(agg_transaction_df, map_transaction_df, tolerance=RECONCILE_TOLERANCE):
+    """
+    Compare the district totals of map_transaction with the category totals of
+    agg_transaction for every state and quarter present in both. Differences are
+    reported as warnings: the published map and agg files do not always agree.
+    """
+    keys = ["State", "Year", "Quarter"]
+    measures = ["Transaction_count", "Transaction_amount"]
+    totals = agg_transaction_df.groupby(keys)[measures].sum().join(
+        map_transaction_df.groupby(keys)[measures].sum(), how="inner", rsuffix="_map")
+
+    issues = []
+    for measure in measures:
+        expected = totals[measure].to_numpy(dtype=float)
+        gap = np.abs(totals[f"{measure}_map"].to_numpy(dtype=float) - expected) / np.maximum(np.abs(expected), 1)
+        off = gap > tolerance
+        if off.any():
+            state, year, quarter = totals.index[np.argmax(gap)]
+            issues.append(_issue("map_transaction", "reconciliation", "warning", off.sum(),
+                                 f"{measure} differs from agg_transaction by more than {tolerance:.1%} in "
+                                 f"{off.sum()} state-quarter(s); worst {state} {year} Q{quarter}: {gap.max():.1%}"))
+    return issues
+
+
+#Validation gate
+
+
+def validate_frames(frames, tolerance=RECONCILE_TOLERANCE, loaded=None):
+    """
+    Run every check over the extracted frames (datasets not in frames are skipped).
+    loaded ({dataset: period index of its latest loaded quarter}) marks the frames as
+    quarters to append to loaded tables.
+
+    Returns:
+    pandas.DataFrame with columns [Dataset, Check, Severity, Rows, Detail], one row per
+    issue; empty when the frames are clean
+    """
+    issues = []
+    for dataset, df in frames.items():
+        if dataset not in DATASETS:
+            continue
+        schema_issues = check_schema(dataset, df)
+        issues += schema_issues
+        if any(issue["Check"] == "schema" for issue in schema_issues):
+            continue
+        issues += check_duplicates(dataset, df)
+        issues += check_measures(dataset, df)
+        issues += check_missing_quarters(dataset, df)
+        if loaded and loaded.get(dataset) is not None:
+            issues += check_appended_quarters(dataset, df, loaded[dataset])
+
+    if "agg_transaction" in frames and "map_transaction" in frames:
+        issues += reconcile_map_transactions(frames["agg_transaction"], frames["map_transaction"], tolerance)
+    return pd.DataFrame(issues, columns=REPORT_COLUMNS)
+
+
+def check_frames(frames, tolerance=RECONCILE_TOLERANCE, loaded=None):
+    """
+    Validate frames and raise ValidationError if any check reports an error.
+
+    Returns:
+    the validation report (warnings only)
+    """
+    report = validate_frames(frames, tolerance, loaded)
+    if (report["Severity"] == "error").any():
+        raise ValidationError(report)
+    return report
+
+
+def check_keys(frames):
+    """
+    Report the names the dimension stage could not key (check_dimension_keys) and raise
+    ValidationError if there are any.
+
+    Returns:
+    the validation report (empty)
+    """
+    issues = []
+    for dataset, df in frames.items():
+        if dataset in DATASETS:
+            issues += check_dimension_keys(dataset, df)
+    report = pd.DataFrame(issues, columns=REPORT_COLUMNS)
+    if len(report):
+        raise ValidationError(report)
+    return report
@@ -1,13 +1,219 @@
 import os
-from sqlalchemy import create_engine
+import time
+import itertools
+import threading
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.pool import NullPool
 from dotenv import load_dotenv
 
-def get_phonepe_engine():
-    load_dotenv()  
+# Reader selection: "round_robin" or "least_connections".
+DEFAULT_READ_ROUTING = "round_robin"
+# Replicas further behind the writer than this (seconds) are skipped.
+DEFAULT_MAX_REPLICA_LAG = 30
+# How often (seconds) replica health and lag are rechecked.
+DEFAULT_LAG_CHECK_INTERVAL = 15
+# Loads publish each new data version here (see data_loader.publish_data_version).
+DATA_VERSION_TABLE = "pulse_data_version"
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def _writer_url():
+    url = os.getenv("DB_WRITER_URL")
+    if url:
+        return url
     user = os.getenv("DB_USER")
     password = os.getenv("DB_PASSWORD")
     host = os.getenv("DB_HOST")
     port = os.getenv("DB_PORT")
     db = os.getenv("DB_NAME")
+    return f"mysql+pymysql://{user}:{password}@{host}:{port}/{db}"
+
+
+def _reader_urls():
+    return [url.strip() for url in os.getenv("DB_READER_URLS", "").split(",") if url.strip()]
+
+
+def get_data_version(engine):
+    """
+    Return the version number of the data engine serves, 0 before the first load.
+    """
+    if not inspect(engine).has_table(DATA_VERSION_TABLE):
+        return 0
+    with engine.connect() as conn:
+        version = conn.execute(text(f"SELECT MAX(Version) FROM {DATA_VERSION_TABLE};")).scalar()
+    return int(version or 0)
+
+
+def replica_lag(engine):
+    """
+    Seconds the replica behind engine is behind its source: 0 for a server that is
+    not replicating, None when the lag is unknown (replication stopped). Raises if
+    the server cannot be reached.
+    """
+    with engine.connect() as conn:
+        if engine.dialect.name != "mysql":
+            conn.execute(text("SELECT 1"))
+            return 0
+        try:
+            row = conn.execute(text("SHOW REPLICA STATUS")).mappings().first()
+        except Exception:
+            # MySQL < 8.0.22 and MariaDB only know the old statement.
+            row = conn.execute(text("SHOW SLAVE STATUS")).mappings().first()
+    if row is None:
+        return 0
+    lag = row.get("Seconds_Behind_Source", row.get("Seconds_Behind_Master"))
+    return None if lag is None else int(lag)
+
+
+class ReplicaRouter:
+    """
+    Routes read queries across the reader engines of one writer.
+
+    Readers are chosen round-robin or by fewest checked-out connections. A reader
+    that cannot be reached, or lags the writer by more than max_lag seconds, is left
+    out until the next health check; with no healthy reader left, reads go to the
+    writer. One thread runs each health check; the others keep routing on the last
+    result meanwhile.
+
+    router.engine is an engine like any other (pd.read_sql, notebooks, the query
+    catalogue) whose every connection is checked out from the reader that reader()
+    picks at connect time.
+
+    With a version_probe (engine -> data version), each health check also records the
+    data version every reader serves, and reader(min_version) skips readers that have
+    not replicated that version yet, so results cached under a version hold its data.
+    """
+
+    def __init__(self, writer, readers, routing=DEFAULT_READ_ROUTING,
+                 max_lag=DEFAULT_MAX_REPLICA_LAG, check_interval=DEFAULT_LAG_CHECK_INTERVAL,
+                 version_probe=None):
+        if routing not in ("round_robin", "least_connections"):
+            raise ValueError(f"Unknown read routing {routing!r}")
+        self.writer = writer
+        self.readers = list(readers)
+        self.routing = routing
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.version_probe = version_probe
+        self._turn = itertools.count()
+        self._healthy = list(self.readers)
+        self._versions = {}
+        self._checked_at = None
+        self._lock = threading.Lock()
+        self._check_lock = threading.Lock()
+        self.engine = create_engine(writer.url, poolclass=NullPool,
+                                    creator=lambda: self.reader().raw_connection())
+
+    def check_replicas(self):
+        """
+        Recheck every reader and return the ones that are reachable and within max_lag.
+        """
+        healthy, versions = [], {}
+        for reader in self.readers:
+            try:
+                lag = replica_lag(reader)
+                if lag is not None and lag <= self.max_lag and self.version_probe is not None:
+                    versions[reader] = self.version_probe(reader)
+            except Exception:
+                continue
+            if lag is not None and lag <= self.max_lag:
+                healthy.append(reader)
+        with self._lock:
+            self._healthy = healthy
+            self._versions = versions
+            self._checked_at = time.monotonic()
+        return healthy
+
+    def _check_due(self):
+        return self._checked_at is None or time.monotonic() - self._checked_at >= self.check_interval
+
+    def healthy_readers(self):
+        if self._check_due():
+            # Only the first thread to see the check due probes the readers; until the
+            # first check has run, the others wait for it.
+            if self._check_lock.acquire(blocking=self._checked_at is None):
+                try:
+                    if self._check_due():
+                        self.check_replicas()
+                finally:
+                    self._check_lock.release()
+        return self._healthy
+
+    def reader(self, min_version=None):
+        """
+        Return the engine the next read should use; with min_version, only a reader
+        known to serve that data version or a later one (or else the writer).
+        """
+        healthy = self.healthy_readers()
+        if min_version is not None and self.version_probe is not None:
+            versions = self._versions
+            healthy = [reader for reader in healthy if versions.get(reader, -1) >= min_version]
+        if not healthy:
+            return self.writer
+        if self.routing == "least_connections":
+            return min(healthy, key=lambda engine: engine.pool.checkedout())
+        return healthy[next(self._turn) % len(healthy)]
+
+
+def _create_engines():
+    load_dotenv()
+    writer = create_engine(_writer_url(), pool_pre_ping=True)
+    readers = [create_engine(url, pool_pre_ping=True) for url in _reader_urls()]
+    router = ReplicaRouter(
+        writer, readers,
+        routing=os.getenv("DB_READ_ROUTING", DEFAULT_READ_ROUTING),
+        max_lag=float(os.getenv("DB_MAX_REPLICA_LAG", DEFAULT_MAX_REPLICA_LAG)),
+        check_interval=float(os.getenv("DB_LAG_CHECK_INTERVAL", DEFAULT_LAG_CHECK_INTERVAL)),
+        version_probe=get_data_version)
+    return writer, router
+
+
+def get_replica_router():
+    """
+    Return the process-wide ReplicaRouter, creating the writer and reader engines on
+    first use.
+    """
+    with _engines_lock:
+        if "router" not in _engines:
+            _engines["writer"], _engines["router"] = _create_engines()
+        return _engines["router"]
+
+
+def get_phonepe_engine(role="reader"):
+    """
+    Return the engine for role: "reader" (the default, for queries: every connection
+    goes to a healthy replica from DB_READER_URLS, or to the writer when no replica is
+    configured or healthy) or "writer" (the DB_HOST / DB_WRITER_URL database, used for
+    loads). Engines are created once per process.
+    """
+    router = get_replica_router()
+    if role == "writer":
+        return router.writer
+    if role == "reader":
+        return router.engine
+    raise ValueError(f"Unknown engine role {role!r}")
+
+
+def read_engine(engine, min_version=None):
+    """
+    Return a reader engine for queries given the writer or routing engine, or engine
+    itself otherwise (e.g. a test engine). With min_version, the reader serves at
+    least that data version.
+    """
+    router = _engines.get("router")
+    if router is not None and (engine is router.writer or engine is router.engine):
+        return router.reader(min_version)
+    return engine
+
 
-    return create_engine(f"mysql+pymysql://{user}:{password}@{host}:{port}/{db}")
\ No newline at end of file
+def writer_engine(engine):
+    """
+    Return the writer behind the routing engine, or engine itself otherwise. The data
+    version is read here: a lagging replica would report an old one.
+    """
+    router = _engines.get("router")
+    if router is not None and engine is router.engine:
+        return router.writer
+    return engine
@@ -0,0 +1,304 @@
+"""
+dimensions.py
+
+This module builds the dimension tables of the load.
+
+dim_state maps every spelling of a state name to one integer State_id, the canonical
+Pulse name and the ST_NM name used by the India states GeoJSON. dim_district holds
+one row per district with an integer District_id, the canonical district name, the
+key shared with the district GeoJSON shards, and the metro / tier / urban
+classification read from district_classification.csv.
+
+Names are matched once, on normalised keys, when the dimensions are built. The loader
+then stores State_id (and District_id where a table has districts) on every fact
+table, rewrites the name columns to their canonical spelling, and queries join on the
+integer keys.
+"""
+import os
+import warnings
+import pandas as pd
+from dotenv import load_dotenv
+
+from geo_shards import state_key, district_key
+
+load_dotenv()
+
+DISTRICT_CLASSIFICATION_PATH = os.getenv(
+    "DISTRICT_CLASSIFICATION_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "district_classification.csv"))
+
+# Classification of districts not listed in the classification file.
+DEFAULT_TIER = "Other"
+
+# Canonical Pulse state name -> ST_NM of the states GeoJSON used by the choropleths.
+STATE_NAMES = {
+    "Andaman & Nicobar Islands": "Andaman & Nicobar",
+    "Andhra Pradesh": "Andhra Pradesh",
+    "Arunachal Pradesh": "Arunachal Pradesh",
+    "Assam": "Assam",
+    "Bihar": "Bihar",
+    "Chandigarh": "Chandigarh",
+    "Chhattisgarh": "Chhattisgarh",
+    "Dadra & Nagar Haveli & Daman & Diu": "Dadra and Nagar Haveli and Daman and Diu",
+    "Delhi": "Delhi",
+    "Goa": "Goa",
+    "Gujarat": "Gujarat",
+    "Haryana": "Haryana",
+    "Himachal Pradesh": "Himachal Pradesh",
+    "Jammu & Kashmir": "Jammu & Kashmir",
+    "Jharkhand": "Jharkhand",
+    "Karnataka": "Karnataka",
+    "Kerala": "Kerala",
+    "Ladakh": "Ladakh",
+    "Lakshadweep": "Lakshadweep",
+    "Madhya Pradesh": "Madhya Pradesh",
+    "Maharashtra": "Maharashtra",
+    "Manipur": "Manipur",
+    "Meghalaya": "Meghalaya",
+    "Mizoram": "Mizoram",
+    "Nagaland": "Nagaland",
+    "Odisha": "Odisha",
+    "Puducherry": "Puducherry",
+    "Punjab": "Punjab",
+    "Rajasthan": "Rajasthan",
+    "Sikkim": "Sikkim",
+    "Tamil Nadu": "Tamil Nadu",
+    "Telangana": "Telangana",
+    "Tripura": "Tripura",
+    "Uttar Pradesh": "Uttar Pradesh",
+    "Uttarakhand": "Uttarakhand",
+    "West Bengal": "West Bengal",
+}
+
+STATE_FACT_TABLES = ["agg_transaction", "map_transaction", "top_transaction",
+                     "insurance_transaction", "agg_user", "map_user"]
+
+DISTRICT_FACT_COLUMNS = {
+    "map_transaction": "District_name",
+    "map_user": "District",
+}
+
+
+def build_state_dimension(frames):
+    """
+    Build dim_state from STATE_NAMES and every State spelling found in frames.
+    States missing from STATE_NAMES are kept under their own name with a warning,
+    since the choropleth cannot place them.
+
+    Returns:
+    pandas.DataFrame with columns [State_id, State, Geo_name, State_key]
+    """
+    canonical = {state_key(name): (name, geo_name) for name, geo_name in STATE_NAMES.items()}
+    for table in STATE_FACT_TABLES:
+        if table not in frames:
+            continue
+        for name in frames[table]["State"].dropna().unique():
+            key = state_key(name)
+            if key not in canonical:
+                warnings.warn(f"State {name!r} in {table} has no GeoJSON name; add it to STATE_NAMES")
+                canonical[key] = (name, name)
+
+    dim_df = pd.DataFrame(
+        [(name, geo_name, key) for key, (name, geo_name) in canonical.items()],
+        columns=["State", "Geo_name", "State_key"])
+    dim_df = dim_df.sort_values("State", ignore_index=True)
+    dim_df.insert(0, "State_id", range(1, len(dim_df) + 1))
+    return dim_df
+
+
+def attach_state_ids(frames, dim_state_df):
+    """
+    Add State_id to every fact table in frames and store their state names in
+    canonical form.
+
+    Returns:
+    a new dict of frames; frames itself is not modified
+    """
+    frames = dict(frames)
+    canonical_names = dim_state_df.set_index("State_key")["State"]
+    state_ids = dim_state_df.set_index("State")["State_id"]
+    for table in STATE_FACT_TABLES:
+        if table not in frames:
+            continue
+        df = frames[table].copy()
+        # Map each distinct spelling once rather than normalising every row.
+        spellings = pd.Series({name: state_key(name) for name in df["State"].dropna().unique()}, dtype=object)
+        df["State"] = df["State"].map(spellings.map(canonical_names))
+        df["State_id"] = df["State"].map(state_ids).astype("Int32")
+        frames[table] = df
+    return frames
+
+
+def canonical_district_name(names):
+    """
+    Collapse whitespace and title-case a Series of district names.
+    """
+    return names.str.strip().str.replace(r"\s+", " ", regex=True).str.title()
+
+
+def load_district_classification(path=None):
+    """
+    Read the district classification file.
+
+    Returns:
+    pandas.DataFrame with columns [District_key, Is_metro, Tier, Is_urban]
+    """
+    classification_df = pd.read_csv(path or DISTRICT_CLASSIFICATION_PATH)
+    classification_df["District_key"] = classification_df["District"].map(district_key)
+    classification_df["Is_metro"] = classification_df["Is_metro"].fillna(0).astype(int)
+    classification_df["Is_urban"] = classification_df["Is_urban"].fillna(0).astype(int)
+    classification_df["Tier"] = classification_df["Tier"].fillna(DEFAULT_TIER)
+    return classification_df.drop_duplicates("District_key", keep="last")[["District_key", "Is_metro", "Tier", "Is_urban"]]
+
+
+def _district_names(frames):
+    """
+    Every (State, District) spelling of the fact tables, map tables first so their
+    spelling becomes the canonical one. top_transaction district entities are listed
+    without the "District" suffix and only add districts the map tables lack.
+    """
+    names = [frames[table][["State", column]].rename(columns={column: "District"})
+             for table, column in DISTRICT_FACT_COLUMNS.items() if table in frames]
+    if "top_transaction" in frames:
+        top_df = frames["top_transaction"]
+        names.append(top_df.loc[top_df["Entity_type"] == "District", ["State", "Entity_name"]]
+                     .rename(columns={"Entity_name": "District"}))
+    names = pd.concat(names, ignore_index=True).drop_duplicates()
+    names["District"] = canonical_district_name(names["District"])
+    names["District_key"] = names["District"].map(district_key)
+    return names
+
+
+def build_district_dimension(frames, dim_state_df, classification_df=None):
+    """
+    Build dim_district from the district names of map_transaction, map_user and
+    top_transaction. frames must already carry canonical state names (see
+    attach_state_ids). District_id follows the (State, District) sort order,
+    starting at 1.
+
+    Returns:
+    pandas.DataFrame with columns [District_id, State_id, State, District, District_key,
+    Is_metro, Tier, Is_urban]
+    """
+    if classification_df is None:
+        classification_df = load_district_classification()
+
+    dim_df = (_district_names(frames)
+              .drop_duplicates(["State", "District_key"])
+              .sort_values(["State", "District"], ignore_index=True))
+    return _district_rows(dim_df, 1, dim_state_df, classification_df)
+
+
+def _district_rows(names, first_id, dim_state_df, classification_df):
+    """
+    dim_district rows for the sorted (State, District, District_key) names, numbered
+    from first_id.
+    """
+    dim_df = names.copy()
+    dim_df.insert(0, "District_id", range(first_id, first_id + len(dim_df)))
+    dim_df.insert(1, "State_id", dim_df["State"].map(dim_state_df.set_index("State")["State_id"]))
+
+    dim_df = dim_df.merge(classification_df, on="District_key", how="left")
+    dim_df["Is_metro"] = dim_df["Is_metro"].fillna(0).astype(int)
+    dim_df["Is_urban"] = dim_df["Is_urban"].fillna(0).astype(int)
+    dim_df["Tier"] = dim_df["Tier"].fillna(DEFAULT_TIER)
+    return dim_df
+
+
+def _district_lookup(df, state_column, name_column, dim_district_df):
+    """
+    Canonical name and District_id for every row of df, matching each distinct
+    (State, name) once on its district key.
+    """
+    names = df[[state_column, name_column]].drop_duplicates()
+    names["District_key"] = names[name_column].map(district_key)
+    names = names.merge(
+        dim_district_df[["State", "District_key", "District", "District_id"]]
+        .rename(columns={"State": state_column, "District": "Canonical_name"}),
+        on=[state_column, "District_key"], how="left")
+    return df[[state_column, name_column]].merge(names, on=[state_column, name_column], how="left")
+
+
+def attach_district_ids(frames, dim_district_df):
+    """
+    Add District_id to the tables in frames that have districts and store their
+    district names in canonical form. On top_transaction District_id is only set on
+    District rows.
+
+    Returns:
+    a new dict of frames; frames itself is not modified
+    """
+    frames = dict(frames)
+    for table, column in DISTRICT_FACT_COLUMNS.items():
+        if table not in frames:
+            continue
+        df = frames[table].copy()
+        lookup = _district_lookup(df, "State", column, dim_district_df)
+        df[column] = lookup["Canonical_name"].fillna(lookup[column]).to_numpy()
+        # Names without a dimension row keep their spelling and a null id; data_validation.check_keys
+        # reports them.
+        df["District_id"] = pd.array(lookup["District_id"].to_numpy(), dtype="Int32")
+        frames[table] = df
+
+    if "top_transaction" in frames:
+        df = frames["top_transaction"].copy()
+        districts = df["Entity_type"] == "District"
+        lookup = _district_lookup(df[districts], "State", "Entity_name", dim_district_df)
+        df.loc[districts, "Entity_name"] = lookup["Canonical_name"].fillna(lookup["Entity_name"]).to_numpy()
+        df["District_id"] = pd.Series(pd.NA, index=df.index, dtype="Int32")
+        df.loc[districts, "District_id"] = lookup["District_id"].to_numpy()
+        frames["top_transaction"] = df
+    return frames
+
+
+def extend_dimensions(frames, dim_state_df, dim_district_df, classification_df=None):
+    """
+    Key newly extracted frames on the loaded dimensions. States and districts the
+    dimensions do not know yet get the next free ids, so the ids stored on the loaded
+    fact tables stay valid.
+
+    Returns:
+    (frames, new_rows): the keyed frames, and {dimension table: rows to append} for the
+    dimensions that grew
+    """
+    if classification_df is None:
+        classification_df = load_district_classification()
+    new_rows = {}
+
+    states_df = build_state_dimension(frames)
+    new_states = states_df[~states_df["State_key"].isin(dim_state_df["State_key"])].drop(columns="State_id")
+    first_id = int(dim_state_df["State_id"].max()) + 1
+    new_states.insert(0, "State_id", range(first_id, first_id + len(new_states)))
+    if len(new_states):
+        new_rows["dim_state"] = new_states
+        dim_state_df = pd.concat([dim_state_df, new_states], ignore_index=True)
+    frames = attach_state_ids(frames, dim_state_df)
+
+    names = (_district_names(frames)
+             .drop_duplicates(["State", "District_key"])
+             .merge(dim_district_df[["State", "District_key"]], on=["State", "District_key"], how="left", indicator=True))
+    names = (names[names["_merge"] == "left_only"].drop(columns="_merge")
+             .sort_values(["State", "District"], ignore_index=True))
+    if len(names):
+        new_districts = _district_rows(names, int(dim_district_df["District_id"].max()) + 1, dim_state_df,
+                                       classification_df)
+        new_rows["dim_district"] = new_districts
+        dim_district_df = pd.concat([dim_district_df, new_districts], ignore_index=True)
+    return attach_district_ids(frames, dim_district_df), new_rows
+
+
+def build_dimensions(frames, classification_df=None):
+    """
+    Run the dimension stage: build dim_state and dim_district and key the fact tables
+    on them.
+
+    Returns:
+    a new dict of frames including dim_state and dim_district
+    """
+    dim_state_df = build_state_dimension(frames)
+    frames = attach_state_ids(frames, dim_state_df)
+    dim_district_df = build_district_dimension(frames, dim_state_df, classification_df)
+    frames = attach_district_ids(frames, dim_district_df)
+    frames["dim_state"] = dim_state_df
+    frames["dim_district"] = dim_district_df
+    return frames
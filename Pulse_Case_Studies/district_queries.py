@@ -0,0 +1,330 @@
+"""
+district_queries.py
+
+This module contains district and pincode level lookups over map_transaction,
+map_user, dim_district and top_transaction, plus an in-memory prefix/fuzzy search
+index over place names.
+All query functions expect an SQLAlchemy engine object for the database connection.
+"""
+import bisect
+import difflib
+import pandas as pd
+from sqlalchemy import text
+
+from data_loader import create_indexes
+
+
+#Indexes backing the (State_id, Year, Quarter) lookups
+
+# to_sql creates the string columns as TEXT, so MySQL needs a prefix length on them.
+DISTRICT_INDEXES = {
+    "map_transaction": {
+        "idx_map_transaction_state_period": "State_id, Year, Quarter",
+    },
+    "map_user": {
+        "idx_map_user_state_period": "State_id, Year, Quarter",
+    },
+    "top_transaction": {
+        "idx_top_transaction_state_period": "State_id, Year, Quarter, Entity_type(16)",
+        "idx_top_transaction_period_type": "Year, Quarter, Entity_type(16)",
+    },
+}
+
+
+def create_district_indexes(engine, suffix=""):
+    """
+    Create the indexes used by the district and pincode queries if they are missing.
+    Run once after every reload of map_transaction / map_user / top_transaction; suffix
+    selects the shadow tables of a load (see data_loader.load_all).
+    """
+    create_indexes(engine, DISTRICT_INDEXES, suffix)
+
+
+# Facts are filtered on State_id; the state name parameter is resolved through dim_state.
+STATE_FILTER = "State_id = (SELECT State_id FROM dim_state WHERE State = :state)"
+
+
+def _period_filter(year, quarter):
+    clause = "Year = :year"
+    params = {"year": int(year)}
+    if quarter is not None:
+        clause += " AND Quarter = :quarter"
+        params["quarter"] = int(quarter)
+    return clause, params
+
+
+def get_latest_period(engine):
+    """
+    Return the most recent (Year, Quarter) loaded into map_transaction.
+    """
+    query = """
+        SELECT Year, Quarter
+        FROM map_transaction
+        ORDER BY Year DESC, Quarter DESC
+        LIMIT 1;
+    """
+    row = pd.read_sql(query, engine).iloc[0]
+    return int(row["Year"]), int(row["Quarter"])
+
+
+#District lookups
+
+# District names and classification come from dim_district, joined on District_id.
+AREA_TYPE = "CASE WHEN d.Is_metro = 1 THEN 'Metro' ELSE 'Non-Metro' END AS Area_type"
+
+
+def get_district_transactions(engine, state, year, quarter=None):
+    """
+    Fetch transaction volume and value of every district of one state for a year, or a
+    single quarter of it when quarter is given.
+
+    Returns:
+    pandas.DataFrame with columns [State, District, Area_type, Tier, Total_volume, Total_value,
+    Avg_transaction_value]
+    """
+    period, params = _period_filter(year, quarter)
+    query = f"""
+        SELECT
+            d.State,
+            d.District,
+            {AREA_TYPE},
+            d.Tier,
+            t.Total_volume,
+            t.Total_value,
+            ROUND(t.Total_value / NULLIF(t.Total_volume, 0), 2) AS Avg_transaction_value
+        FROM (
+            SELECT District_id,
+                   SUM(Transaction_count) AS Total_volume,
+                   SUM(Transaction_amount) AS Total_value
+            FROM map_transaction
+            WHERE {STATE_FILTER} AND {period}
+            GROUP BY District_id
+        ) t
+        JOIN dim_district d ON d.District_id = t.District_id
+        ORDER BY t.Total_value DESC;
+    """
+    return pd.read_sql(text(query), engine, params={"state": state, **params})
+
+
+def get_top_districts_by_state(engine, year, quarter=None, k=5):
+    """
+    Fetch the top k districts of every state by transaction value, ranked with a
+    window function over the per-district totals.
+
+    Returns:
+    pandas.DataFrame with columns [State, District, Area_type, Tier, Total_volume, Total_value,
+    District_rank]
+    """
+    period, params = _period_filter(year, quarter)
+    query = f"""
+        SELECT d.State, d.District, {AREA_TYPE}, d.Tier,
+               r.Total_volume, r.Total_value, r.District_rank
+        FROM (
+            SELECT
+                District_id,
+                SUM(Transaction_count) AS Total_volume,
+                SUM(Transaction_amount) AS Total_value,
+                ROW_NUMBER() OVER (PARTITION BY State_id ORDER BY SUM(Transaction_amount) DESC) AS District_rank
+            FROM map_transaction
+            WHERE {period}
+            GROUP BY State_id, District_id
+        ) r
+        JOIN dim_district d ON d.District_id = r.District_id
+        WHERE r.District_rank <= :k
+        ORDER BY d.State, r.District_rank;
+    """
+    return pd.read_sql(text(query), engine, params={"k": int(k), **params})
+
+
+def get_district_map_data(engine, state, year, quarter=None):
+    """
+    Fetch per-district transactions and users of one state for the drill-down map.
+    Only the selected state and period are read from map_transaction and map_user.
+
+    Returns:
+    pandas.DataFrame with columns [State, District, District_key, Area_type, Tier, Total_volume,
+    Total_value, Registered_users, App_opens]; District_key matches the District_key property
+    of the geo_shards features
+    """
+    period, params = _period_filter(year, quarter)
+    query = f"""
+        SELECT
+            d.State,
+            d.District,
+            d.District_key,
+            {AREA_TYPE},
+            d.Tier,
+            t.Total_volume,
+            t.Total_value,
+            u.Registered_users,
+            u.App_opens
+        FROM (
+            SELECT District_id,
+                   SUM(Transaction_count) AS Total_volume,
+                   SUM(Transaction_amount) AS Total_value
+            FROM map_transaction
+            WHERE {STATE_FILTER} AND {period}
+            GROUP BY District_id
+        ) t
+        JOIN dim_district d ON d.District_id = t.District_id
+        LEFT JOIN (
+            SELECT District_id,
+                   SUM(Registered_users) AS Registered_users,
+                   SUM(App_opens) AS App_opens
+            FROM map_user
+            WHERE {STATE_FILTER} AND {period}
+            GROUP BY District_id
+        ) u ON u.District_id = t.District_id
+        ORDER BY t.Total_value DESC;
+    """
+    return pd.read_sql(text(query), engine, params={"state": state, **params})
+
+
+def get_available_periods(engine):
+    """
+    Fetch every (Year, Quarter) loaded into map_transaction, most recent first.
+    """
+    query = """
+        SELECT DISTINCT Year, Quarter
+        FROM map_transaction
+        ORDER BY Year DESC, Quarter DESC;
+    """
+    return pd.read_sql(query, engine)
+
+
+#Pincode lookups
+
+
+def get_pincode_transactions(engine, state, year, quarter=None):
+    """
+    Fetch the top pincodes reported for one state for a year, or a single quarter of it.
+
+    Returns:
+    pandas.DataFrame with columns [State, Pincode, Total_volume, Total_value]
+    """
+    period, params = _period_filter(year, quarter)
+    query = f"""
+        SELECT
+            :state AS State,
+            Entity_name AS Pincode,
+            SUM(Transaction_count) AS Total_volume,
+            SUM(Transaction_amount) AS Total_value
+        FROM top_transaction
+        WHERE {STATE_FILTER} AND {period} AND Entity_type = 'Pincode'
+        GROUP BY Entity_name
+        ORDER BY Total_value DESC;
+    """
+    return pd.read_sql(text(query), engine, params={"state": state, **params})
+
+
+def get_top_pincodes_by_state(engine, year, quarter=None, k=10):
+    """
+    Fetch the top k pincodes of every state by transaction value, ranked with a window
+    function over the per-pincode totals.
+
+    Returns:
+    pandas.DataFrame with columns [State, Pincode, Total_volume, Total_value, Pincode_rank]
+    """
+    period, params = _period_filter(year, quarter)
+    query = f"""
+        SELECT s.State, r.Pincode, r.Total_volume, r.Total_value, r.Pincode_rank
+        FROM (
+            SELECT
+                State_id,
+                Entity_name AS Pincode,
+                SUM(Transaction_count) AS Total_volume,
+                SUM(Transaction_amount) AS Total_value,
+                ROW_NUMBER() OVER (PARTITION BY State_id ORDER BY SUM(Transaction_amount) DESC) AS Pincode_rank
+            FROM top_transaction
+            WHERE {period} AND Entity_type = 'Pincode'
+            GROUP BY State_id, Entity_name
+        ) r
+        JOIN dim_state s ON s.State_id = r.State_id
+        WHERE r.Pincode_rank <= :k
+        ORDER BY s.State, r.Pincode_rank;
+    """
+    return pd.read_sql(text(query), engine, params={"k": int(k), **params})
+
+
+#Search index for the dashboard search box
+
+
+class PlaceSearchIndex:
+    """
+    In-memory prefix and fuzzy search over district and pincode names.
+
+    Every word of a name is indexed, so "urban" finds "Bengaluru Urban District".
+    Prefix lookups are a binary search over the sorted word list; when they find too
+    few places, difflib fuzzy matching against the same words fills the rest.
+    """
+
+    def __init__(self, places):
+        # places: iterable of (Name, Type, State)
+        self.places = sorted(set(places))
+        entries = set()
+        for position, (name, _, _) in enumerate(self.places):
+            words = name.lower().split()
+            for start in range(len(words)):
+                entries.add((" ".join(words[start:]), position))
+        self._entries = sorted(entries)
+        self._keys = [key for key, _ in self._entries]
+        # Distinct word prefixes of each length, built on the first fuzzy lookup of a
+        # query that long and reused for every later keystroke.
+        self._prefixes = {}
+
+    def _scan(self, key_prefix, found, limit):
+        index = bisect.bisect_left(self._keys, key_prefix)
+        while index < len(self._keys) and len(found) < limit and self._keys[index].startswith(key_prefix):
+            position = self._entries[index][1]
+            if position not in found:
+                found.append(position)
+            index += 1
+        return found
+
+    def prefix(self, query, limit=10):
+        query = query.strip().lower()
+        if not query:
+            return []
+        return self._scan(query, [], limit)
+
+    def fuzzy(self, query, limit=10, cutoff=0.6):
+        query = query.strip().lower()
+        if not query:
+            return []
+        # Compare against word prefixes of the same length as the query.
+        candidates = self._prefixes.get(len(query))
+        if candidates is None:
+            candidates = self._prefixes[len(query)] = sorted({key[:len(query)] for key in self._keys})
+        found = []
+        for match in difflib.get_close_matches(query, candidates, n=limit, cutoff=cutoff):
+            self._scan(match, found, limit)
+        return found
+
+    def search(self, query, limit=10):
+        """
+        Return up to limit matching places, prefix matches first.
+
+        Returns:
+        pandas.DataFrame with columns [Name, Type, State]
+        """
+        positions = self.prefix(query, limit)
+        if len(positions) < limit:
+            positions += [p for p in self.fuzzy(query, limit) if p not in positions][:limit - len(positions)]
+        return pd.DataFrame([self.places[p] for p in positions], columns=["Name", "Type", "State"])
+
+
+def build_place_search_index(engine):
+    """
+    Build a PlaceSearchIndex over every district in dim_district and every pincode
+    in top_transaction.
+    """
+    query = """
+        SELECT District AS Name, 'District' AS Type, State
+        FROM dim_district
+        UNION
+        SELECT DISTINCT Entity_name AS Name, 'Pincode' AS Type, State
+        FROM top_transaction
+        WHERE Entity_type = 'Pincode';
+    """
+    places_df = pd.read_sql(query, engine)
+    return PlaceSearchIndex(places_df.itertuples(index=False, name=None))
@@ -0,0 +1,239 @@
+"""
+forecasting.py
+
+This module forecasts quarterly transaction volume and value for every state and
+transaction type, and for every state's total over all types (Transaction_type
+ALL_TYPES). The total is forecast as a series of its own: summing the intervals of the
+per-type forecasts would not give a prediction interval of the total.
+
+All series are stacked into one 2-D matrix (one row per series, one column per
+quarter) and fitted together: an additive Holt-Winters model on log values is run
+over the whole matrix for each point of a small parameter grid, and every series keeps
+the parameters with the lowest one-step-ahead error. Fitted forecasts are cached on
+disk per data version.
+"""
+import os
+import glob
+import tempfile
+import itertools
+import numpy as np
+import pandas as pd
+
+SEASON = 4
+ALL_TYPES = "All"
+# Bumped whenever the layout of the cached forecast frames changes.
+CACHE_FORMAT = 2
+
+PARAMETER_GRID = {
+    "alpha": (0.2, 0.5, 0.8),
+    "beta": (0.05, 0.2),
+    "gamma": (0.1, 0.3, 0.6),
+}
+
+FORECAST_CACHE_DIR = os.getenv(
+    "FORECAST_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "forecasts"))
+
+
+def build_series_matrix(slices_df, keys, value_columns):
+    """
+    Pivot a (keys, Year, Quarter) frame into one row per series and one column per
+    quarter, from the first to the last quarter in the data. Missing quarters are NaN.
+
+    Returns:
+    (keys_df, periods, matrices) where periods is a list of (Year, Quarter) and
+    matrices maps each value column to an (n_series, n_periods) array
+    """
+    period_index = slices_df["Year"] * 4 + slices_df["Quarter"] - 1
+    first, last = int(period_index.min()), int(period_index.max())
+    periods = [(p // 4, p % 4 + 1) for p in range(first, last + 1)]
+
+    totals = (slices_df.assign(Period=period_index)
+              .groupby(keys + ["Period"])[value_columns].sum())
+    keys_df = totals.index.droplevel("Period").unique().to_frame(index=False)
+
+    matrices = {}
+    for column in value_columns:
+        wide = totals[column].unstack("Period").reindex(columns=range(first, last + 1))
+        wide = wide.reindex(pd.MultiIndex.from_frame(keys_df) if len(keys) > 1 else keys_df[keys[0]])
+        matrices[column] = wide.to_numpy(dtype=float)
+    return keys_df, periods, matrices
+
+
+def _initial_state(Y, season):
+    # Leading gaps (series that start later) are back-filled for initialisation only.
+    filled = pd.DataFrame(Y).bfill(axis=1).ffill(axis=1).fillna(0).to_numpy()
+    first = filled[:, :season].mean(axis=1)
+    second = filled[:, season:2 * season].mean(axis=1)
+    level = first
+    trend = (second - first) / season
+    seasonal = filled[:, :season] - first[:, None]
+    return level, trend, seasonal
+
+
+def _run_holt_winters(Y, alpha, beta, gamma, season):
+    """
+    Run one additive Holt-Winters pass over every row of Y at once.
+
+    Returns:
+    (level, trend, seasonal, sse, observations) after the last period
+    """
+    n, T = Y.shape
+    level, trend, seasonal = _initial_state(Y, season)
+    seasonal = seasonal.copy()
+    sse = np.zeros(n)
+    observations = np.zeros(n)
+
+    for t in range(T):
+        y = Y[:, t]
+        observed = ~np.isnan(y)
+        s = seasonal[:, t % season]
+        predicted = level + trend + s
+
+        if t >= season:
+            error = np.where(observed, y - predicted, 0.0)
+            sse += error ** 2
+            observations += observed
+
+        new_level = np.where(observed, alpha * (y - s) + (1 - alpha) * (level + trend), level + trend)
+        trend = np.where(observed, beta * (new_level - level) + (1 - beta) * trend, trend)
+        seasonal[:, t % season] = np.where(observed, gamma * (y - new_level) + (1 - gamma) * s, s)
+        level = new_level
+
+    return level, trend, seasonal, sse, observations
+
+
+def fit_seasonal_models(matrix, season=SEASON):
+    """
+    Fit an additive Holt-Winters model on log1p values to every row of matrix,
+    choosing alpha/beta/gamma per row from PARAMETER_GRID.
+
+    Returns:
+    dict of per-series arrays: level, trend, seasonal, sigma, alpha, beta, gamma,
+    plus the number of fitted periods
+    """
+    Y = np.log1p(np.clip(matrix, 0, None))
+    n, T = Y.shape
+    if T < 2 * season:
+        raise ValueError(f"At least {2 * season} quarters are needed to fit seasonal models, got {T}")
+
+    best = None
+    for alpha, beta, gamma in itertools.product(*PARAMETER_GRID.values()):
+        level, trend, seasonal, sse, observations = _run_holt_winters(Y, alpha, beta, gamma, season)
+        candidate = {
+            "level": level, "trend": trend, "seasonal": seasonal,
+            "sse": sse, "observations": observations,
+            "alpha": np.full(n, alpha), "beta": np.full(n, beta), "gamma": np.full(n, gamma),
+        }
+        if best is None:
+            best = candidate
+            continue
+        better = sse < best["sse"]
+        for name, values in candidate.items():
+            if values.ndim == 1:
+                best[name] = np.where(better, values, best[name])
+            else:
+                best[name] = np.where(better[:, None], values, best[name])
+
+    best["sigma"] = np.sqrt(best.pop("sse") / np.maximum(best.pop("observations"), 1))
+    best["periods"] = T
+    return best
+
+
+def forecast_models(models, horizon, season=SEASON, z=1.96):
+    """
+    Forecast every fitted series horizon quarters ahead.
+
+    Returns:
+    (mean, lower, upper), each an (n_series, horizon) array on the original scale
+    """
+    steps = np.arange(1, horizon + 1)
+    season_index = (models["periods"] + steps - 1) % season
+    log_mean = models["level"][:, None] + steps[None, :] * models["trend"][:, None] + models["seasonal"][:, season_index]
+    spread = z * models["sigma"][:, None] * np.sqrt(steps)[None, :]
+    return (np.expm1(log_mean),
+            np.clip(np.expm1(log_mean - spread), 0, None),
+            np.expm1(log_mean + spread))
+
+
+def forecast_transactions(slices_df, horizon=4):
+    """
+    Forecast transaction volume and value for every State x Transaction_type series in
+    the frame returned by data_queries.get_transaction_slices, plus each state's total
+    as Transaction_type ALL_TYPES. Volume and value series are fitted in the same batch.
+
+    Returns:
+    pandas.DataFrame with columns [State, Transaction_type, Year, Quarter,
+    Forecast_volume, Volume_lower, Volume_upper, Forecast_value, Value_lower, Value_upper]
+    """
+    keys = ["State", "Transaction_type"]
+    state_totals_df = (slices_df.groupby(["State", "Year", "Quarter"], as_index=False)[["Total_volume", "Total_value"]]
+                       .sum().assign(Transaction_type=ALL_TYPES))
+    keys_df, periods, matrices = build_series_matrix(
+        pd.concat([slices_df, state_totals_df], ignore_index=True), keys, ["Total_volume", "Total_value"])
+    n = len(keys_df)
+
+    models = fit_seasonal_models(np.vstack([matrices["Total_volume"], matrices["Total_value"]]))
+    mean, lower, upper = forecast_models(models, horizon)
+
+    last_year, last_quarter = periods[-1]
+    last_period = last_year * 4 + last_quarter - 1
+    future = [((last_period + h) // 4, (last_period + h) % 4 + 1) for h in range(1, horizon + 1)]
+
+    forecast_df = keys_df.loc[keys_df.index.repeat(horizon)].reset_index(drop=True)
+    forecast_df["Year"] = [year for year, _ in future] * n
+    forecast_df["Quarter"] = [quarter for _, quarter in future] * n
+    forecast_df["Forecast_volume"] = mean[:n].ravel().round(0)
+    forecast_df["Volume_lower"] = lower[:n].ravel().round(0)
+    forecast_df["Volume_upper"] = upper[:n].ravel().round(0)
+    forecast_df["Forecast_value"] = mean[n:].ravel().round(2)
+    forecast_df["Value_lower"] = lower[n:].ravel().round(2)
+    forecast_df["Value_upper"] = upper[n:].ravel().round(2)
+    return forecast_df
+
+
+def data_fingerprint(df):
+    """
+    Short content hash of a frame, used as the data version of cached forecasts.
+    """
+    return format(int(pd.util.hash_pandas_object(df, index=False).sum()) & 0xFFFFFFFFFFFF, "012x")
+
+
+def get_cached_forecasts(slices_df, horizon=4, cache_dir=None):
+    """
+    Return forecast_transactions(slices_df, horizon), reading it from the on-disk cache
+    when the same data version has been forecast before. Writing a new data version
+    removes the cached forecasts of older ones.
+    """
+    cache_dir = cache_dir or FORECAST_CACHE_DIR
+    prefix = f"forecasts_v{CACHE_FORMAT}_{data_fingerprint(slices_df)}_"
+    path = os.path.join(cache_dir, f"{prefix}h{horizon}.pkl")
+    if os.path.exists(path):
+        return pd.read_pickle(path)
+
+    forecast_df = forecast_transactions(slices_df, horizon)
+    os.makedirs(cache_dir, exist_ok=True)
+    # A temp file of its own per writer, so concurrent sessions never share a half-written file.
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            forecast_df.to_pickle(f)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    prune_forecast_cache(cache_dir, keep=prefix)
+    return forecast_df
+
+
+def prune_forecast_cache(cache_dir, keep):
+    """
+    Delete the cached forecasts whose file name does not start with keep (other data
+    versions or cache formats); forecasts of the kept version at other horizons stay.
+    """
+    for path in glob.glob(os.path.join(cache_dir, "forecasts_*.pkl")):
+        if not os.path.basename(path).startswith(keep):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
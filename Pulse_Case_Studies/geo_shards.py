@@ -0,0 +1,115 @@
+"""
+geo_shards.py
+
+This module serves district boundaries for the state -> district drill-down map.
+
+The all-India district GeoJSON is split once into one shard per state on disk. Pages
+then load only the shard of the state being viewed, and each shard is kept in memory
+after its first use.
+"""
+import os
+import re
+import json
+import threading
+import urllib.request
+from functools import lru_cache
+from dotenv import load_dotenv
+
+load_dotenv()
+
+STATE_GEOJSON_URL = "https://gist.githubusercontent.com/jbrobst/56c13bbbf9d97d187fea01ca62ea5112/raw/e388c4cae20aa53cb5090210a42ebb9b765c0a36/india_states.geojson"
+
+DISTRICT_GEOJSON_URL = os.getenv(
+    "DISTRICT_GEOJSON_URL",
+    "https://raw.githubusercontent.com/udit-001/india-maps-data/main/geojson/india.geojson")
+DISTRICT_STATE_PROPERTY = os.getenv("DISTRICT_GEOJSON_STATE_PROPERTY", "st_nm")
+DISTRICT_NAME_PROPERTY = os.getenv("DISTRICT_GEOJSON_DISTRICT_PROPERTY", "district")
+SHARD_DIR = os.getenv("GEO_SHARD_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "geo_shards"))
+
+# Property added to every district feature; the map joins on it.
+DISTRICT_KEY_PROPERTY = "District_key"
+
+_STATE_ALIASES = {
+    "orissa": "odisha",
+    "uttaranchal": "uttarakhand",
+    "pondicherry": "puducherry",
+    "nctofdelhi": "delhi",
+}
+
+_shard_lock = threading.Lock()
+
+
+def state_key(name):
+    """
+    Reduce a state name to the key used for shard file names, so that Pulse names
+    ("Andaman & Nicobar Islands") and GeoJSON names ("Andaman and Nicobar") agree.
+    """
+    key = re.sub(r"[^a-z]", "", name.lower().replace("&", "and"))
+    key = key.replace("islands", "")
+    return _STATE_ALIASES.get(key, key)
+
+
+def district_key(name):
+    """
+    Reduce a district name to the key shared by the map data and the shard features.
+    """
+    name = re.sub(r"\bdistrict\b", "", name.lower().replace("&", "and"))
+    return re.sub(r"[^a-z0-9]", "", name)
+
+
+def _shard_path(state, shard_dir):
+    return os.path.join(shard_dir, state_key(state) + ".geojson")
+
+
+def _read_geojson(source):
+    if re.match(r"https?://", source):
+        with urllib.request.urlopen(source) as response:
+            return json.load(response)
+    with open(source, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def build_district_shards(source=None, shard_dir=None):
+    """
+    Split an all-India district GeoJSON (URL or local path) into one file per state.
+
+    Returns:
+    int, the number of shards written
+    """
+    source = source or DISTRICT_GEOJSON_URL
+    shard_dir = shard_dir or SHARD_DIR
+    os.makedirs(shard_dir, exist_ok=True)
+
+    shards = {}
+    for feature in _read_geojson(source)["features"]:
+        properties = feature["properties"]
+        properties[DISTRICT_KEY_PROPERTY] = district_key(properties[DISTRICT_NAME_PROPERTY])
+        key = state_key(properties[DISTRICT_STATE_PROPERTY])
+        shards.setdefault(key, []).append(feature)
+
+    for key, features in shards.items():
+        path = os.path.join(shard_dir, key + ".geojson")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"type": "FeatureCollection", "features": features}, f, separators=(",", ":"))
+        os.replace(path + ".tmp", path)
+
+    load_state_districts.cache_clear()
+    return len(shards)
+
+
+@lru_cache(maxsize=64)
+def load_state_districts(state, shard_dir=None):
+    """
+    Return the district FeatureCollection of one state, building the shards from the
+    all-India file the first time any shard is requested.
+    """
+    shard_dir = shard_dir or SHARD_DIR
+    path = _shard_path(state, shard_dir)
+    if not os.path.exists(path):
+        with _shard_lock:
+            if not (os.path.isdir(shard_dir) and os.listdir(shard_dir)):
+                build_district_shards(shard_dir=shard_dir)
+    if not os.path.exists(path):
+        return {"type": "FeatureCollection", "features": []}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
@@ -0,0 +1,244 @@
+"""
+growth_metrics.py
+
+This module computes the growth metrics stage of the load: quarterly and yearly
+transaction totals with QoQ, YoY, CAGR and rolling 4-quarter sums, for every state,
+every state and transaction type, and every district.
+
+Everything is computed with vectorized pandas operations over the extracted
+agg_transaction and map_transaction frames, so the dashboard queries that need growth
+figures become plain lookups on the growth_quarterly and growth_yearly tables. When a
+new quarter is appended, update_growth_metrics folds it into the existing tables instead
+of rebuilding them.
+"""
+import time
+import numpy as np
+import pandas as pd
+
+ALL = "All"
+
+GROWTH_KEYS = ["Level", "State", "District", "Transaction_type"]
+
+
+def _level_frames(agg_transaction_df, map_transaction_df):
+    """
+    Stack the three levels into one frame with the shared key columns.
+    """
+    state_df = agg_transaction_df.assign(Level="State", District=ALL, Transaction_type=ALL)
+    type_df = agg_transaction_df.assign(Level="Transaction_type", District=ALL)
+    district_df = (map_transaction_df
+                   .rename(columns={"District_name": "District"})
+                   .assign(Level="District", Transaction_type=ALL))
+    columns = GROWTH_KEYS + ["Year", "Quarter", "Transaction_count", "Transaction_amount"]
+    return pd.concat([state_df[columns], type_df[columns], district_df[columns]], ignore_index=True)
+
+
+def _pct_change(current, previous):
+    return ((current - previous) * 100.0 / previous.where(previous != 0)).round(4)
+
+
+def _lagged(frame, keys, period_column, columns, lag, suffix):
+    """
+    Look up the values of columns lag periods earlier for the same keys. Missing
+    periods give NaN instead of silently comparing against the wrong quarter.
+    """
+    lagged = frame[keys + [period_column] + columns].copy()
+    lagged[period_column] = lagged[period_column] + lag
+    lagged = lagged.rename(columns={column: column + suffix for column in columns})
+    return frame.merge(lagged, on=keys + [period_column], how="left")
+
+
+def _quarterly_totals(agg_transaction_df, map_transaction_df):
+    quarterly = (_level_frames(agg_transaction_df, map_transaction_df)
+                 .groupby(GROWTH_KEYS + ["Year", "Quarter"], as_index=False)[["Transaction_count", "Transaction_amount"]]
+                 .sum()
+                 .rename(columns={"Transaction_count": "Volume", "Transaction_amount": "Value"}))
+    quarterly["Period"] = quarterly["Year"] * 4 + quarterly["Quarter"] - 1
+    return quarterly
+
+
+def _quarterly_metrics(quarterly):
+    """
+    Add the QoQ, YoY and rolling figures to a frame of quarterly totals with a Period
+    column. Every figure only looks back at most 3 (rolling) or 4 (YoY) quarters.
+    """
+    values = ["Volume", "Value"]
+    for lag in (1, 2, 3, 4):
+        quarterly = _lagged(quarterly, GROWTH_KEYS, "Period", values, lag, f"_lag{lag}")
+
+    quarterly["Volume_QoQ_pct"] = _pct_change(quarterly["Volume"], quarterly["Volume_lag1"])
+    quarterly["Value_QoQ_pct"] = _pct_change(quarterly["Value"], quarterly["Value_lag1"])
+    quarterly["Volume_YoY_pct"] = _pct_change(quarterly["Volume"], quarterly["Volume_lag4"])
+    quarterly["Value_YoY_pct"] = _pct_change(quarterly["Value"], quarterly["Value_lag4"])
+
+    # A rolling 4-quarter sum is only reported when all four quarters are present.
+    for value in values:
+        window = [value] + [f"{value}_lag{lag}" for lag in (1, 2, 3)]
+        quarterly[f"Rolling4_{value.lower()}"] = quarterly[window].sum(axis=1, min_count=4)
+    return quarterly
+
+
+QUARTERLY_COLUMNS = GROWTH_KEYS + ["Year", "Quarter", "Volume", "Value",
+                                   "Volume_QoQ_pct", "Value_QoQ_pct", "Volume_YoY_pct", "Value_YoY_pct",
+                                   "Rolling4_volume", "Rolling4_value"]
+
+
+def build_quarterly_growth(agg_transaction_df, map_transaction_df):
+    """
+    Build the growth_quarterly table.
+
+    Returns:
+    pandas.DataFrame with columns [Level, State, District, Transaction_type, Year, Quarter,
+    Volume, Value, Volume_QoQ_pct, Value_QoQ_pct, Volume_YoY_pct, Value_YoY_pct,
+    Rolling4_volume, Rolling4_value]
+    """
+    quarterly = _quarterly_metrics(_quarterly_totals(agg_transaction_df, map_transaction_df))
+    return quarterly[QUARTERLY_COLUMNS].sort_values(GROWTH_KEYS + ["Year", "Quarter"], ignore_index=True)
+
+
+def _yearly_metrics(yearly):
+    """
+    Add the previous-year, YoY, cumulative and CAGR figures to a frame of yearly totals
+    [*GROWTH_KEYS, Year, Quarters, Volume, Value]. Each series only needs its own rows.
+    """
+    yearly = _lagged(yearly, GROWTH_KEYS, "Year", ["Volume", "Value"], 1, "_prev")
+    yearly = yearly.rename(columns={"Volume_prev": "Prev_year_volume", "Value_prev": "Prev_year_value"})
+    yearly["Volume_YoY_pct"] = _pct_change(yearly["Volume"], yearly["Prev_year_volume"])
+    yearly["Value_YoY_pct"] = _pct_change(yearly["Value"], yearly["Prev_year_value"])
+
+    yearly = yearly.sort_values(GROWTH_KEYS + ["Year"], ignore_index=True)
+    series = yearly.groupby(GROWTH_KEYS, sort=False)
+    yearly["Cumulative_volume"] = series["Volume"].cumsum()
+    yearly["Cumulative_value"] = series["Value"].cumsum()
+
+    first_year = series["Year"].transform("min")
+    first_value = series["Value"].transform("first")
+    span = (yearly["Year"] - first_year).where(lambda years: years > 0)
+    ratio = (yearly["Value"] / first_value.where(first_value > 0)).where(lambda r: r > 0)
+    yearly["Value_CAGR_pct"] = ((np.power(ratio, 1.0 / span) - 1) * 100).where(span.notna()).round(4)
+    return yearly
+
+
+YEARLY_TOTALS = GROWTH_KEYS + ["Year", "Quarters", "Volume", "Value"]
+
+
+def build_yearly_growth(quarterly_df):
+    """
+    Build the growth_yearly table from growth_quarterly.
+
+    Quarters is the number of quarters reported in the year, so a partial latest year
+    can be told apart from a full one. Cumulative figures run from the first year up to
+    and including the row's year; CAGR is measured from the first year of the series.
+
+    Returns:
+    pandas.DataFrame with columns [Level, State, District, Transaction_type, Year, Quarters,
+    Volume, Value, Prev_year_volume, Prev_year_value, Volume_YoY_pct, Value_YoY_pct,
+    Cumulative_volume, Cumulative_value, Value_CAGR_pct, Is_latest_year]
+    """
+    yearly = (quarterly_df
+              .groupby(GROWTH_KEYS + ["Year"], as_index=False)
+              .agg(Quarters=("Quarter", "nunique"), Volume=("Volume", "sum"), Value=("Value", "sum")))
+
+    yearly = _yearly_metrics(yearly)
+    yearly["Is_latest_year"] = (yearly["Year"] == yearly["Year"].max()).astype(int)
+    return yearly
+
+
+def build_growth_metrics(agg_transaction_df, map_transaction_df):
+    """
+    Build both growth tables, keyed by table name.
+    """
+    quarterly_df = build_quarterly_growth(agg_transaction_df, map_transaction_df)
+    return {
+        "growth_quarterly": quarterly_df,
+        "growth_yearly": build_yearly_growth(quarterly_df),
+    }
+
+
+#Incremental maintenance
+
+
+def update_growth_metrics(growth_frames, agg_transaction_df, map_transaction_df):
+    """
+    Bring existing growth tables up to date with the quarters of agg_transaction_df and
+    map_transaction_df that are newer than growth_quarterly, without rebuilding history.
+
+    Only the new quarters are aggregated. Their QoQ/YoY/rolling figures are computed
+    against the last four quarters already in growth_quarterly, their sums are added
+    into the yearly totals, and the yearly figures are recomputed for the series
+    that received data only. Restating a quarter that is already loaded needs a full
+    build_growth_metrics.
+
+    Returns:
+    dict with the updated growth_quarterly and growth_yearly frames
+    """
+    quarterly_df = growth_frames["growth_quarterly"]
+    yearly_df = growth_frames["growth_yearly"]
+    latest = int((quarterly_df["Year"] * 4 + quarterly_df["Quarter"] - 1).max())
+
+    def newer(df):
+        return df[df["Year"] * 4 + df["Quarter"] - 1 > latest]
+
+    new_totals = _quarterly_totals(newer(agg_transaction_df), newer(map_transaction_df))
+    if new_totals.empty:
+        return {"growth_quarterly": quarterly_df, "growth_yearly": yearly_df}
+
+    history = quarterly_df[quarterly_df["Year"] * 4 + quarterly_df["Quarter"] - 1 > latest - 4]
+    history = history[GROWTH_KEYS + ["Year", "Quarter", "Volume", "Value"]].assign(
+        Period=lambda df: df["Year"] * 4 + df["Quarter"] - 1)
+    window = _quarterly_metrics(pd.concat([history, new_totals], ignore_index=True))
+    new_quarterly = window[window["Period"] > latest][QUARTERLY_COLUMNS]
+    quarterly_df = (pd.concat([quarterly_df, new_quarterly], ignore_index=True)
+                    .sort_values(GROWTH_KEYS + ["Year", "Quarter"], ignore_index=True))
+
+    # Add the new quarters into the yearly totals and recompute the touched series.
+    delta = (new_quarterly.groupby(GROWTH_KEYS + ["Year"], as_index=False)
+             .agg(Quarters=("Quarter", "nunique"), Volume=("Volume", "sum"), Value=("Value", "sum")))
+    touched = yearly_df.set_index(GROWTH_KEYS).index.isin(delta.set_index(GROWTH_KEYS).index)
+    totals = (pd.concat([yearly_df.loc[touched, YEARLY_TOTALS], delta], ignore_index=True)
+              .groupby(GROWTH_KEYS + ["Year"], as_index=False)[["Quarters", "Volume", "Value"]].sum())
+
+    yearly_df = pd.concat([yearly_df[~touched], _yearly_metrics(totals)], ignore_index=True)
+    yearly_df["Is_latest_year"] = (yearly_df["Year"] == yearly_df["Year"].max()).astype(int)
+    yearly_df = yearly_df.sort_values(GROWTH_KEYS + ["Year"], ignore_index=True)
+    return {"growth_quarterly": quarterly_df, "growth_yearly": yearly_df}
+
+
+def compare_incremental_growth(agg_transaction_df, map_transaction_df, quarters=1):
+    """
+    Check update_growth_metrics against a full rebuild: build the tables without the
+    last quarters, append them incrementally, and compare with build_growth_metrics on
+    all the data.
+
+    Returns:
+    dict with Full_seconds, Incremental_seconds and Mismatches, the number of rows
+    that differ between the two results
+    """
+    period = lambda df: df["Year"] * 4 + df["Quarter"] - 1
+    cutoff = int(period(agg_transaction_df).max()) - quarters
+    base = build_growth_metrics(agg_transaction_df[period(agg_transaction_df) <= cutoff],
+                                map_transaction_df[period(map_transaction_df) <= cutoff])
+
+    start = time.perf_counter()
+    incremental = update_growth_metrics(base, agg_transaction_df, map_transaction_df)
+    incremental_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    full = build_growth_metrics(agg_transaction_df, map_transaction_df)
+    full_seconds = time.perf_counter() - start
+
+    mismatches = 0
+    for table, full_df in full.items():
+        incremental_df = incremental[table][full_df.columns]
+        if len(incremental_df) != len(full_df):
+            mismatches += abs(len(incremental_df) - len(full_df))
+            continue
+        numeric = full_df.select_dtypes("number").columns
+        labels = full_df.columns.difference(numeric)
+        same = np.isclose(full_df[numeric].to_numpy(dtype=float), incremental_df[numeric].to_numpy(dtype=float),
+                          rtol=1e-9, atol=1e-6, equal_nan=True).all(axis=1)
+        same &= (full_df[labels].fillna("").to_numpy() == incremental_df[labels].fillna("").to_numpy()).all(axis=1)
+        mismatches += int((~same).sum())
+
+    return {"Full_seconds": round(full_seconds, 4), "Incremental_seconds": round(incremental_seconds, 4),
+            "Mismatches": mismatches}
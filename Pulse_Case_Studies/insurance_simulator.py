@@ -0,0 +1,161 @@
+"""
+insurance_simulator.py
+
+This module answers insurance what-if questions such as "if adoption in Bihar reached
+the national median, how many more insurance transactions, and how much more value,
+would that bring?".
+
+state_baselines computes, once per data version, each state's registered users,
+adoption rate (insurance transactions per registered user over the last WINDOW
+quarters) and average premium (value per insurance transaction). A scenario is a
+vector of target adoption rates, one per state; any number of scenarios are stacked
+into a (scenarios x states) matrix and evaluated with one NumPy broadcast against the
+baselines:
+
+    incremental transactions = max(target rate - current rate, 0) * registered users
+    incremental value        = incremental transactions * average premium
+
+Nothing here touches the database once the baselines are built.
+"""
+import numpy as np
+import pandas as pd
+
+WINDOW = 4
+BASELINE_COLUMNS = ["State", "Registered_users", "Insurance_txn_count", "Insurance_txn_amount",
+                    "Adoption_rate", "Avg_premium"]
+
+
+#Baselines
+
+
+def state_baselines(insurance_slices_df, state_user_slices_df, end=None, window=WINDOW):
+    """
+    Per-state user base, adoption rate and average premium over the window quarters
+    ending at period index end (Year * 4 + Quarter - 1; default: the latest quarter).
+
+    insurance_slices_df: data_queries.get_insurance_slices
+    state_user_slices_df: data_queries.get_state_user_slices (map_user totals; agg_user stops after 2022 Q1)
+
+    Returns:
+    pandas.DataFrame with columns BASELINE_COLUMNS, one row per state with registered users,
+    sorted by State
+    """
+    insurance_period = insurance_slices_df["Year"] * 4 + insurance_slices_df["Quarter"] - 1
+    if end is None:
+        end = int(insurance_period.max())
+    age = end - insurance_period
+    insurance = (insurance_slices_df[(age >= 0) & (age < window)]
+                 .groupby("State")[["Insurance_txn_count", "Insurance_txn_amount"]].sum())
+
+    # Registered users are a running total: take the latest figure up to end.
+    users_df = state_user_slices_df
+    users_df = users_df[users_df["Year"] * 4 + users_df["Quarter"] - 1 <= end].sort_values(["Year", "Quarter"])
+    users = users_df.groupby("State")["Registered_users"].last()
+
+    baseline_df = pd.concat([users, insurance], axis=1).fillna(0).rename_axis("State").reset_index()
+    baseline_df = baseline_df[baseline_df["Registered_users"] > 0]
+    baseline_df["Adoption_rate"] = baseline_df["Insurance_txn_count"] / baseline_df["Registered_users"]
+    # States without insurance transactions take the national average premium.
+    national_premium = baseline_df["Insurance_txn_amount"].sum() / max(baseline_df["Insurance_txn_count"].sum(), 1)
+    baseline_df["Avg_premium"] = (baseline_df["Insurance_txn_amount"]
+                                  / baseline_df["Insurance_txn_count"].where(baseline_df["Insurance_txn_count"] > 0)
+                                  ).fillna(national_premium)
+    return baseline_df[BASELINE_COLUMNS].sort_values("State", ignore_index=True)
+
+
+#Scenarios: (scenarios x states) matrices of target adoption rates
+
+
+def state_mask(baseline_df, states=None):
+    """
+    Boolean vector over the baseline states; None selects every state.
+    """
+    if states is None:
+        return np.ones(len(baseline_df), dtype=bool)
+    unknown = set(states) - set(baseline_df["State"])
+    if unknown:
+        raise ValueError(f"Unknown state(s): {', '.join(sorted(unknown))}")
+    return baseline_df["State"].isin(states).to_numpy()
+
+
+def rate_scenarios(baseline_df, rates, states=None):
+    """
+    One scenario per rate: the selected states reach that adoption rate, the others
+    keep their current rate.
+    """
+    current = baseline_df["Adoption_rate"].to_numpy()
+    rates = np.asarray(rates, dtype=float).reshape(-1, 1)
+    return np.where(state_mask(baseline_df, states), rates, current)
+
+
+def percentile_scenarios(baseline_df, percentiles, states=None):
+    """
+    One scenario per percentile of the state adoption rates (50 = the national median).
+    """
+    rates = np.percentile(baseline_df["Adoption_rate"].to_numpy(), np.asarray(percentiles, dtype=float))
+    return rate_scenarios(baseline_df, rates, states)
+
+
+def uplift_scenarios(baseline_df, uplift_pct, states=None):
+    """
+    One scenario per uplift: the selected states grow their adoption rate by uplift_pct percent.
+    """
+    current = baseline_df["Adoption_rate"].to_numpy()
+    uplift = np.asarray(uplift_pct, dtype=float).reshape(-1, 1)
+    return np.where(state_mask(baseline_df, states), current * (1 + uplift / 100), current)
+
+
+#Evaluation
+
+
+def evaluate_scenarios(baseline_df, target_rates):
+    """
+    Evaluate every scenario in one broadcast. target_rates is a (scenarios x states)
+    matrix in baseline_df order, or anything that broadcasts to it (one rate, or one
+    row of per-state rates). Targets below a state's current rate leave it unchanged.
+
+    Returns:
+    (incremental_txns, incremental_value): (scenarios x states) arrays
+    """
+    target_rates = np.atleast_2d(np.asarray(target_rates, dtype=float))
+    current = baseline_df["Adoption_rate"].to_numpy()
+    if target_rates.shape[-1] not in (1, len(current)):
+        raise ValueError(f"Expected {len(current)} state rates per scenario, got {target_rates.shape[-1]}")
+    incremental_txns = np.maximum(target_rates - current, 0) * baseline_df["Registered_users"].to_numpy()
+    incremental_value = incremental_txns * baseline_df["Avg_premium"].to_numpy()
+    return incremental_txns, incremental_value
+
+
+def scenario_summary(baseline_df, target_rates, labels=None):
+    """
+    Totals of every scenario.
+
+    Returns:
+    pandas.DataFrame with one row per scenario: [Scenario, Incremental_txns, Incremental_value,
+    States_lifted, Adoption_rate] where Adoption_rate is the resulting national rate
+    """
+    incremental_txns, incremental_value = evaluate_scenarios(baseline_df, target_rates)
+    users = baseline_df["Registered_users"].sum()
+    summary_df = pd.DataFrame({
+        "Scenario": labels if labels is not None else np.arange(len(incremental_txns)),
+        "Incremental_txns": incremental_txns.sum(axis=1).round(0),
+        "Incremental_value": incremental_value.sum(axis=1).round(2),
+        "States_lifted": (incremental_txns > 0).sum(axis=1),
+    })
+    summary_df["Adoption_rate"] = ((baseline_df["Insurance_txn_count"].sum() + summary_df["Incremental_txns"]) / users).round(6)
+    return summary_df
+
+
+def state_results(baseline_df, target_rates):
+    """
+    Per-state results of a single scenario (a vector of per-state rates, or one rate).
+
+    Returns:
+    baseline_df with [Target_rate, Incremental_txns, Incremental_value] added, largest value first
+    """
+    target = np.broadcast_to(np.asarray(target_rates, dtype=float), (len(baseline_df),))
+    incremental_txns, incremental_value = evaluate_scenarios(baseline_df, target)
+    return (baseline_df.assign(Target_rate=np.maximum(target, baseline_df["Adoption_rate"].to_numpy()),
+                               Incremental_txns=incremental_txns[0].round(0),
+                               Incremental_value=incremental_value[0].round(2))
+            .sort_values("Incremental_value", ascending=False, ignore_index=True))
@@ -0,0 +1,575 @@
+"""
+load_test.py
+
+Multi-user load test for the Streamlit dashboard. N simulated analysts each open
+Phonepe_Analytics.py and then every dashboard page, at growing concurrency, against
+a local database seeded with synthetic Pulse data.
+
+    python load_test.py --sessions 1 2 4 8 16
+    python load_test.py --mode apptest --sessions 1 4 --rounds 3
+    python load_test.py --mode websocket --url ws://localhost:8501 --db-url mysql+pymysql://...
+
+Two drivers are available:
+
+- websocket (default): starts `streamlit run` on the synthetic database (or uses
+  --url) and drives each session over its own websocket, as a browser would. This
+  measures the one server process serving every session.
+- apptest: runs each session headless with Streamlit's AppTest in its own process.
+  No server is involved; RSS is the total over the session processes.
+
+For every concurrency level the report gives per-page latency percentiles and
+errors, pages served per second, and the peak number of database connections and
+peak RSS of the process serving the pages.
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+import multiprocessing
+import urllib.request
+
+import numpy as np
+import pandas as pd
+
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(MODULE_DIR, "streamlit_app")
+MAIN_PAGE = "Phonepe_Analytics.py"
+PAGES = [
+    MAIN_PAGE,
+    "pages/1_Transaction_Dynamics.py",
+    "pages/2_Device_Dominance.py",
+    "pages/3_Insurance_Penetration.py",
+    "pages/4_Market_Expansion.py",
+    "pages/5_User_Engagement.py",
+    "pages/6_Transaction_Forecast.py",
+    "pages/7_Insurance_What_If.py",
+]
+
+PAGE_TIMEOUT = 300
+SAMPLE_INTERVAL = 0.1
+
+TRANSACTION_TYPES = ["Recharge & bill payments", "Peer-to-peer payments", "Merchant payments",
+                     "Financial Services", "Others"]
+BRANDS = ["Xiaomi", "Samsung", "Vivo", "Oppo", "Realme", "Apple", "Others"]
+
+# Coverage of the published Pulse data, which the synthetic frames reproduce: insurance
+# starts in 2020 Q2, the extractor only emits agg_user rows up to 2022 Q1 (usersByDevice
+# is null afterwards), and insurance_transaction lacks a few state-quarters.
+INSURANCE_START = (2020, 2)
+AGG_USER_END = (2022, 1)
+MISSING_INSURANCE_QUARTERS = 2
+
+
+#Synthetic data
+
+
+def synthetic_frames(states=None, districts=12, first_year=2018, last_year=2024, seed=0):
+    """
+    Build extracted-and-cleaned frames for every dataset with the shape of the Pulse
+    data: per-state volumes with quarterly growth, split over transaction types,
+    districts, brands and top entities, with the real coverage of the insurance and
+    agg_user tables (INSURANCE_START, AGG_USER_END, MISSING_INSURANCE_QUARTERS). The
+    frames pass validation with warnings only, like a real extract.
+
+    Returns:
+    dict of DataFrames keyed by table name, as returned by extract_datasets
+    """
+    from dimensions import STATE_NAMES
+
+    rng = np.random.default_rng(seed)
+    states = list(states or STATE_NAMES)
+    quarters = (last_year - first_year + 1) * 4
+
+    base = pd.MultiIndex.from_product([states, range(quarters)], names=["State", "Period"]).to_frame(index=False)
+    base["Year"] = first_year + base["Period"] // 4
+    base["Quarter"] = base["Period"] % 4 + 1
+    size = pd.Series(rng.lognormal(0, 1.2, len(states)), index=states)
+    base["Count"] = size[base["State"]].to_numpy() * 2e6 * 1.07 ** base["Period"] * rng.uniform(0.9, 1.1, len(base))
+    base["Ticket"] = rng.uniform(1200, 2600, len(base))
+
+    def split(names, column, concentration=1.0):
+        # One Dirichlet share per (state, name), fixed over time.
+        shares = pd.DataFrame(rng.dirichlet(np.full(len(names), concentration), len(states)), index=states, columns=names)
+        shares = shares.stack().rename("Share").rename_axis(["State", column]).reset_index()
+        return base.merge(shares, on="State")
+
+    keys = ["State", "Year", "Quarter"]
+
+    agg_df = split(TRANSACTION_TYPES, "Transaction_type", 2.0)
+    agg_df["Transaction_count"] = (agg_df["Count"] * agg_df["Share"]).round().astype("int64")
+    agg_df["Transaction_amount"] = agg_df["Transaction_count"] * agg_df["Ticket"]
+
+    district_names = [f"District {number}" for number in range(1, districts + 1)]
+    map_df = split(district_names, "District_name", 0.8)
+    map_df["District_name"] = map_df["State"] + " " + map_df["District_name"]
+    map_df["Transaction_count"] = (map_df["Count"] * map_df["Share"]).round().astype("int64")
+    map_df["Transaction_amount"] = map_df["Transaction_count"] * map_df["Ticket"]
+
+    top_districts = (map_df.sort_values("Transaction_amount", ascending=False)
+                     .groupby(keys, sort=False).head(10).assign(Entity_type="District", Entity_name=lambda df: df["District_name"]))
+    pincodes = base.loc[base.index.repeat(10)].reset_index(drop=True)
+    pincodes["Entity_type"] = "Pincode"
+    pincodes["Entity_name"] = (rng.integers(110000, 855000, len(pincodes))).astype(str)
+    pincodes["Transaction_count"] = (pincodes["Count"] * rng.uniform(0.002, 0.02, len(pincodes))).round().astype("int64")
+    pincodes["Transaction_amount"] = pincodes["Transaction_count"] * pincodes["Ticket"]
+    top_df = pd.concat([top_districts, pincodes], ignore_index=True)
+
+    insurance_df = base.copy()
+    insurance_df["Insurance_txn_count"] = (base["Count"] * rng.uniform(0.0005, 0.003, len(base))).round().astype("int64")
+    insurance_df["Insurance_txn_amount"] = insurance_df["Insurance_txn_count"] * rng.uniform(300, 900, len(base))
+    insurance_start = INSURANCE_START[0] * 4 + INSURANCE_START[1] - 1 - first_year * 4
+    insurance_df = insurance_df[insurance_df["Period"] >= insurance_start]
+    # Drop a few state-quarters strictly inside the covered range.
+    inner = insurance_df.index[(insurance_df["Period"] > insurance_start) & (insurance_df["Period"] < quarters - 1)]
+    insurance_df = insurance_df.drop(rng.choice(inner, min(MISSING_INSURANCE_QUARTERS, len(inner)), replace=False))
+
+    base["Registered_users"] = (base["Count"] * rng.uniform(0.2, 0.4, len(base))).round().astype("int64")
+    base["App_opens"] = (base["Registered_users"] * rng.uniform(3, 30, len(base))).round().astype("int64")
+
+    user_df = split(BRANDS, "Brand", 1.5)
+    user_df["Brand_count"] = (user_df["Registered_users"] * user_df["Share"]).round().astype("int64")
+    user_df["Brand_percentage"] = user_df["Share"]
+    user_df = user_df[user_df["Period"] <= AGG_USER_END[0] * 4 + AGG_USER_END[1] - 1 - first_year * 4]
+
+    map_user_df = split(district_names, "District", 0.8)
+    map_user_df["District"] = map_user_df["State"] + " " + map_user_df["District"]
+    map_user_df["Registered_users"] = (map_user_df["Registered_users"] * map_user_df["Share"]).round().astype("int64")
+    map_user_df["App_opens"] = (map_user_df["App_opens"] * map_user_df["Share"]).round().astype("int64")
+
+    from data_extraction import DATASETS
+    frames = {
+        "agg_transaction": agg_df, "map_transaction": map_df, "top_transaction": top_df,
+        "insurance_transaction": insurance_df, "agg_user": user_df, "map_user": map_user_df,
+    }
+    return {table: df[DATASETS[table]["columns"]].sort_values(keys, kind="stable", ignore_index=True)
+            for table, df in frames.items()}
+
+
+def synthetic_district_geojson(frames):
+    """
+    A district FeatureCollection with one square per district of map_transaction,
+    laid out on a grid per state, for the page 4 drill-down.
+    """
+    from dimensions import STATE_NAMES
+    from geo_shards import DISTRICT_STATE_PROPERTY, DISTRICT_NAME_PROPERTY
+
+    features = []
+    districts = frames["map_transaction"][["State", "District_name"]].drop_duplicates()
+    for state_number, (state, names) in enumerate(districts.groupby("State")["District_name"]):
+        for number, name in enumerate(names):
+            x, y = 68 + (state_number % 6) * 5 + (number % 4), 8 + (state_number // 6) * 5 + number // 4
+            features.append({
+                "type": "Feature",
+                "properties": {DISTRICT_STATE_PROPERTY: STATE_NAMES.get(state, state), DISTRICT_NAME_PROPERTY: name},
+                "geometry": {"type": "Polygon", "coordinates": [[[x, y], [x + 1, y], [x + 1, y + 1], [x, y + 1], [x, y]]]},
+            })
+    return {"type": "FeatureCollection", "features": features}
+
+
+def seed_environment(workdir, db_url=None, **synthetic):
+    """
+    Load synthetic data into db_url (default: a SQLite file in workdir) and write the
+    district GeoJSON shards.
+
+    Returns:
+    dict of environment variables pointing the dashboard at the seeded data
+    """
+    from sqlalchemy import create_engine
+    from data_loader import load_all
+    from geo_shards import build_district_shards
+
+    os.makedirs(workdir, exist_ok=True)
+    db_url = db_url or f"sqlite:///{os.path.join(os.path.abspath(workdir), 'pulse.db')}"
+    frames = synthetic_frames(**synthetic)
+    engine = create_engine(db_url)
+    version = load_all(engine, frames)
+    engine.dispose()
+
+    geojson_path = os.path.join(workdir, "districts.geojson")
+    with open(geojson_path, "w", encoding="utf-8") as f:
+        json.dump(synthetic_district_geojson(frames), f)
+    shard_dir = os.path.join(workdir, "shards")
+    build_district_shards(geojson_path, shard_dir)
+
+    print(f"seeded {db_url} (data version {version}): " + ", ".join(f"{t} {len(df)}" for t, df in frames.items()))
+    return {"DB_WRITER_URL": db_url, "DB_READER_URLS": "", "DISTRICT_GEOJSON_URL": geojson_path,
+            "GEO_SHARD_DIR": shard_dir}
+
+
+#Resource sampling
+
+
+def rss_mb(pid):
+    """
+    Resident set size of pid in MB from /proc, or None where /proc is unavailable.
+    """
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def connection_counter(db_url):
+    """
+    Return a function of a list of pids counting the database connections currently
+    open: server threads on MySQL, or file handles of the pids on the database file
+    for SQLite.
+    """
+    if db_url.startswith("mysql"):
+        from sqlalchemy import create_engine, text
+        monitor = create_engine(db_url, pool_size=1)
+
+        def count(pids):
+            with monitor.connect() as conn:
+                row = conn.execute(text("SHOW STATUS LIKE 'Threads_connected'")).first()
+            return int(row[1]) - 1  # without the monitor itself
+        return count
+
+    if db_url.startswith("sqlite:///"):
+        path = os.path.realpath(db_url[len("sqlite:///"):])
+
+        def count(pids):
+            total = 0
+            for pid in pids:
+                fd_dir = f"/proc/{pid}/fd"
+                try:
+                    total += sum(1 for fd in os.listdir(fd_dir) if os.path.realpath(os.path.join(fd_dir, fd)) == path)
+                except OSError:
+                    pass
+            return total
+        return count
+    return lambda pids: None
+
+
+class Sampler(threading.Thread):
+    """
+    Samples the total RSS and open database connections of the serving processes
+    until stopped.
+    """
+
+    def __init__(self, pids, count_connections):
+        super().__init__(daemon=True)
+        self.pids = pids
+        self.count_connections = count_connections
+        self.rss = []
+        self.connections = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            pids = self.pids()
+            rss = [rss_mb(pid) for pid in pids]
+            self.rss.append(sum(rss) if pids and None not in rss else None)
+            try:
+                self.connections.append(self.count_connections(pids))
+            except Exception:
+                self.connections.append(None)
+            self._stop_event.wait(SAMPLE_INTERVAL)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def _peak(samples):
+    samples = [sample for sample in samples if sample is not None]
+    return max(samples) if samples else None
+
+
+#Session drivers
+
+
+def _apptest_session(rounds, env, queue):
+    """
+    Run one AppTest session in its own process. AppTest keeps a per-process
+    Streamlit runtime, so concurrent sessions cannot share a process.
+    """
+    os.environ.update(env)
+    # One session per process: warming every page's queries would only add load.
+    os.environ.setdefault("CACHE_WARMUP", "0")
+    if MODULE_DIR not in sys.path:
+        sys.path.insert(0, MODULE_DIR)
+    from streamlit.testing.v1 import AppTest
+
+    results = []
+    app = AppTest.from_file(os.path.join(APP_DIR, MAIN_PAGE), default_timeout=PAGE_TIMEOUT)
+    for round_number in range(rounds):
+        for page in PAGES:
+            if round_number or page != MAIN_PAGE:
+                app.switch_page(page)
+            start = time.perf_counter()
+            try:
+                app.run()
+                error = app.exception[0].message if app.exception else None
+            except Exception as exception:
+                error = repr(exception)
+            results.append((page, time.perf_counter() - start, error))
+    queue.put(results)
+
+
+class WebsocketSession:
+    """
+    One browser-like session: a websocket to the Streamlit server that reruns pages
+    and waits for each script run to finish.
+    """
+
+    def __init__(self, url):
+        from websockets.sync.client import connect
+        self.socket = connect(url.rstrip("/") + "/_stcore/stream", subprotocols=["streamlit"], max_size=None, legacy=True)
+        self.page_hashes = {}
+
+    def send(self, message):
+        self.socket.send(message.SerializeToString())
+
+    def run_page(self, page):
+        """
+        Run page and wait for it to finish.
+
+        Returns:
+        the message of the first exception the page raised, or None
+        """
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        message = BackMsg()
+        message.rerun_script.query_string = ""
+        message.rerun_script.page_script_hash = self.page_hashes.get(page, "")
+        self.send(message)
+
+        error = None
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(self.socket.recv(timeout=PAGE_TIMEOUT))
+            kind = forward.WhichOneof("type")
+            if kind == "navigation":
+                # Page files map to url_pathname without their number prefix ("" for the main page).
+                by_path = {app_page.url_pathname: app_page.page_script_hash for app_page in forward.navigation.app_pages}
+                for name in PAGES:
+                    path = "" if name == MAIN_PAGE else re.sub(r"^\d+_", "", os.path.splitext(os.path.basename(name))[0])
+                    if path in by_path:
+                        self.page_hashes[name] = by_path[path]
+            elif kind == "delta" and forward.delta.new_element.WhichOneof("type") == "exception":
+                error = error or forward.delta.new_element.exception.message
+            elif kind == "script_finished":
+                return error
+
+    def close(self):
+        self.socket.close()
+
+
+def _websocket_session(url, rounds, results):
+    # PAGES starts with the main page, whose first run reports the page hashes.
+    session = WebsocketSession(url)
+    try:
+        for _ in range(rounds):
+            for page in PAGES:
+                start = time.perf_counter()
+                try:
+                    error = session.run_page(page)
+                except Exception as exception:
+                    error = repr(exception)
+                results.append((page, time.perf_counter() - start, error))
+    finally:
+        session.close()
+
+
+def clear_server_cache(url):
+    from streamlit.proto.BackMsg_pb2 import BackMsg
+
+    session = WebsocketSession(url)
+    session.send(BackMsg(clear_cache=True))
+    session.close()
+
+
+def start_server(env, port):
+    """
+    Start `streamlit run` on the main page with env added to the environment and wait
+    until it is healthy.
+
+    Returns:
+    subprocess.Popen of the server
+    """
+    try:
+        urllib.request.urlopen(f"http://localhost:{port}/_stcore/health", timeout=2).close()
+        raise RuntimeError(f"port {port} is already serving; pass --url to test that server or choose another --port")
+    except OSError:
+        pass
+
+    server_env = dict(os.environ, **env)
+    server_env["PYTHONPATH"] = os.pathsep.join(filter(None, [MODULE_DIR, server_env.get("PYTHONPATH")]))
+    process = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", MAIN_PAGE, "--server.headless", "true",
+         "--server.port", str(port), "--browser.gatherUsageStats", "false"],
+        cwd=APP_DIR, env=server_env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("streamlit exited during startup")
+        try:
+            with urllib.request.urlopen(f"http://localhost:{port}/_stcore/health", timeout=2) as response:
+                if response.status == 200:
+                    return process
+        except OSError:
+            time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("streamlit did not become healthy within 60 s")
+
+
+#Running levels and reporting
+
+
+def run_apptest_level(sessions, rounds, env, count_connections):
+    """
+    Run sessions concurrent AppTest sessions, one process each.
+
+    Returns:
+    (list of (page, seconds, error), Sampler)
+    """
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    processes = [context.Process(target=_apptest_session, args=(rounds, env, queue)) for _ in range(sessions)]
+    sampler = Sampler(lambda: [process.pid for process in processes if process.is_alive()], count_connections)
+    for process in processes:
+        process.start()
+    sampler.start()
+    results = []
+    for _ in processes:
+        results += queue.get()
+    for process in processes:
+        process.join()
+    sampler.stop()
+    return results, sampler
+
+
+def run_websocket_level(sessions, rounds, url, server_pid, count_connections):
+    """
+    Run sessions concurrent websocket sessions against one server, one thread each.
+
+    Returns:
+    (list of (page, seconds, error), Sampler)
+    """
+    results = []
+    sampler = Sampler(lambda: [server_pid] if server_pid else [], count_connections)
+    threads = [threading.Thread(target=_websocket_session, args=(url, rounds, results)) for _ in range(sessions)]
+    sampler.start()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    sampler.stop()
+    return results, sampler
+
+
+def summarise(results_df):
+    """
+    Per-page latency percentiles (ms) and error counts for each concurrency level.
+    Latencies only cover the runs without an error; a page that failed on every run
+    has no latencies.
+    """
+    def percentiles(group):
+        seconds = group.loc[group["Error"].isna(), "Seconds"].to_numpy() * 1000
+        stats = {"Runs": len(group), "Errors": int(group["Error"].notna().sum())}
+        for column, percentile in [("P50_ms", 50), ("P90_ms", 90), ("P99_ms", 99), ("Max_ms", 100)]:
+            stats[column] = round(np.percentile(seconds, percentile), 1) if len(seconds) else None
+        return pd.Series(stats, dtype=object)
+    return results_df.groupby(["Sessions", "Page"], sort=False).apply(percentiles, include_groups=False).reset_index()
+
+
+def load_test(mode="websocket", sessions=(1, 2, 4, 8), rounds=2, workdir=None, db_url=None, url=None, port=8599,
+              clear_cache=False, **synthetic):
+    """
+    Seed the synthetic database (unless url points at a running server) and run the
+    load test at each concurrency level.
+
+    Returns:
+    (per-page summary DataFrame, per-level DataFrame, raw results DataFrame)
+    """
+    if mode not in ("apptest", "websocket"):
+        raise ValueError(f"mode must be 'apptest' or 'websocket', got {mode!r}")
+    if mode == "apptest" and url:
+        raise ValueError("url only applies to websocket mode")
+
+    env = {"DB_WRITER_URL": db_url or ""}
+    if url is None:
+        env = seed_environment(workdir or tempfile.mkdtemp(prefix="pulse_load_test_"), db_url, **synthetic)
+    count_connections = connection_counter(env["DB_WRITER_URL"])
+
+    server = None
+    if mode == "websocket" and url is None:
+        server = start_server(env, port)
+        url = f"ws://localhost:{port}"
+
+    rows, levels = [], []
+    try:
+        for level in sessions:
+            start = time.perf_counter()
+            if mode == "apptest":
+                # Every session process starts with empty caches.
+                results, sampler = run_apptest_level(level, rounds, env, count_connections)
+            else:
+                if clear_cache:
+                    clear_server_cache(url)
+                results, sampler = run_websocket_level(level, rounds, url, server and server.pid, count_connections)
+            elapsed = time.perf_counter() - start
+
+            rss = _peak(sampler.rss)
+            stats = {"Sessions": level, "Pages_per_s": round(len(results) / elapsed, 2),
+                     "Peak_connections": _peak(sampler.connections),
+                     "Peak_RSS_MB": None if rss is None else round(rss, 1)}
+            levels.append(stats)
+            rows += [(level, page, seconds, error) for page, seconds, error in results]
+            print(f"{level} session(s): {stats['Pages_per_s']} pages/s, peak connections "
+                  f"{stats['Peak_connections']}, peak RSS {stats['Peak_RSS_MB']} MB", flush=True)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    results_df = pd.DataFrame(rows, columns=["Sessions", "Page", "Seconds", "Error"])
+    return summarise(results_df), pd.DataFrame(levels), results_df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the Streamlit dashboard with concurrent sessions.")
+    parser.add_argument("--mode", choices=["websocket", "apptest"], default="websocket")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8], help="concurrency levels")
+    parser.add_argument("--rounds", type=int, default=2, help="passes over the pages per session (default: 2)")
+    parser.add_argument("--workdir", help="directory for the synthetic database and GeoJSON (default: a temp dir)")
+    parser.add_argument("--db-url", help="seed this database instead of a SQLite file in workdir")
+    parser.add_argument("--url", help="test an already running server (websocket mode) instead of seeding one")
+    parser.add_argument("--port", type=int, default=8599, help="port of the server started in websocket mode")
+    parser.add_argument("--states", type=int, help="number of synthetic states (default: all 36)")
+    parser.add_argument("--districts", type=int, default=12, help="synthetic districts per state (default: 12)")
+    parser.add_argument("--clear-cache", action="store_true", help="clear the server's data cache before every level")
+    parser.add_argument("--output", help="write the raw timings to this CSV file")
+    args = parser.parse_args(argv)
+
+    if MODULE_DIR not in sys.path:
+        sys.path.insert(0, MODULE_DIR)
+    from dimensions import STATE_NAMES
+    states = list(STATE_NAMES)[:args.states] if args.states else None
+    summary_df, levels_df, results_df = load_test(
+        args.mode, args.sessions, args.rounds, args.workdir, args.db_url, args.url, args.port,
+        args.clear_cache, states=states, districts=args.districts)
+
+    print(summary_df.to_string(index=False))
+    print(levels_df.to_string(index=False))
+    errors = results_df.dropna(subset=["Error"])[["Page", "Error"]].drop_duplicates()
+    for page, error in errors.itertuples(index=False):
+        print(f"{page}: {error}")
+    if args.output:
+        results_df.to_csv(args.output, index=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""
+period_slices.py
+
+This module provides the global Year/Quarter selector shown in the dashboard sidebar
+and the helpers that slice the pre-aggregated period frames in memory.
+
+Each page loads its (State, Year, Quarter) level frames once through the query cache;
+moving the selector only filters those frames, so it never queries the database.
+"""
+import streamlit as st
+
+ALL_PERIODS = "All"
+PERIOD_KEYS = {"Year": "period_year", "Quarter": "period_quarter"}
+
+
+def period_selector(slices_df):
+    """
+    Render the Year and Quarter selectors in the sidebar and return the selection as
+    (year, quarter), where None stands for "All".
+
+    The sliders keep their value in st.session_state under PERIOD_KEYS. Streamlit drops
+    the state of widgets a page does not draw, so the selection is also saved under
+    "period" and restored into the slider keys when a page switch has cleared them.
+    """
+    saved = st.session_state.setdefault("period", {"Year": ALL_PERIODS, "Quarter": ALL_PERIODS})
+
+    years = [ALL_PERIODS] + sorted(int(year) for year in slices_df["Year"].unique())
+    quarters = [ALL_PERIODS] + sorted(int(quarter) for quarter in slices_df["Quarter"].unique())
+
+    for name, options in (("Year", years), ("Quarter", quarters)):
+        key = PERIOD_KEYS[name]
+        if st.session_state.get(key) not in options:
+            st.session_state[key] = saved[name] if saved[name] in options else ALL_PERIODS
+
+    st.sidebar.subheader("Period")
+    year = st.sidebar.select_slider("Year", options=years, key=PERIOD_KEYS["Year"])
+    quarter = st.sidebar.select_slider(
+        "Quarter", options=quarters, key=PERIOD_KEYS["Quarter"],
+        format_func=lambda q: q if q == ALL_PERIODS else f"Q{q}")
+
+    saved["Year"], saved["Quarter"] = year, quarter
+    return (None if year == ALL_PERIODS else year), (None if quarter == ALL_PERIODS else quarter)
+
+
+def slice_period(slices_df, year=None, quarter=None, latest_when_all=False):
+    """
+    Return the rows of a period slice frame for the selected year and quarter.
+
+    With latest_when_all=True an unselected year resolves to the most recent year in
+    the frame, matching the queries that report on MAX(Year).
+    """
+    if year is None and latest_when_all:
+        year = slices_df["Year"].max()
+    if year is not None:
+        slices_df = slices_df[slices_df["Year"] == year]
+    if quarter is not None:
+        slices_df = slices_df[slices_df["Quarter"] == quarter]
+    return slices_df
+
+
+def period_label(year=None, quarter=None):
+    """
+    Describe a period selection for chart titles, e.g. "2023 Q4" or "All periods".
+    """
+    if year is None and quarter is None:
+        return "All periods"
+    if year is None:
+        return f"Q{quarter} of every year"
+    if quarter is None:
+        return str(year)
+    return f"{year} Q{quarter}"
+
+
+def state_transaction_totals(transaction_slices_df):
+    """
+    Total the transaction slice frame by state, in the shape of get_states_contribution
+    plus the Geo_name the choropleths join on.
+    """
+    totals_df = (transaction_slices_df
+                 .groupby(["State", "Geo_name"], as_index=False)[["Total_volume", "Total_value"]].sum()
+                 .rename(columns={"Total_volume": "Total_Transaction_Volume", "Total_value": "Total_Transaction_Value"}))
+    totals_df["Avg_Transaction_Value"] = (totals_df["Total_Transaction_Value"] / totals_df["Total_Transaction_Volume"]).round(2)
+    return totals_df.sort_values(["Total_Transaction_Value", "Total_Transaction_Volume"], ascending=False, ignore_index=True)
@@ -0,0 +1,294 @@
+"""
+profiling.py
+
+This module profiles one run of a dashboard page on demand, so a page that is slow in
+production can be diagnosed where it is slow instead of being reproduced locally.
+
+Every page calls profile_page(__file__) right after st.set_page_config. It does nothing
+unless profiling is switched on, either for every run of the worker:
+
+    PAGE_PROFILE=1 streamlit run streamlit_app/Phonepe_Analytics.py
+
+or for one session by an admin, with the token set on the server:
+
+    PAGE_PROFILE_TOKEN=<secret> streamlit run ...
+    https://<dashboard>/Transaction_Dynamics?profile=<secret>
+
+A profiled run executes the whole page script again under a sampling profiler that
+records the page thread's stack every PAGE_PROFILE_INTERVAL_MS milliseconds, then shows
+the time per component (query functions, pandas/NumPy, Plotly, Streamlit, page code), a
+table of the top hotspots and downloads of the samples as a speedscope profile
+(https://www.speedscope.app) and as folded stacks for flamegraph.pl. Profiled runs
+bypass the query cache, so the data_queries calls and their SQL are part of the profile.
+With PAGE_PROFILE_DIR set, both files are also written there.
+"""
+import os
+import sys
+import hmac
+import json
+import time
+import runpy
+import threading
+from collections import defaultdict
+
+import pandas as pd
+import streamlit as st
+
+PROFILE_ENABLED = os.getenv("PAGE_PROFILE", "0") != "0"
+PROFILE_TOKEN = os.getenv("PAGE_PROFILE_TOKEN")
+PROFILE_DIR = os.getenv("PAGE_PROFILE_DIR")
+SAMPLE_INTERVAL = float(os.getenv("PAGE_PROFILE_INTERVAL_MS", "1")) / 1000
+TOP_N = 25
+
+# Component of a sample: the outermost frame from one of these top-level modules.
+# Repo modules not listed here (period_slices, cross_filter, ...) are looked through,
+# so their pandas work counts as pandas.
+COMPONENTS = {
+    "query_cache": "Queries",
+    "data_queries": "Queries",
+    "district_queries": "Queries",
+    "sqlalchemy": "Queries",
+    "pymysql": "Queries",
+    "pandas": "pandas/NumPy",
+    "numpy": "pandas/NumPy",
+    "plotly": "Plotly",
+    "streamlit": "Streamlit",
+}
+PAGE_CODE = "Page code"
+
+_state = threading.local()
+
+
+#Sampling profiler
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of one thread from a background thread. Each sample is weighted
+    by the wall time since the previous one, so the totals add up to the profiled time.
+
+        with SamplingProfiler() as profiler:
+            ...
+        profiler.stacks   # {(frame, ...) root first: seconds}
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks = defaultdict(float)
+        self.samples = 0
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._run, name="page-profiler", daemon=True)
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is None:
+                break
+            self.stacks[_stack(frame)] += now - last
+            self.samples += 1
+            last = now
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        self._sampler.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._sampler.join()
+        self.duration = time.perf_counter() - self.started
+        return False
+
+
+def _stack(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append((frame.f_globals.get("__name__", "?"), code.co_qualname, code.co_filename, code.co_firstlineno))
+        frame = frame.f_back
+    return tuple(reversed(stack))
+
+
+def page_stacks(stacks, page_file):
+    """
+    The sampled stacks from the profiled page script down, without the Streamlit script
+    runner and the outer run of the page above it.
+    """
+    trimmed = defaultdict(float)
+    for stack, seconds in stacks.items():
+        start = max((i for i, (_, name, filename, _) in enumerate(stack)
+                     if filename == page_file and name == "<module>"), default=0)
+        trimmed[stack[start:]] += seconds
+    return trimmed
+
+
+def _component(stack):
+    for module, _, _, _ in stack[1:]:
+        component = COMPONENTS.get(module.split(".")[0])
+        if component:
+            return component
+    return PAGE_CODE
+
+
+def _frame_label(frame):
+    module, name, filename, line = frame
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+#Reports
+
+
+def profile_report(stacks, top_n=TOP_N):
+    """
+    Summarise the sampled stacks of a page run (see page_stacks).
+
+    Returns:
+    (components_df, hotspots_df): time per component, and the top_n functions by own
+    time with [Function, Module, File, Self_ms, Total_ms, Self_pct, Total_pct]
+    """
+    total = sum(stacks.values()) or 1.0
+
+    components = defaultdict(float)
+    own = defaultdict(float)
+    inclusive = defaultdict(float)
+    for stack, seconds in stacks.items():
+        components[_component(stack)] += seconds
+        own[stack[-1]] += seconds
+        for frame in set(stack):
+            inclusive[frame] += seconds
+
+    components_df = (pd.DataFrame({"Component": list(components), "Time_ms": [s * 1000 for s in components.values()]})
+                     .sort_values("Time_ms", ascending=False, ignore_index=True))
+    components_df["Share_pct"] = (components_df["Time_ms"] / total / 10).round(1)
+    components_df["Time_ms"] = components_df["Time_ms"].round(1)
+
+    top = sorted(own, key=own.get, reverse=True)[:top_n]
+    hotspots_df = pd.DataFrame({
+        "Function": [frame[1] for frame in top],
+        "Module": [frame[0] for frame in top],
+        "File": [f"{os.path.basename(frame[2])}:{frame[3]}" for frame in top],
+        "Self_ms": [round(own[frame] * 1000, 1) for frame in top],
+        "Total_ms": [round(inclusive[frame] * 1000, 1) for frame in top],
+    })
+    hotspots_df["Self_pct"] = (hotspots_df["Self_ms"] / total / 10).round(1)
+    hotspots_df["Total_pct"] = (hotspots_df["Total_ms"] / total / 10).round(1)
+    return components_df, hotspots_df
+
+
+def speedscope_profile(stacks, name):
+    """
+    Sampled stacks in speedscope's file format (one sampled profile, weights in milliseconds).
+    """
+    frames, index = [], {}
+    samples, weights = [], []
+    for stack, seconds in stacks.items():
+        for frame in stack:
+            if frame not in index:
+                index[frame] = len(frames)
+                frames.append({"name": frame[1], "file": frame[2], "line": frame[3]})
+        samples.append([index[frame] for frame in stack])
+        weights.append(round(seconds * 1000, 3))
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "Pulse_Case_Studies/profiling.py",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": name,
+            "unit": "milliseconds",
+            "startValue": 0,
+            "endValue": round(sum(weights), 3),
+            "samples": samples,
+            "weights": weights,
+        }],
+    }
+
+
+def folded_stacks(stacks):
+    """
+    Sampled stacks as folded stacks ("root;...;leaf microseconds" per line), the input of
+    flamegraph.pl and other flame graph tools.
+    """
+    return "\n".join(f"{';'.join(_frame_label(frame) for frame in stack)} {round(seconds * 1e6)}"
+                     for stack, seconds in sorted(stacks.items()))
+
+
+#Page hook
+
+
+def profiling_requested():
+    """
+    Whether this page run should be profiled: PAGE_PROFILE is set, or the profile query
+    parameter matches PAGE_PROFILE_TOKEN.
+    """
+    if getattr(_state, "active", False):
+        return False
+    if PROFILE_ENABLED:
+        return True
+    token = st.query_params.get("profile")
+    return bool(PROFILE_TOKEN and token and hmac.compare_digest(token, PROFILE_TOKEN))
+
+
+def bypass_cache():
+    """
+    True while a profiled page run is executing; query_cache then runs queries directly.
+    """
+    return getattr(_state, "active", False)
+
+
+def profile_page(page_file):
+    """
+    Profile this run of the page when profiling is requested: run the page script again
+    under the sampling profiler, show the report below it and stop the outer run.
+    Returns without doing anything otherwise.
+    """
+    if not profiling_requested():
+        return
+    page_file = os.path.abspath(page_file)
+    page_name = os.path.splitext(os.path.basename(page_file))[0]
+    profiler = SamplingProfiler()
+    _state.active = True
+    try:
+        with profiler:
+            runpy.run_path(page_file, run_name="__main__")
+    finally:
+        _state.active = False
+        show_profile(profiler, page_file, page_name)
+    st.stop()
+
+
+def show_profile(profiler, page_file, page_name):
+    stacks = page_stacks(profiler.stacks, page_file)
+    components_df, hotspots_df = profile_report(stacks)
+    speedscope = json.dumps(speedscope_profile(stacks, page_name))
+    folded = folded_stacks(stacks)
+
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    if PROFILE_DIR:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        with open(os.path.join(PROFILE_DIR, f"{page_name}-{stamp}.speedscope.json"), "w", encoding="utf-8") as f:
+            f.write(speedscope)
+        with open(os.path.join(PROFILE_DIR, f"{page_name}-{stamp}.folded"), "w", encoding="utf-8") as f:
+            f.write(folded)
+
+    st.divider()
+    st.header("Page Profile")
+    st.caption(f"{profiler.duration * 1000:,.0f} ms, {profiler.samples:,} stack samples "
+               f"every {profiler.interval * 1000:g} ms; queries ran uncached.")
+
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        st.subheader("Time by Component")
+        st.dataframe(components_df, hide_index=True)
+        st.download_button("Download speedscope profile", speedscope, file_name=f"{page_name}-{stamp}.speedscope.json",
+                           mime="application/json", key="profile_speedscope")
+        st.download_button("Download folded stacks (flamegraph)", folded, file_name=f"{page_name}-{stamp}.folded",
+                           mime="text/plain", key="profile_folded")
+    with col2:
+        st.subheader(f"Top {len(hotspots_df)} Hotspots")
+        st.dataframe(hotspots_df, hide_index=True)
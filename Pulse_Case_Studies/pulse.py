@@ -0,0 +1,391 @@
+"""
+pulse.py
+
+Command-line entry point for the extraction -> load -> rollup pipeline, so it can run
+headless under cron or a batch scheduler instead of from dataextraction.ipynb.
+
+    python pulse.py extract --source pulse.zip --output frames/
+    python pulse.py load --frames frames/ --jobs 4
+    python pulse.py load --source pulse.zip --incremental
+    python pulse.py rollup
+    python pulse.py rollup --check 4
+    python pulse.py bench
+    python pulse.py bench parsers --parser orjson
+    python pulse.py export --output exports/
+    python pulse.py export --tables top_transaction --output exports/
+    python pulse.py export --report --output reports/ --pdf
+
+Extracted frames pass the data_validation checks before every load; a failed check
+stops the load. Every command prints the time taken by each stage and exits non-zero
+on failure.
+--db-url points a command at another database than the one configured in .env.
+"""
+import os
+import sys
+import time
+import inspect
+import argparse
+import traceback
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+
+#Stage timings
+
+
+class StageTimer:
+    """
+    Times the stages of one command and prints each as it finishes.
+    """
+
+    def __init__(self):
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        yield
+        seconds = time.perf_counter() - start
+        self.stages.append((name, seconds))
+        print(f"[{name}] {seconds:.3f} s", flush=True)
+
+    def summary(self):
+        total = sum(seconds for _, seconds in self.stages)
+        width = max([len(name) for name, _ in self.stages] + [5])
+        lines = [f"{name:<{width}}  {seconds:9.3f} s" for name, seconds in self.stages]
+        lines.append(f"{'total':<{width}}  {total:9.3f} s")
+        return "\n".join(lines)
+
+
+def _engine(args, role="writer"):
+    if args.db_url:
+        os.environ["DB_WRITER_URL"] = args.db_url
+    from db_connection import get_phonepe_engine
+    return get_phonepe_engine(role)
+
+
+#Extraction
+
+
+def _extract_one(source, dataset, parser, since):
+    from data_extraction import extract_dataset
+    return dataset, extract_dataset(source, dataset, parser, since=since)
+
+
+def extract_frames(source, datasets, parser=None, jobs=1, since=None):
+    """
+    Extract datasets from source. With jobs > 1 each dataset is extracted in its own
+    process; otherwise all datasets are read in a single pass.
+    """
+    from data_extraction import extract_datasets
+
+    if jobs <= 1 or len(datasets) == 1:
+        return extract_datasets(source, datasets, parser, since=since)
+    with ProcessPoolExecutor(max_workers=min(jobs, len(datasets))) as pool:
+        futures = [pool.submit(_extract_one, source, dataset, parser, since) for dataset in datasets]
+        return dict(future.result() for future in futures)
+
+
+def save_frames(frames, output):
+    os.makedirs(output, exist_ok=True)
+    for table, df in frames.items():
+        df.to_pickle(os.path.join(output, f"{table}.pkl"))
+
+
+def read_frames(frames_dir, datasets):
+    return {dataset: pd.read_pickle(os.path.join(frames_dir, f"{dataset}.pkl")) for dataset in datasets}
+
+
+def _since(args, engine):
+    if not args.incremental:
+        return None
+    from district_queries import get_latest_period
+    since = get_latest_period(engine)
+    print(f"incremental: extracting quarters after {since[0]} Q{since[1]}")
+    return since
+
+
+def cmd_extract(args, timer):
+    from data_extraction import DATASETS, get_data_root
+
+    datasets = args.datasets or list(DATASETS)
+    since = _since(args, _engine(args)) if args.incremental else None
+    with timer.stage("extract"):
+        frames = extract_frames(args.source or get_data_root(), datasets, args.parser, args.jobs, since)
+    for table, df in frames.items():
+        print(f"  {table}: {len(df)} rows")
+    if args.validate:
+        validate(frames, timer)
+    if args.output:
+        with timer.stage("save"):
+            save_frames(frames, args.output)
+
+
+#Validation, load and rollup
+
+
+def validate(frames, timer):
+    from data_validation import validate_frames
+
+    with timer.stage("validate"):
+        report = validate_frames(frames)
+    if len(report):
+        print(report.to_string(index=False))
+    errors = (report["Severity"] == "error").sum()
+    if errors:
+        raise RuntimeError(f"validation failed with {errors} error(s)")
+
+
+def cmd_load(args, timer):
+    from data_extraction import DATASETS, get_data_root
+    from data_loader import load_all, load_incremental
+
+    engine = _engine(args)
+    datasets = list(DATASETS)
+    if args.frames:
+        with timer.stage("read frames"):
+            frames = read_frames(args.frames, datasets)
+    else:
+        since = _since(args, engine)
+        with timer.stage("extract"):
+            frames = extract_frames(args.source or get_data_root(), datasets, args.parser, args.jobs, since)
+
+    if args.incremental and not any(len(df) for df in frames.values()):
+        print("incremental: no new quarters, nothing to load")
+        return
+    if not args.skip_validation:
+        validate(frames, timer)
+    with timer.stage("load"):
+        if args.incremental:
+            # Checked again against the live tables: rows of quarters already loaded
+            # are rejected.
+            version = load_incremental(engine, frames, args.chunksize, args.jobs, not args.skip_validation)
+        else:
+            version = load_all(engine, frames, args.chunksize, args.jobs, validate=False)
+    print(f"published data version {version}")
+    if args.report:
+        export_report(args, timer, args.report, version)
+
+
+def cmd_rollup(args, timer):
+    from data_loader import refresh_rollups, read_tables
+
+    engine = _engine(args)
+    if args.check:
+        from growth_metrics import compare_incremental_growth
+        frames = read_tables(engine, ["agg_transaction", "map_transaction"])
+        with timer.stage("rollup check"):
+            result = compare_incremental_growth(frames["agg_transaction"], frames["map_transaction"], args.check)
+        print(f"full rebuild {result['Full_seconds']:.3f} s, incremental {result['Incremental_seconds']:.3f} s, "
+              f"{result['Mismatches']} mismatched rows")
+        if result["Mismatches"]:
+            raise RuntimeError("incremental rollups differ from a full rebuild")
+        return
+
+    with timer.stage("rollup"):
+        version = refresh_rollups(engine, args.chunksize, args.incremental)
+    print(f"published data version {version}")
+
+
+#Benchmarks
+
+
+def catalogue_queries():
+    """
+    The query functions of data_queries that take only an engine.
+    """
+    import data_queries
+    return [
+        function for name, function in inspect.getmembers(data_queries, inspect.isfunction)
+        if name.startswith("get_") and function.__module__ == "data_queries"
+        and list(inspect.signature(function).parameters) == ["engine"]
+    ]
+
+
+BENCH_TARGETS = ("parsers", "queries")
+
+
+def _bench_target(value):
+    if value not in BENCH_TARGETS:
+        raise argparse.ArgumentTypeError(f"invalid choice: {value!r} (choose from {', '.join(BENCH_TARGETS)})")
+    return value
+
+
+def cmd_bench(args, timer):
+    targets = args.targets or BENCH_TARGETS
+    if "parsers" in targets:
+        from data_extraction import benchmark_parsers, get_data_root
+        with timer.stage("bench parsers"):
+            results = benchmark_parsers(args.source or get_data_root(), args.datasets or None,
+                                        [args.parser] if args.parser else None)
+        if results.empty and args.parser:
+            raise ValueError(f"JSON backend {args.parser} is not installed")
+        print(results.to_string(index=False))
+
+    if "queries" in targets:
+        engine = _engine(args, "reader")
+        rows = []
+        with timer.stage("bench queries"):
+            for query in catalogue_queries():
+                timings = []
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    result = query(engine)
+                    timings.append(time.perf_counter() - start)
+                rows.append({"Query": query.__name__, "Rows": len(result),
+                             "Best_ms": round(min(timings) * 1000, 2),
+                             "Median_ms": round(sorted(timings)[len(timings) // 2] * 1000, 2)})
+        print(pd.DataFrame(rows).sort_values("Median_ms", ascending=False).to_string(index=False))
+
+
+#Export
+
+
+def export_report(args, timer, output, version):
+    from report_export import build_report
+
+    with timer.stage("report"):
+        summary = build_report(output, jobs=args.jobs, images=args.images, pdf=args.pdf, data_version=version)
+    for page in summary:
+        status = f"FAILED: {page['error']}" if page["error"] else f"{page['figures']} figures"
+        print(f"  {page['page']}: {page['seconds']:.3f} s, {status}")
+    if any(page["error"] for page in summary):
+        raise RuntimeError("some report pages failed to render")
+
+
+def export_tables(args, timer, engine):
+    """
+    Stream whole tables to CSV chunk by chunk, so memory use does not grow with the
+    table size.
+    """
+    from table_stream import stream_table
+
+    if args.format != "csv":
+        raise ValueError("--tables only supports --format csv")
+    with timer.stage("export tables"):
+        for table in args.tables:
+            path = os.path.join(args.output, f"{table}.csv")
+            rows = 0
+            for number, chunk in enumerate(stream_table(engine, table, chunksize=args.chunksize)):
+                chunk.to_csv(path, mode="w" if number == 0 else "a", header=number == 0, index=False)
+                rows += len(chunk)
+            print(f"  {path}: {rows} rows")
+
+
+def cmd_export(args, timer):
+    if args.report:
+        from db_connection import get_data_version
+        export_report(args, timer, args.output, get_data_version(_engine(args)))
+        return
+
+    engine = _engine(args, "reader")
+
+    os.makedirs(args.output, exist_ok=True)
+    if args.tables:
+        export_tables(args, timer, engine)
+        return
+    queries = catalogue_queries()
+    if args.queries:
+        queries = [query for query in queries if query.__name__ in args.queries]
+
+    with timer.stage("export"):
+        for query in queries:
+            df = query(engine)
+            path = os.path.join(args.output, f"{query.__name__[len('get_'):]}.{args.format}")
+            if args.format == "csv":
+                df.to_csv(path, index=False)
+            else:
+                df.to_pickle(path)
+            print(f"  {path}: {len(df)} rows")
+
+
+#Argument parsing
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="pulse", description="PhonePe Pulse extraction, load and reporting pipeline.")
+    parser.add_argument("--db-url", help="SQLAlchemy URL of the target database (default: DB_* settings in .env)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def common(sub):
+        sub.add_argument("--jobs", "-j", type=int, default=1, help="parallel workers (default: 1)")
+        sub.add_argument("--chunksize", type=int, default=10000, help="rows per INSERT batch (default: 10000)")
+
+    def report(sub):
+        sub.add_argument("--images", action="store_true", help="also write a PNG of every report figure (needs kaleido)")
+        sub.add_argument("--pdf", action="store_true", help="also write report.pdf (needs kaleido)")
+
+    def source(sub):
+        sub.add_argument("--source", help="Pulse checkout, zip, tar or pack file (default: PULSE_DATA_ROOT)")
+        sub.add_argument("--parser", choices=["simdjson", "orjson", "json"], help="JSON backend (default: fastest installed)")
+
+    extract = commands.add_parser("extract", help="extract the Pulse JSON files into dataframes")
+    source(extract)
+    common(extract)
+    extract.add_argument("--datasets", nargs="+", help="tables to extract (default: all)")
+    extract.add_argument("--output", help="directory to save the frames to, for a later load --frames")
+    extract.add_argument("--incremental", action="store_true", help="only quarters newer than the database")
+    extract.add_argument("--validate", action="store_true", help="run the validation checks on the extracted frames")
+    extract.set_defaults(run=cmd_extract)
+
+    load = commands.add_parser("load", help="extract (or read saved frames) and load every table")
+    source(load)
+    common(load)
+    load.add_argument("--frames", help="directory written by extract --output")
+    load.add_argument("--incremental", action="store_true", help="append quarters newer than the database")
+    load.add_argument("--skip-validation", action="store_true", help="load even if the validation checks fail")
+    load.add_argument("--report", help="render the static case study report into this directory after the load")
+    report(load)
+    load.set_defaults(run=cmd_load)
+
+    rollup = commands.add_parser("rollup", help="rebuild the growth tables from the loaded data")
+    common(rollup)
+    rollup.add_argument("--incremental", action="store_true", help="only fold in quarters the growth tables lack")
+    rollup.add_argument("--check", type=int, metavar="QUARTERS",
+                        help="compare an incremental update of the last QUARTERS quarters with a full rebuild, "
+                             "and time both, without loading anything")
+    rollup.set_defaults(run=cmd_rollup)
+
+    bench = commands.add_parser("bench", help="benchmark JSON parsers and catalogue queries")
+    source(bench)
+    # No choices=: argparse checks an empty nargs="*" positional against them and rejects it.
+    bench.add_argument("targets", nargs="*", type=_bench_target, metavar="{parsers,queries}",
+                       help="what to benchmark (default: both); --parser limits the parser benchmark to one backend")
+    bench.add_argument("--datasets", nargs="+", help="datasets for the parser benchmark (default: all)")
+    bench.add_argument("--repeat", type=int, default=3, help="runs per query (default: 3)")
+    bench.set_defaults(run=cmd_bench)
+
+    export = commands.add_parser("export", help="export catalogue query results to files")
+    export.add_argument("--output", required=True, help="output directory")
+    export.add_argument("--format", choices=["csv", "pkl"], default="csv")
+    export.add_argument("--queries", nargs="+", help="query function names (default: all)")
+    export.add_argument("--tables", nargs="+", help="stream these whole tables to CSV instead of running queries")
+    export.add_argument("--chunksize", type=int, default=50000, help="rows per chunk with --tables (default: 50000)")
+    export.add_argument("--report", action="store_true", help="render the static case study report instead")
+    export.add_argument("--jobs", "-j", type=int, default=None,
+                        help="pages rendered in parallel (default: one per page, up to the CPU count)")
+    report(export)
+    export.set_defaults(run=cmd_export)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    timer = StageTimer()
+    try:
+        args.run(args, timer)
+    except Exception:
+        traceback.print_exc()
+        print(f"pulse {args.command} failed", file=sys.stderr)
+        return 1
+    finally:
+        if timer.stages:
+            print(timer.summary())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+"""
+query_cache.py
+
+This module caches the results of the query functions used by the Streamlit pages, so
+reruns of a page (widget changes, page switches, other sessions) reuse results instead
+of querying the database again. Queries run on a read replica when db_connection has
+readers configured.
+
+The data version is read from the writer, where loads publish it; the queries of a
+version only run on a replica that has replicated that version (or on the writer), so
+a lagging replica never fills the cache of a version with older data.
+
+Cached results are keyed by the data version published by data_loader.load_all, so a
+reload makes every page query fresh data within DATA_VERSION_TTL seconds. Importing
+this module also starts the cache_warmup background thread of the worker, which fills
+the cache for every page at boot and after each new data version.
+"""
+import importlib
+import streamlit as st
+
+from db_connection import get_phonepe_engine, get_data_version, read_engine, writer_engine
+from profiling import bypass_cache
+
+QUERY_CACHE_TTL = 3600
+DATA_VERSION_TTL = 30
+
+
+@st.cache_data(ttl=DATA_VERSION_TTL, show_spinner=False)
+def data_version(_engine):
+    """
+    Return the live data version from the writer, rechecked at most every
+    DATA_VERSION_TTL seconds.
+    """
+    return get_data_version(writer_engine(_engine))
+
+
+@st.cache_data(ttl=QUERY_CACHE_TTL, show_spinner=False)
+def _run_query(module_name, query_name, version, _engine, *args):
+    query = getattr(importlib.import_module(module_name), query_name)
+    return query(read_engine(_engine, version), *args)
+
+
+@st.cache_resource(show_spinner=False)
+def _cache_warmer(_engine):
+    from cache_warmup import start_cache_warmer
+    return start_cache_warmer(_engine)
+
+
+def cached_query(query, engine, *args):
+    """
+    Run a query function (e.g. data_queries.get_states_contribution) through the
+    Streamlit data cache. Results are keyed by the function, the data version and
+    the extra arguments.
+
+    During a profiled page run (see profiling.py) the query runs uncached.
+    """
+    if bypass_cache():
+        return query(read_engine(engine, data_version(engine)), *args)
+    return _run_query(query.__module__, query.__name__, data_version(engine), engine, *args)
+
+
+#Boot warm-up
+
+# The worker imports this module on its first script run, before any page query; the
+# cache_resource guard keeps it to one warmer thread per process.
+_cache_warmer(get_phonepe_engine())
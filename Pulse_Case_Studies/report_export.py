@@ -0,0 +1,226 @@
+"""
+report_export.py
+
+This module pre-renders the five case study pages into a static report: one HTML file
+per page plus an index, optionally with a PNG of every figure and a single PDF.
+
+Each page script is run headless with Streamlit's AppTest, so the report shows exactly
+the headers, figures and tables of the dashboard without duplicating their code. Pages
+are rendered in parallel on a process pool. Readers of the report put no load on the
+database.
+"""
+import os
+import sys
+import html
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+PAGES_DIR = os.path.join(MODULE_DIR, "streamlit_app", "pages")
+REPORT_DIR = os.getenv("REPORT_DIR", os.path.join(MODULE_DIR, "reports"))
+
+REPORT_PAGES = [
+    "1_Transaction_Dynamics.py",
+    "2_Device_Dominance.py",
+    "3_Insurance_Penetration.py",
+    "4_Market_Expansion.py",
+    "5_User_Engagement.py",
+]
+
+PAGE_TIMEOUT = 600
+
+TEXT_ELEMENTS = {
+    "title": "h1",
+    "header": "h2",
+    "subheader": "h3",
+    "caption": "p class='caption'",
+    "markdown": "p",
+    "alert": "p class='info'",
+}
+
+STYLE = """
+body { font-family: sans-serif; margin: 2em auto; max-width: 1200px; color: #222; }
+.columns { display: flex; gap: 1em; }
+.columns > div { flex: 1; min-width: 0; }
+.caption { color: #777; font-size: 0.9em; }
+.info { background: #eef4fb; padding: 0.6em; }
+table { border-collapse: collapse; font-size: 0.9em; margin: 0.5em 0; }
+td, th { border: 1px solid #ddd; padding: 0.25em 0.5em; }
+"""
+
+
+#Rendering pages
+
+
+def _element_blocks(node):
+    """
+    Flatten an AppTest element tree into report blocks, in page order:
+    (kind, payload) with kind one of the TEXT_ELEMENTS keys, "figure" (Plotly JSON),
+    "table" (DataFrame), "columns" (list of block lists) or "section" ((label, blocks)).
+    """
+    blocks = []
+    for child in node.children.values():
+        kind = getattr(child, "type", "")
+        if kind == "flex_container" and all(getattr(c, "type", "") == "column" for c in child.children.values()):
+            blocks.append(("columns", [_element_blocks(column) for column in child.children.values()]))
+        elif kind == "expandable":
+            blocks.append(("section", (child.proto.expandable.label, _element_blocks(child))))
+        elif kind == "plotly_chart":
+            blocks.append(("figure", child.proto.spec))
+        elif kind in ("dataframe", "arrow_data_frame"):
+            blocks.append(("table", child.value))
+        elif kind in TEXT_ELEMENTS:
+            blocks.append((kind, str(child.value)))
+        elif getattr(child, "children", None):
+            blocks.extend(_element_blocks(child))
+    return blocks
+
+
+def render_page(page, timeout=PAGE_TIMEOUT):
+    """
+    Run one page script headless and collect its report blocks.
+
+    Returns:
+    dict with keys page, blocks, seconds and error (None when the page ran cleanly)
+    """
+    if MODULE_DIR not in sys.path:
+        sys.path.insert(0, MODULE_DIR)
+    # Each worker renders a single page; warming every page's queries would only compete with it.
+    os.environ.setdefault("CACHE_WARMUP", "0")
+    from streamlit.testing.v1 import AppTest
+
+    start = time.perf_counter()
+    app = AppTest.from_file(os.path.join(PAGES_DIR, page), default_timeout=timeout).run()
+    error = app.exception[0].message if app.exception else None
+    return {
+        "page": page,
+        "blocks": _element_blocks(app.main),
+        "seconds": time.perf_counter() - start,
+        "error": error,
+    }
+
+
+#Writing the report
+
+
+def _page_name(page):
+    return os.path.splitext(page)[0]
+
+
+def _blocks_html(blocks, figures):
+    import plotly.io as pio
+
+    parts = []
+    for kind, payload in blocks:
+        if kind == "figure":
+            figure = pio.from_json(payload)
+            figures.append(figure)
+            parts.append(pio.to_html(figure, include_plotlyjs=False, full_html=False))
+        elif kind == "table":
+            parts.append(payload.to_html(index=False, border=0))
+        elif kind == "columns":
+            parts.append("<div class='columns'>" + "".join(
+                f"<div>{_blocks_html(column, figures)}</div>" for column in payload) + "</div>")
+        elif kind == "section":
+            label, section = payload
+            parts.append(f"<details><summary>{html.escape(label)}</summary>{_blocks_html(section, figures)}</details>")
+        else:
+            tag = TEXT_ELEMENTS[kind]
+            parts.append(f"<{tag}>{html.escape(payload)}</{tag.split()[0]}>")
+    return "\n".join(parts)
+
+
+def _document(title, body):
+    return (f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>{html.escape(title)}</title>"
+            f"<script src='plotly.min.js'></script><style>{STYLE}</style></head><body>{body}</body></html>")
+
+
+def _write(path, text):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def _write_images(figures, image_dir, name):
+    import plotly.io as pio
+
+    paths = []
+    for number, figure in enumerate(figures, start=1):
+        path = os.path.join(image_dir, f"{name}_{number:02d}.png")
+        pio.write_image(figure, path, width=1200, height=700)
+        paths.append(path)
+    return paths
+
+
+def _write_pdf(image_paths, path):
+    # Assembled with matplotlib, one figure image per PDF page.
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from matplotlib.backends.backend_pdf import PdfPages
+
+    with PdfPages(path) as pdf:
+        for image_path in image_paths:
+            image = plt.imread(image_path)
+            fig = plt.figure(figsize=(image.shape[1] / 100, image.shape[0] / 100), dpi=100)
+            fig.figimage(image)
+            pdf.savefig(fig)
+            plt.close(fig)
+
+
+def build_report(output_dir=None, pages=None, jobs=None, images=False, pdf=False, data_version=None):
+    """
+    Render the case study pages on a process pool and write the static report to
+    output_dir: index.html, one HTML file per page and plotly.min.js, plus
+    images/*.png with images=True and report.pdf with pdf=True (both need the kaleido
+    package for Plotly image export).
+
+    Returns:
+    list of dicts, one per page, with keys page, seconds, figures and error
+    """
+    import plotly.offline
+
+    output_dir = output_dir or REPORT_DIR
+    pages = pages or REPORT_PAGES
+    if images or pdf:
+        try:
+            import kaleido  # noqa: F401
+        except ImportError:
+            raise RuntimeError("PNG/PDF export needs the kaleido package (pip install kaleido)")
+
+    os.makedirs(output_dir, exist_ok=True)
+    _write(os.path.join(output_dir, "plotly.min.js"), plotly.offline.get_plotlyjs())
+
+    with ProcessPoolExecutor(max_workers=jobs or min(len(pages), os.cpu_count() or 1)) as pool:
+        results = list(pool.map(render_page, pages))
+
+    image_dir = os.path.join(output_dir, "images")
+    image_paths = []
+    summary = []
+    links = []
+    for result in results:
+        name = _page_name(result["page"])
+        figures = []
+        body = _blocks_html(result["blocks"], figures)
+        if result["error"]:
+            body = f"<p class='info'>This page failed to render: {html.escape(result['error'])}</p>" + body
+        _write(os.path.join(output_dir, name + ".html"), _document(name, body))
+
+        if images or pdf:
+            os.makedirs(image_dir, exist_ok=True)
+            image_paths += _write_images(figures, image_dir, name)
+
+        title = next((payload for kind, payload in result["blocks"] if kind == "title"), name)
+        links.append(f"<li><a href='{name}.html'>{html.escape(title)}</a></li>")
+        summary.append({"page": result["page"], "seconds": round(result["seconds"], 3),
+                        "figures": len(figures), "error": result["error"]})
+
+    if pdf:
+        _write_pdf(image_paths, os.path.join(output_dir, "report.pdf"))
+
+    stamp = time.strftime("%Y-%m-%d %H:%M")
+    version = f", data version {data_version}" if data_version is not None else ""
+    _write(os.path.join(output_dir, "index.html"), _document(
+        "PhonePe Pulse case studies",
+        f"<h1>PhonePe Pulse case studies</h1><p class='caption'>Generated {stamp}{version}</p>"
+        f"<ul>{''.join(links)}</ul>"))
+    return summary
@@ -0,0 +1,254 @@
+"""
+segmentation.py
+
+This module groups states or districts into segments that combine the measures the
+case studies look at one at a time:
+
+- Engagement_ratio: app opens per registered user;
+- Value_growth_pct: transaction value growth over the previous window;
+- Insurance_per_1k_users: insurance transactions per 1,000 registered users (a state
+  figure; districts take the figure of their state, as insurance is not published
+  below state level);
+- Avg_transaction_value: transaction value per transaction.
+
+Features are totals over the WINDOW quarters ending at the selected period, built
+with one group-by per source frame. Segments come from k-means on the robust-scaled
+features; the restarts of k-means run together as one batch of array operations
+rather than one after another.
+"""
+import numpy as np
+import pandas as pd
+
+FEATURES = ["Engagement_ratio", "Value_growth_pct", "Insurance_per_1k_users", "Avg_transaction_value"]
+FEATURE_LABELS = {
+    "Engagement_ratio": "engagement",
+    "Value_growth_pct": "growth",
+    "Insurance_per_1k_users": "insurance",
+    "Avg_transaction_value": "ticket size",
+}
+WINDOW = 4
+SEGMENT_COUNT = 4
+N_INIT = 10
+MAX_ITER = 100
+CLIP = 3.0
+NAME_THRESHOLD = 0.5
+
+
+#Features
+
+
+def _period_index(df):
+    return df["Year"] * 4 + df["Quarter"] - 1
+
+
+def _window_totals(slices_df, keys, columns, end, window):
+    """
+    Sum columns per keys over the window quarters ending at period index end
+    ("Current") and the window before it ("Previous").
+    """
+    age = end - _period_index(slices_df)
+    in_window = (age >= 0) & (age < 2 * window)
+    df = slices_df[in_window]
+    window_name = np.where(age[in_window] < window, "Current", "Previous")
+    totals = df.groupby(keys + [pd.Series(window_name, index=df.index, name="Window")])[columns].sum()
+    totals = totals.unstack("Window").reindex(columns=pd.MultiIndex.from_product([columns, ["Current", "Previous"]]))
+    totals.columns = [column if window_name == "Current" else f"Previous_{column}" for column, window_name in totals.columns]
+    return totals
+
+
+def resolve_period(slices_df, year=None, quarter=None):
+    """
+    The last period index of a selection that has data: the latest quarter overall,
+    or of the selected year, or the selected quarter itself. A selection before the
+    first quarter with data resolves to that first quarter; None when there is no data.
+    """
+    periods = _period_index(slices_df)
+    if periods.empty:
+        return None
+    if year is not None:
+        selected = periods[periods <= year * 4 + (quarter or 4) - 1]
+        if selected.empty:
+            return int(periods.min())
+        periods = selected
+    return int(periods.max())
+
+
+def build_features(transaction_df, user_df, insurance_df, keys, end, window=WINDOW):
+    """
+    Build the feature matrix of every entity in transaction_df.
+
+    transaction_df: [*keys, Year, Quarter, Total_volume, Total_value]
+    user_df: [*keys, Year, Quarter, Registered_users, App_opens]
+    insurance_df: [State, Year, Quarter, Insurance_txn_count]; keys must include State
+    end: period index (Year * 4 + Quarter - 1) of the last quarter of the window
+
+    Returns:
+    pandas.DataFrame with columns [*keys, *FEATURES, Total_value, Registered_users]
+    """
+    transactions = _window_totals(transaction_df, keys, ["Total_volume", "Total_value"], end, window)
+    users = _window_totals(user_df, keys, ["Registered_users", "App_opens"], end, window)
+    state_users = users.groupby(level="State")["Registered_users"].sum()
+    insurance = _window_totals(insurance_df, ["State"], ["Insurance_txn_count"], end, window)["Insurance_txn_count"]
+
+    # Registered users are a running total, so the window sums give opens per user-quarter;
+    # the reported Registered_users is the latest figure up to end.
+    latest_users = (user_df[_period_index(user_df) <= end].sort_values(["Year", "Quarter"])
+                    .groupby(keys)["Registered_users"].last())
+
+    features = (transactions.join(users, how="left")
+                .join(latest_users.rename("Latest_registered_users"), how="left").reset_index())
+    registered = features["Registered_users"].where(features["Registered_users"] > 0)
+    features["Engagement_ratio"] = features["App_opens"] / registered
+    features["Value_growth_pct"] = (features["Total_value"] / features["Previous_Total_value"].where(
+        features["Previous_Total_value"] > 0) - 1) * 100
+    features["Insurance_per_1k_users"] = features["State"].map(
+        insurance / state_users.where(state_users > 0) * 1000)
+    features["Avg_transaction_value"] = features["Total_value"] / features["Total_volume"].where(features["Total_volume"] > 0)
+    features["Registered_users"] = features["Latest_registered_users"]
+    features = features[features["Total_value"] > 0]
+    return features[keys + FEATURES + ["Total_value", "Registered_users"]].round(4).reset_index(drop=True)
+
+
+def scale_features(features_df, columns=FEATURES, clip=CLIP):
+    """
+    Robust-scale the feature columns: (x - median) / IQR, clipped to +-clip so a
+    handful of outliers cannot take a segment of their own. Missing values sit at
+    the median.
+
+    Returns:
+    numpy.ndarray of shape (n_entities, n_features)
+    """
+    X = features_df[columns].to_numpy(dtype=float)
+    median = np.nanmedian(X, axis=0)
+    spread = np.nanpercentile(X, 75, axis=0) - np.nanpercentile(X, 25, axis=0)
+    spread = np.where(np.isfinite(spread) & (spread > 0), spread, 1.0)
+    return np.nan_to_num(np.clip((X - median) / spread, -clip, clip))
+
+
+#Batched k-means
+
+
+def _squared_distances(X, centroids):
+    # (runs, n, k) from ||x||^2 - 2 x.c + ||c||^2
+    return np.maximum((X ** 2).sum(axis=1)[None, :, None]
+                      - 2 * np.einsum("nd,rkd->rnk", X, centroids)
+                      + (centroids ** 2).sum(axis=2)[:, None, :], 0)
+
+
+def _kmeans_plus_plus(X, k, runs, rng):
+    # One k-means++ seeding per run, all runs drawn together.
+    n = len(X)
+    chosen = [rng.integers(n, size=runs)]
+    closest = ((X[None, :, :] - X[chosen[0]][:, None, :]) ** 2).sum(axis=2)
+    for _ in range(1, k):
+        cumulative = np.cumsum(closest, axis=1)
+        targets = rng.random(runs) * cumulative[:, -1]
+        picks = np.minimum((cumulative < targets[:, None]).sum(axis=1), n - 1)
+        chosen.append(picks)
+        closest = np.minimum(closest, ((X[None, :, :] - X[picks][:, None, :]) ** 2).sum(axis=2))
+    return X[np.stack(chosen, axis=1)]
+
+
+def kmeans(X, k, n_init=N_INIT, max_iter=MAX_ITER, tol=1e-8, seed=0):
+    """
+    Lloyd's k-means with n_init k-means++ restarts run as one batch: every iteration
+    assigns the points and moves the centroids of all restarts with array operations.
+
+    Returns:
+    (labels, centroids, inertia) of the restart with the lowest inertia
+    """
+    k = min(k, len(X))
+    rng = np.random.default_rng(seed)
+    centroids = _kmeans_plus_plus(X, k, n_init, rng)
+    for _ in range(max_iter):
+        labels = _squared_distances(X, centroids).argmin(axis=2)
+        members = labels[:, :, None] == np.arange(k)
+        counts = members.sum(axis=1)
+        sums = np.einsum("rnk,nd->rkd", members.astype(float), X)
+        # A centroid that lost all its points stays where it was.
+        moved = np.where(counts[:, :, None] > 0, sums / np.maximum(counts, 1)[:, :, None], centroids)
+        shift = ((moved - centroids) ** 2).sum()
+        centroids = moved
+        if shift <= tol:
+            break
+    distances = _squared_distances(X, centroids)
+    labels = distances.argmin(axis=2)
+    inertia = distances.min(axis=2).sum(axis=1)
+    best = int(inertia.argmin())
+    return labels[best], centroids[best], float(inertia[best])
+
+
+#Segments
+
+
+def _segment_names(centroids, columns, distinct=NAME_THRESHOLD):
+    # Name each segment after its two most distinctive features, e.g. "High growth, low insurance";
+    # features within distinct (scaled units) of the median are not distinctive.
+    names = []
+    for centroid in centroids:
+        top = [i for i in np.argsort(-np.abs(centroid))[:2] if abs(centroid[i]) >= distinct]
+        name = ", ".join(f"{'high' if centroid[i] > 0 else 'low'} {FEATURE_LABELS.get(columns[i], columns[i])}"
+                         for i in top) or "typical"
+        name = name[0].upper() + name[1:]
+        names.append(name if name not in names else f"{name} ({len(names) + 1})")
+    return names
+
+
+def segment_entities(features_df, k=SEGMENT_COUNT, seed=0, columns=FEATURES):
+    """
+    Assign every entity of features_df to one of k segments. Segments are numbered
+    from the largest (1) to the smallest.
+
+    Returns:
+    (segments_df, profile_df)
+    segments_df: features_df with [Segment, Segment_name] added
+    profile_df: one row per segment with [Segment, Segment_name, Entities, median of each
+    feature, Total_value, Registered_users]
+    """
+    segments_df = features_df.copy()
+    if segments_df.empty:
+        segments_df["Segment"], segments_df["Segment_name"] = pd.Series(dtype=int), pd.Series(dtype=object)
+        return segments_df, pd.DataFrame(columns=["Segment", "Segment_name", "Entities"] + columns)
+
+    labels, centroids, _ = kmeans(scale_features(segments_df, columns), k, seed=seed)
+    sizes = np.bincount(labels, minlength=len(centroids))
+    order = np.argsort(-sizes, kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    names = _segment_names(centroids[order], columns)
+
+    segments_df["Segment"] = rank[labels] + 1
+    segments_df["Segment_name"] = np.array(names, dtype=object)[rank[labels]]
+
+    profile_df = (segments_df.groupby(["Segment", "Segment_name"])
+                  .agg(Entities=("Segment", "size"), **{column: (column, "median") for column in columns},
+                       Total_value=("Total_value", "sum"), Registered_users=("Registered_users", "sum"))
+                  .round(2).reset_index())
+    return segments_df, profile_df
+
+
+def segment_states(transaction_slices_df, state_user_slices_df, insurance_slices_df, end, k=SEGMENT_COUNT):
+    """
+    Segment the states from the period slice frames (data_queries.get_transaction_slices,
+    get_state_user_slices and get_insurance_slices) for the window ending at period index end.
+    State users are the map_user district totals: agg_user stops after 2022 Q1.
+
+    Returns:
+    (segments_df, profile_df) as in segment_entities, keyed by State
+    """
+    features_df = build_features(transaction_slices_df, state_user_slices_df, insurance_slices_df, ["State"], end)
+    return segment_entities(features_df, k)
+
+
+def segment_districts(district_transaction_slices_df, district_user_slices_df, insurance_slices_df, end,
+                      k=SEGMENT_COUNT):
+    """
+    Segment the districts from the district slice frames (data_queries.get_district_transaction_slices
+    and get_district_user_slices) for the window ending at period index end.
+
+    Returns:
+    (segments_df, profile_df) as in segment_entities, keyed by District_id, State, District
+    """
+    keys = ["District_id", "State", "District"]
+    features_df = build_features(district_transaction_slices_df, district_user_slices_df, insurance_slices_df, keys, end)
+    return segment_entities(features_df, k)
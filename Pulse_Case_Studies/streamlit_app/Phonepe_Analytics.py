@@ -17,6 +17,15 @@ engine = get_phonepe_engine()
 
 st.set_page_config(page_title="PhonePe Analytics Dashboard", layout="wide")
 
+from profiling import profile_page
+profile_page(__file__)
+
+from query_cache import cached_query
+from period_slices import period_selector, slice_period, period_label
+from data_queries import get_transaction_slices
+transaction_slices_df = cached_query(get_transaction_slices, engine)
+selected_year, selected_quarter = period_selector(transaction_slices_df)
+
 
 st.markdown("""
     <style>
@@ -35,7 +44,8 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-st.sidebar.image("D:\D26_Files\Phonepe_Analytics\Pulse_Case_Studies\PhonePe-Logo.wine.png", width=500)
+st.sidebar.image(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "PhonePe-Logo.wine.png"),
+                 width=500)
 
 Home_title = """
 <p style='font-family:Roboto, Segoe UI, Arial, sans-serif; color:#6739B7; font-size:50px; font-weight:bold'>
@@ -65,20 +75,20 @@ with col2:
     """,
     unsafe_allow_html=True)
     
-from data_queries import get_states_contribution
-states_contribution_df = get_states_contribution(engine)
+from period_slices import state_transaction_totals
+states_contribution_df = state_transaction_totals(slice_period(transaction_slices_df, selected_year, selected_quarter))
 
     
 fig = px.choropleth(
     states_contribution_df,
     geojson="https://gist.githubusercontent.com/jbrobst/56c13bbbf9d97d187fea01ca62ea5112/raw/e388c4cae20aa53cb5090210a42ebb9b765c0a36/india_states.geojson",
     featureidkey="properties.ST_NM",  
-    locations="State",
+    locations="Geo_name",
     color="Total_Transaction_Value",
     color_continuous_scale="purp",
     hover_name="State",
     hover_data=["Total_Transaction_Volume", "Avg_Transaction_Value"],
-    title="PhonePe Transaction Value by State")
+    title=f"PhonePe Transaction Value by State ({period_label(selected_year, selected_quarter)})")
 
 fig.update_geos(fitbounds="locations", visible=False)
 fig.update_layout(width=1080, height=720)
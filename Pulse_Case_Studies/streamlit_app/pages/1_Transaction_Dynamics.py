@@ -17,27 +17,50 @@ engine = get_phonepe_engine()
 
 st.set_page_config(page_title="Transaction Dynamics", layout="wide")
 
+from profiling import profile_page
+profile_page(__file__)
+
+from query_cache import cached_query
+from period_slices import period_selector, slice_period, period_label
+from data_queries import get_transaction_slices
+transaction_slices_df = cached_query(get_transaction_slices, engine)
+selected_year, selected_quarter = period_selector(transaction_slices_df)
+
 
 st.title("Transaction Dynamics on PhonePe Analysis")
 
-st.header("PhonePe Transaction Growth Over Time")
+from cross_filter import CrossFilter
+import plotly.graph_objects as go
+
+# Linked charts: selecting states in the Top 10 charts or categories in the category
+# charts filters the other charts of this section, in memory from transaction_slices_df.
+# The selectable charts are built with plotly.graph_objects, which draws a figure in a
+# few milliseconds where plotly.express takes tens, so a selection redraws the section
+# in under 100 ms.
+xf = CrossFilter("transaction_dynamics")
+xf.link("top_states_value", "State", field="y", group="top_states")
+xf.link("top_states_volume", "State", field="y", group="top_states")
+xf.link("category_value", "Transaction_type", field="customdata", group="categories")
+xf.link("category_volume", "Transaction_type", field="customdata", group="categories")
+xf.controls()
+
+selection_label = "; ".join(", ".join(sorted(values)) for _, values in xf.selections().values())
+selection_suffix = f" ({selection_label})" if selection_label else ""
+
 
-from data_queries import get_transaction_growth
-transaction_growth_df = get_transaction_growth(engine)
+st.header("PhonePe Transaction Growth Over Time")
 
-yearly_df = transaction_growth_df.groupby('Year').agg({
-    'Total_value': 'sum',
-    'Total_volume': 'sum'
-}).reset_index()
+yearly_df = (xf.filter(transaction_slices_df)
+             .groupby("Year", as_index=False)[["Total_value", "Total_volume"]].sum())
 
 fig_value = px.line(yearly_df, x='Year', y='Total_value', 
-                    title='Total Transaction Value Growth (₹)', 
+                    title=f'Total Transaction Value Growth (₹){selection_suffix}', 
                     labels={'Total_value': 'Total Transaction Value'},
                     line_shape='linear')
 fig_value.update_traces(line=dict(color='blue'))
 
 fig_volume = px.line(yearly_df, x='Year', y='Total_volume', 
-                     title='Total Transaction Volume Growth',
+                     title=f'Total Transaction Volume Growth{selection_suffix}',
                      labels={'Total_volume': 'Total Transaction Volume'},
                      line_shape='linear')
 fig_volume.update_traces(line=dict(color='green'))
@@ -50,39 +73,33 @@ with col2:
     
  
 st.header("Payment Category Growth Over Time")
-    
-from data_queries import get_payment_category_growth
-payment_category_growth_df = get_payment_category_growth(engine)
-
-fig_vol = px.bar(payment_category_growth_df,
-                 x="Year",
-                 y="Total_Volume",
-                 color="Transaction_type",
-                 color_discrete_sequence=px.colors.qualitative.Pastel1,
-                 title="Transaction Volume by Category Over Years",
-                 labels={"Total_Volume": "Total Transaction Volume"},
-                 barmode='stack')
-
-fig_val = px.bar(payment_category_growth_df,
-                 x="Year",
-                 y="Total_Value",
-                 color="Transaction_type",
-                 color_discrete_sequence=px.colors.qualitative.Pastel1,
-                 title="Transaction Value by Category Over Years",
-                 labels={"Total_Value": "Total Transaction Value (₹)"},
-                 barmode='stack')
+
+payment_category_growth_df = (xf.filter(transaction_slices_df, exclude="categories")
+                              .groupby(["Transaction_type", "Year"], as_index=False)[["Total_volume", "Total_value"]].sum())
+
+def category_bars(column, title, axis_title):
+    return go.Figure(
+        [go.Bar(x=category_df["Year"], y=category_df[column], name=category,
+                customdata=category_df[["Transaction_type"]], marker=dict(color=color))
+         for (category, category_df), color in zip(payment_category_growth_df.groupby("Transaction_type"),
+                                                   px.colors.qualitative.Pastel1 * 2)],
+        layout=dict(title=title, barmode="stack", xaxis=dict(title="Year"), yaxis=dict(title=axis_title),
+                    legend=dict(title="Transaction_type")))
+
+fig_vol = category_bars("Total_volume", "Transaction Volume by Category Over Years", "Total Transaction Volume")
+fig_val = category_bars("Total_value", "Transaction Value by Category Over Years", "Total Transaction Value (₹)")
 
 col1, col2 = st.columns(2)
 with col1:
-    st.plotly_chart(fig_val, use_container_width=True)
+    xf.plotly_chart("category_value", fig_val, use_container_width=True)
 with col2:
-    st.plotly_chart(fig_vol, use_container_width=True)
+    xf.plotly_chart("category_volume", fig_vol, use_container_width=True)
     
     
 st.header("Seasonal Trends and Festive Spikes in Transaction Activity")  
 
-from data_queries import get_seasonal_transaction_spikes
-seasonal_spikes_df = get_seasonal_transaction_spikes(engine)
+seasonal_spikes_df = (xf.filter(transaction_slices_df)
+                      .groupby(["Year", "Quarter"], as_index=False)["Total_volume"].sum())
 
 fig_heatmap = px.density_heatmap(seasonal_spikes_df, 
                                  x='Quarter', 
@@ -90,7 +107,7 @@ fig_heatmap = px.density_heatmap(seasonal_spikes_df,
                                  z='Total_volume',
                                  histfunc='sum',
                                  text_auto=True,
-                                 title='Heatmap: Total Transaction Volume by Quarter and Year',
+                                 title=f'Heatmap: Total Transaction Volume by Quarter and Year{selection_suffix}',
                                  color_continuous_scale='Inferno',
                                  labels={'Total_volume': 'Transaction Volume'})
 
@@ -99,53 +116,81 @@ st.plotly_chart(fig_heatmap, use_container_width=True)
 
 st.header("Top 10 States Driving Transaction Growth")
 
-from data_queries import get_top_contributing_states
-top_state_df = get_top_contributing_states(engine) 
+top_state_df = (xf.filter(slice_period(transaction_slices_df, selected_year, selected_quarter), exclude="top_states")
+                .groupby("State", as_index=False)[["Total_volume", "Total_value"]].sum())
 
-fig_Value = px.bar(
-    top_state_df,
-    x="Total_value",
-    y="State",
-    orientation='h',
-    title="Top 10 States by Total Transaction Value",
-    labels={"Total_value": "Total Transaction Value (₹)"},
-    color="Total_value",
-    color_continuous_scale="Greens")
-
-fig_Volume = px.bar(
-    top_state_df,
-    x="Total_value",
-    y="State",
-    orientation='h',
-    title="Top 10 States by Total Transaction Volume",
-    labels={"Total_volume": "Total Transaction Volume"},
-    color="Total_volume",
-    color_continuous_scale="Blues")
+def top_states_bars(column, title, axis_title, colorscale):
+    top_df = top_state_df.nlargest(10, column)
+    return go.Figure(
+        go.Bar(x=top_df[column], y=top_df["State"], orientation="h",
+               marker=dict(color=top_df[column], colorscale=colorscale, showscale=True)),
+        layout=dict(title=title, xaxis=dict(title=axis_title), yaxis=dict(title="State")))
+
+fig_Value = top_states_bars("Total_value", f"Top 10 States by Total Transaction Value ({period_label(selected_year, selected_quarter)})",
+                            "Total Transaction Value (₹)", "Greens")
+fig_Volume = top_states_bars("Total_volume", f"Top 10 States by Total Transaction Volume ({period_label(selected_year, selected_quarter)})",
+                             "Total Transaction Volume", "Blues")
 
 col1, col2 = st.columns(2)
 with col1:
-    st.plotly_chart(fig_Value, use_container_width=True)
+    xf.plotly_chart("top_states_value", fig_Value, use_container_width=True)
 with col2:
-    st.plotly_chart(fig_Volume, use_container_width=True)
+    xf.plotly_chart("top_states_volume", fig_Volume, use_container_width=True)
+st.caption(f"Linked charts filtered and drawn in {xf.elapsed_ms():.0f} ms")
 
 
 st.header("States with Declining or Stagnant Transaction Trends")  
 
-from data_queries import get_state_transaction_trends
-state_trends_df = get_state_transaction_trends(engine)
+from anomaly_detection import detect_anomalies
+from query_cache import data_version
+from data_queries import get_district_transaction_slices
+
+@st.cache_data(ttl=3600)
+def load_trend_scores(version, year, quarter, _state_series_df, _district_series_df):
+    # Scores are computed on history up to the selected period; the slice frames are
+    # cached per data version, so the version and period are enough to key this cache.
+    def as_of(series_df):
+        if year is None:
+            return series_df
+        period = series_df["Year"] * 4 + series_df["Quarter"]
+        return series_df[period <= year * 4 + (quarter or 4)]
+
+    state_scores = detect_anomalies(as_of(_state_series_df), ["State"], "Total_volume")
+    district_scores = detect_anomalies(as_of(_district_series_df), ["State", "District"], "Total_volume")
+    return state_scores, district_scores
+
+state_series_df = transaction_slices_df.groupby(["State", "Year", "Quarter"], as_index=False)["Total_volume"].sum()
+district_series_df = cached_query(get_district_transaction_slices, engine)
+
+(state_trends_df, state_flags_df), (district_trends_df, district_flags_df) = load_trend_scores(
+    data_version(engine), selected_year, selected_quarter, state_series_df, district_series_df)
+
+state_trends_df = (state_trends_df[state_trends_df["Trend"].isin(["Declining", "Stagnant"])]
+                   .sort_values("Slope_pct_per_quarter"))
 
 fig = px.bar(
     state_trends_df,
-    x="Total_Volume",
+    x="Slope_pct_per_quarter",
     y="State",
     orientation='h',
-    title="States with Lowest Total Transaction Volume",
-    labels={"Total_Volume": "Total Transaction Volume", "State": "State"},
-    color="Total_Volume",
-    color_continuous_scale="Reds")
+    title="States with Declining or Stagnant Transaction Volume (trend of the last 8 quarters, rolling 4-quarter sum)",
+    labels={"Slope_pct_per_quarter": "Trend (% change per quarter)", "State": "State"},
+    color="Trend",
+    color_discrete_map={"Declining": "red", "Stagnant": "orange"},
+    hover_data=["Slope_t_stat", "Latest_value"])
 
 st.plotly_chart(fig, use_container_width=True)
 
+if state_trends_df.empty:
+    st.info("No state shows a declining or stagnant trend for the selected period.")
+
+with st.expander("Quarterly spikes and drops (states and districts)"):
+    st.caption("Quarters whose year-over-year growth is 3+ standard deviations from the previous four quarters")
+    st.dataframe(pd.concat([state_flags_df, district_flags_df], ignore_index=True), hide_index=True)
+    st.caption("Districts with a declining trend")
+    st.dataframe(district_trends_df[district_trends_df["Trend"] == "Declining"]
+                 .sort_values("Slope_pct_per_quarter"), hide_index=True)
+
 
 
    
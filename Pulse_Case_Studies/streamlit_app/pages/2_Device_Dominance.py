@@ -17,13 +17,26 @@ engine = get_phonepe_engine()
 
 st.set_page_config(page_title="Device Dominance", layout="wide")
 
+from profiling import profile_page
+profile_page(__file__)
+
+from query_cache import cached_query
+from period_slices import period_selector, slice_period, period_label
+from data_queries import get_transaction_slices, get_user_slices, get_district_user_slices
+transaction_slices_df = cached_query(get_transaction_slices, engine)
+selected_year, selected_quarter = period_selector(transaction_slices_df)
+user_slices_df = cached_query(get_user_slices, engine)
+district_user_slices_df = cached_query(get_district_user_slices, engine)
+
 
 st.title("Device Dominance and User Engagement Analysis")
 
 st.header("Device Brand Dominance Among PhonePe Users")
 
-from data_queries import get_device_brand_dominance
-device_brand_df = get_device_brand_dominance(engine)
+device_brand_df = (slice_period(user_slices_df, selected_year, selected_quarter, latest_when_all=True)
+                   .groupby("Brand", as_index=False)["Brand_count"].sum()
+                   .rename(columns={"Brand_count": "Total_users"})
+                   .sort_values("Total_users", ascending=False))
 
 threshold = 0.02 * device_brand_df["Total_users"].sum()
 major_brands = device_brand_df[device_brand_df["Total_users"] >= threshold]
@@ -38,7 +51,7 @@ fig1 = px.pie(
     brand_df,
     names="Brand",
     values="Total_users",
-    title="Registered Users by Device Brand",
+    title=f"Registered Users by Device Brand ({period_label(selected_year or user_slices_df['Year'].max(), selected_quarter)})",
     hole=0.5 )
 
 fig1.update_layout(width=500, height=500)
@@ -48,8 +61,12 @@ st.plotly_chart(fig1, use_container_width=True)
 
 st.header("Top 10 Districts by User Engagement")
 
-from data_queries import get_top_district_user_engagement
-district_engagement_df = get_top_district_user_engagement(engine)
+district_engagement_df = slice_period(district_user_slices_df, selected_year, selected_quarter, latest_when_all=True)
+district_engagement_df = (district_engagement_df[district_engagement_df["Registered_users"] > 0]
+                          .groupby(["State", "District"], as_index=False)[["Registered_users", "App_opens"]].sum()
+                          .rename(columns={"Registered_users": "Total_users", "App_opens": "Total_opens"}))
+district_engagement_df["Engagement_score"] = (district_engagement_df["Total_opens"] / district_engagement_df["Total_users"]).round(2)
+district_engagement_df = district_engagement_df.nlargest(10, "Engagement_score")
 
 district_engagement_df = district_engagement_df.rename(columns={"Total_users": "Total users"})
 district_engagement_df = district_engagement_df.rename(columns={"Total_opens": "Total opens"})
@@ -75,7 +92,7 @@ st.plotly_chart(fig2, use_container_width=True)
 st.header("Regional Preferences: Premium vs Budget Brands")
 
 from data_queries import get_region_brand_preference
-region_brand_df = get_region_brand_preference(engine)
+region_brand_df = cached_query(get_region_brand_preference, engine)
 
 fig_grouped = px.bar(
     region_brand_df,
@@ -95,7 +112,7 @@ st.plotly_chart(fig_grouped, use_container_width=True)
 st.header("Underperforming Brands: High Users, Low Market Penetration")
 
 from data_queries import get_underperforming_brands
-underperforming_brands_df = get_underperforming_brands(engine)
+underperforming_brands_df = cached_query(get_underperforming_brands, engine)
 
 fig_scatter = px.scatter(
     underperforming_brands_df,
@@ -119,7 +136,7 @@ st.plotly_chart(fig_scatter, use_container_width=True)
 st.header("User Engagement: Metro vs Non-Metro Districts")
 
 from data_queries import get_engagement_metro_vs_nonmetro
-engagement_metro_nonmetro_df = get_engagement_metro_vs_nonmetro(engine)
+engagement_metro_nonmetro_df = cached_query(get_engagement_metro_vs_nonmetro, engine)
 
 metro_df = engagement_metro_nonmetro_df[engagement_metro_nonmetro_df["Area_type"] == "Metro"]
 nonmetro_df = engagement_metro_nonmetro_df[engagement_metro_nonmetro_df["Area_type"] == "Non-Metro"]
@@ -17,13 +17,39 @@ engine = get_phonepe_engine()
 
 st.set_page_config(page_title="Insurance Penetration", layout="wide")
 
+from profiling import profile_page
+profile_page(__file__)
+
+from query_cache import cached_query
+from period_slices import period_selector, slice_period, period_label
+from data_queries import get_transaction_slices, get_state_user_slices, get_insurance_slices
+transaction_slices_df = cached_query(get_transaction_slices, engine)
+selected_year, selected_quarter = period_selector(transaction_slices_df)
+state_user_slices_df = cached_query(get_state_user_slices, engine)
+insurance_slices_df = cached_query(get_insurance_slices, engine)
+
 
 st.title("Insurance Penetration and Growth Potential Analysis")
+st.caption(f"Every chart on this page covers the period selected in the sidebar: "
+           f"{period_label(selected_year, selected_quarter)}.")
 
 st.header("State-wise Insurance Adoption Rate")
 
-from data_queries import get_insurance_adoption_by_state
-insurance_adoption_df = get_insurance_adoption_by_state(engine)
+period_insurance_df = slice_period(insurance_slices_df, selected_year, selected_quarter)
+
+# One row per state for the selected period; the charts below filter and rank it in memory.
+insurance_adoption_df = period_insurance_df.merge(
+    slice_period(state_user_slices_df, selected_year, selected_quarter),
+    on=["State", "Year", "Quarter"])
+insurance_adoption_df = (insurance_adoption_df
+                         .groupby("State", as_index=False)
+                         .agg(Total_Insurance_Transactions=("Insurance_txn_count", "sum"),
+                              Total_Registered_Users=("Registered_users", "max"),
+                              App_Engagement=("App_opens", "sum")))
+insurance_adoption_df = insurance_adoption_df[insurance_adoption_df["Total_Registered_Users"] > 0]
+insurance_adoption_df["Insurance_Adoption_Rate_Percentage"] = (
+    insurance_adoption_df["Total_Insurance_Transactions"] * 100.0 / insurance_adoption_df["Total_Registered_Users"]).round(4)
+insurance_adoption_df = insurance_adoption_df.sort_values("Insurance_Adoption_Rate_Percentage", ascending=False)
 
 fig_bar = px.bar(
     insurance_adoption_df,
@@ -35,7 +61,7 @@ fig_bar = px.bar(
     labels={
         "Insurance_Adoption_Rate_Percentage": "Insurance Adoption Rate (%)",
         "State": "State"},
-    title="Insurance Adoption Rate by State")
+    title=f"Insurance Adoption Rate by State ({period_label(selected_year, selected_quarter)})")
 
 fig_bar.update_layout(width=1000, height=800)
 
@@ -44,8 +70,9 @@ st.plotly_chart(fig_bar, use_container_width=False)
 
 st.header("States Lagging in Insurance Penetration Despite High Users")
 
-from data_queries import get_lagging_insurance_penetration_states
-lagging_penetration_df = get_lagging_insurance_penetration_states(engine)
+lagging_penetration_df = (insurance_adoption_df[insurance_adoption_df["Total_Registered_Users"] > 10000000]
+                          .sort_values(["Total_Registered_Users", "Insurance_Adoption_Rate_Percentage"],
+                                       ascending=[False, True]))
 
 fig_group = px.bar(
     lagging_penetration_df,
@@ -56,7 +83,7 @@ fig_group = px.bar(
     color_continuous_scale="sunsetdark",  
     barmode="group",         
     labels={"Total_Registered_Users": "User Count", "State": "State", "Insurance_Adoption_Rate_Percentage": "Adoption Percentage"},
-    title="States Lagging in Insurance Penetration")
+    title=f"States Lagging in Insurance Penetration ({period_label(selected_year, selected_quarter)})")
 
 fig_group.update_layout(width=1000, height=800)
 
@@ -65,8 +92,10 @@ st.plotly_chart(fig_group, use_container_width=True)
 
 st.header("Quarterly Growth of Insurance Transactions")
 
-from data_queries import get_insurance_quarterly_growth
-insurance_quarterly_df = get_insurance_quarterly_growth(engine)
+insurance_quarterly_df = (period_insurance_df
+                          .groupby(["Year", "Quarter"], as_index=False)
+                          .agg(Transaction_Volume=("Insurance_txn_count", "sum"),
+                               Transaction_Value=("Insurance_txn_amount", "sum")))
 
 insurance_quarterly_df['Year-Quarter'] = insurance_quarterly_df['Year'].astype(str) + " Q" + insurance_quarterly_df['Quarter'].astype(str)
 
@@ -98,11 +127,8 @@ with col2:
 
 st.header("Insurance Adoption: Top vs Bottom 10 States")
 
-from data_queries import get_top_10_insurance_adoption_states
-top_10_df = get_top_10_insurance_adoption_states(engine)
-
-from data_queries import get_bottom_10_insurance_adoption_states
-bottom_10_df = get_bottom_10_insurance_adoption_states(engine)
+top_10_df = insurance_adoption_df.nlargest(10, "Insurance_Adoption_Rate_Percentage")
+bottom_10_df = insurance_adoption_df.nsmallest(10, "Insurance_Adoption_Rate_Percentage")
     
 fig_top_10_df = px.box(
     top_10_df,
@@ -135,8 +161,11 @@ with col2:
     
 st.header("Untapped Insurance Opportunity by State")
 
-from data_queries import get_insurance_untapped_opportunities
-untapped_df = get_insurance_untapped_opportunities(engine)
+untapped_df = insurance_adoption_df.assign(
+    Untapped_Users=insurance_adoption_df["Total_Registered_Users"] - insurance_adoption_df["Total_Insurance_Transactions"])
+untapped_df = (untapped_df[(untapped_df["Total_Registered_Users"] > 1000000)
+                           & (untapped_df["Insurance_Adoption_Rate_Percentage"] < 10)]
+               .sort_values(["Untapped_Users", "App_Engagement"], ascending=False))
 
 fig = px.scatter(
     untapped_df,
@@ -150,7 +179,7 @@ fig = px.scatter(
         'Insurance_Adoption_Rate_Percentage': 'Insurance Adoption Rate (%)',
         'Total_Registered_Users': 'Registered Users',
         'App_Engagement': 'App Engagement'},
-    title="Bubble Chart: Untapped Insurance Opportunity by State",
+    title=f"Bubble Chart: Untapped Insurance Opportunity by State ({period_label(selected_year, selected_quarter)})",
     size_max=60,
     text="State",
     color_continuous_scale=px.colors.sequential.YlOrBr_r
@@ -18,36 +18,100 @@ engine = get_phonepe_engine()
 
 st.set_page_config(page_title="Market Expansion", layout="wide")
 
+from profiling import profile_page
+profile_page(__file__)
+
+from query_cache import cached_query
+from period_slices import period_selector, slice_period, period_label
+from data_queries import get_transaction_slices
+transaction_slices_df = cached_query(get_transaction_slices, engine)
+selected_year, selected_quarter = period_selector(transaction_slices_df)
+
 
 st.title("Transaction Analysis for Market Expansion")
 
 st.header("State-wise Contribution to PhonePe Transaction Volume and Value")
 
-from data_queries import get_states_contribution
-states_contribution_df = get_states_contribution(engine)
+from period_slices import state_transaction_totals
+states_contribution_df = state_transaction_totals(slice_period(transaction_slices_df, selected_year, selected_quarter))
+
+from cross_filter import CrossFilter
+
+# The state map and the state charts further down are linked: selecting states in one
+# filters the others, in memory from the frames already loaded for this page.
+xf = CrossFilter("market_expansion")
+xf.link("state_map", "State", field="location",
+        mapping=dict(zip(states_contribution_df["Geo_name"], states_contribution_df["State"])))
+xf.link("growth_states", "State", field="customdata")
+xf.link("market_status", "State", field="customdata")
+xf.controls()
 
     
 fig = px.choropleth(
     states_contribution_df,
     geojson="https://gist.githubusercontent.com/jbrobst/56c13bbbf9d97d187fea01ca62ea5112/raw/e388c4cae20aa53cb5090210a42ebb9b765c0a36/india_states.geojson",
     featureidkey="properties.ST_NM",  
-    locations="State",
+    locations="Geo_name",
     color="Total_Transaction_Value",
     color_continuous_scale="purp",
     hover_name="State",
     hover_data=["Total_Transaction_Volume", "Avg_Transaction_Value"],
-    title="Choropleth Map: State-wise Transaction Value")
+    title=f"Choropleth Map: State-wise Transaction Value ({period_label(selected_year, selected_quarter)})")
 
 fig.update_geos(fitbounds="locations", visible=False)
 fig.update_layout(width=1080, height=720)
 
-st.plotly_chart(fig, use_container_width=True)
+state_map_event = xf.plotly_chart("state_map", fig, selection_mode="points", use_container_width=True)
+
+
+st.header("District Drill-down")
+
+import time
+from district_queries import get_district_map_data
+from geo_shards import DISTRICT_KEY_PROPERTY, load_state_districts
+
+# District data is period specific; with no year selected the latest year is shown.
+drill_year = selected_year or int(transaction_slices_df["Year"].max())
+drill_quarter = selected_quarter
+
+selected_points = state_map_event.selection.points if state_map_event else []
+clicked_geo_name = selected_points[0].get("location") if selected_points else None
+clicked_state = dict(zip(states_contribution_df["Geo_name"], states_contribution_df["State"])).get(clicked_geo_name)
+state_options = states_contribution_df["State"].tolist()
+
+drill_state = st.selectbox(
+    "State (click the map above to select)",
+    state_options,
+    index=state_options.index(clicked_state) if clicked_state in state_options else 0)
+
+drill_start = time.perf_counter()
+
+district_map_df = cached_query(get_district_map_data, engine, drill_state, drill_year, drill_quarter)
+
+fig_district = px.choropleth(
+    district_map_df,
+    geojson=load_state_districts(drill_state),
+    featureidkey=f"properties.{DISTRICT_KEY_PROPERTY}",
+    locations="District_key",
+    color="Total_value",
+    color_continuous_scale="purp",
+    hover_name="District",
+    hover_data=["Total_volume", "Registered_users", "App_opens"],
+    labels={"Total_value": "Transaction Value", "Total_volume": "Transaction Volume",
+            "Registered_users": "Registered Users", "App_opens": "App Opens"},
+    title=f"District-wise Transaction Value: {drill_state}, {period_label(drill_year, drill_quarter)}")
+
+fig_district.update_geos(fitbounds="locations", visible=False)
+fig_district.update_layout(width=1080, height=720)
+
+st.plotly_chart(fig_district, use_container_width=True)
+st.caption(f"Drill-down built in {(time.perf_counter() - drill_start) * 1000:.0f} ms")
 
 
 st.header("Top 5 States Dominance in India's Transactions")
 
 from data_queries import get_top5_states_dominance
-Top5_dominance_df = get_top5_states_dominance(engine)
+Top5_dominance_df = cached_query(get_top5_states_dominance, engine)
 
 
 fig_value = px.pie(
@@ -72,10 +136,63 @@ with col2:
     st.plotly_chart(fig_volume, use_container_width=True)
 
 
+st.header("Market Concentration")
+
+from data_queries import get_concentration_metrics, get_lorenz_curves
+concentration_df = cached_query(get_concentration_metrics, engine)
+lorenz_df = cached_query(get_lorenz_curves, engine)
+
+entity_type = st.radio("Concentration across", ["State", "District", "Pincode", "Brand"], horizontal=True,
+                       key="concentration_entity")
+entity_metrics_df = concentration_df[concentration_df["Entity_type"] == entity_type]
+
+# The metrics are per quarter: show the latest quarter inside the selected period.
+period_metrics_df = slice_period(entity_metrics_df, selected_year, selected_quarter)
+if period_metrics_df.empty:
+    st.info(f"No {entity_type.lower()} data for {period_label(selected_year, selected_quarter)}.")
+else:
+    latest = period_metrics_df.sort_values(["Year", "Quarter"]).iloc[-1]
+    concentration_year, concentration_quarter = int(latest["Year"]), int(latest["Quarter"])
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Top 5 share", f"{latest['Top_5_share_pct']:.1f}%")
+    col2.metric("Top 10 share", f"{latest['Top_10_share_pct']:.1f}%")
+    col3.metric("HHI", f"{latest['HHI']:,.0f}")
+    col4.metric("Gini", f"{latest['Gini']:.3f}")
+    st.caption(f"{int(latest['Entities'])} {entity_type.lower()} entities in "
+               f"{period_label(concentration_year, concentration_quarter)}; largest: {latest['Top_entity']}")
+
+    curve_df = lorenz_df[(lorenz_df["Entity_type"] == entity_type) & (lorenz_df["Year"] == concentration_year)
+                         & (lorenz_df["Quarter"] == concentration_quarter)]
+    fig_lorenz = px.line(
+        curve_df,
+        x="Population_share",
+        y="Value_share",
+        labels={"Population_share": f"Share of {entity_type.lower()}s (smallest first)",
+                "Value_share": "Share of total"},
+        title=f"Lorenz Curve: {entity_type} ({period_label(concentration_year, concentration_quarter)})")
+    fig_lorenz.add_scatter(x=[0, 1], y=[0, 1], mode="lines", name="Equality", line=dict(dash="dash", color="grey"))
+
+    trend_df = entity_metrics_df.assign(Period=entity_metrics_df["Year"].astype(str) + " Q" + entity_metrics_df["Quarter"].astype(str))
+    fig_gini = px.line(
+        trend_df,
+        x="Period",
+        y="Gini",
+        markers=True,
+        hover_data=["HHI", "Top_5_share_pct"],
+        title=f"Gini Coefficient Over Time: {entity_type}")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.plotly_chart(fig_lorenz, use_container_width=True)
+    with col2:
+        st.plotly_chart(fig_gini, use_container_width=True)
+
+
 st.header("Underperforming States Showing Strong Recent Growth: Future Opportunities")
 
 from data_queries import get_underperforming_growth_states
-underperforming_growth_states_df = get_underperforming_growth_states(engine)
+underperforming_growth_states_df = xf.filter(cached_query(get_underperforming_growth_states, engine), exclude="growth_states")
 
 underperforming_growth_states_df = underperforming_growth_states_df.rename(columns={"Recent_Year_Value": "Recent Year Value"})
 underperforming_growth_states_df = underperforming_growth_states_df.rename(columns={"Previous_Year_Value": "Previous Year Value"})
@@ -88,6 +205,7 @@ fig_scatter = px.scatter(
     y="Growth Rate",
     size_max= 5,  
     color="State",  
+    custom_data=["State"],
     labels={
         "Recent Year Value": "Recent Year Value",
         "Growth Rate": "Growth Rate (%)"},
@@ -96,13 +214,13 @@ fig_scatter = px.scatter(
 
 fig_scatter.update_layout(width=1080, height=720)
 
-st.plotly_chart(fig_scatter, use_container_width=True)
+xf.plotly_chart("growth_states", fig_scatter, use_container_width=True)
 
 
 st.header("Saturated vs Emerging State Markets")
 
 from data_queries import get_market_status
-market_status_df = get_market_status(engine)
+market_status_df = xf.filter(cached_query(get_market_status, engine), exclude="market_status")
 
 fig_bubble = px.scatter(
     market_status_df,
@@ -111,6 +229,7 @@ fig_bubble = px.scatter(
     size='Avg_Transaction_Size',
     color='State',
     hover_name='State',
+    custom_data=['State'],
     labels={
         'Total_Value': 'Total Value',
         'Growth_Percentage': 'Growth Percentage (%)',
@@ -121,16 +240,16 @@ fig_bubble = px.scatter(
 
 fig_bubble.update_layout(width=1080, height=720)
 
-st.plotly_chart(fig_bubble, use_container_width=True)
+xf.plotly_chart("market_status", fig_bubble, use_container_width=True)
 
 
 st.header("Top 10 States: High Transaction Value vs. Volume")
 
-from data_queries import get_top_transaction_volume_states
-top_transaction_volume_df = get_top_transaction_volume_states(engine)
+top_transaction_volume_df = (xf.filter(states_contribution_df)[["State", "Total_Transaction_Volume"]]
+                             .nlargest(10, "Total_Transaction_Volume"))
 
-from data_queries import get_top_transaction_value_states
-top_transaction_value_df = get_top_transaction_value_states(engine)
+top_transaction_value_df = (xf.filter(states_contribution_df)[["State", "Total_Transaction_Value"]]
+                            .nlargest(10, "Total_Transaction_Value"))
 
 from data_queries import indian_number_format
 
@@ -151,10 +270,61 @@ with col2:
     st.dataframe(top_transaction_value_df, hide_index=True)
 
 
+st.header("District & Pincode Lookup")
 
-    
+from district_queries import build_place_search_index, get_district_transactions, get_pincode_transactions
+
+@st.cache_resource
+def load_place_search_index(version):
+    return build_place_search_index(engine)
+
+from query_cache import data_version
+place_index = load_place_search_index(data_version(engine))
+
+search_text = st.text_input("Search a district or pincode", placeholder="e.g. Bengaluru, Pune, 560001")
+
+if search_text:
+    matches_df = place_index.search(search_text)
+
+    if matches_df.empty:
+        st.info("No matching district or pincode found.")
+    else:
+        match_labels = matches_df["Name"] + " (" + matches_df["Type"] + ", " + matches_df["State"] + ")"
+        selected = st.selectbox("Matches", matches_df.index, format_func=lambda i: match_labels[i])
+        selected_name, selected_type, selected_state = matches_df.loc[selected, ["Name", "Type", "State"]]
+
+        st.caption(f"{selected_state}, {period_label(drill_year, drill_quarter)}")
+
+        from dimensions import district_key
+
+        district_lookup_df = cached_query(get_district_transactions, engine, selected_state, drill_year, drill_quarter)
+        pincode_lookup_df = cached_query(get_pincode_transactions, engine, selected_state, drill_year, drill_quarter)
 
+        district_match = ((district_lookup_df["District"].map(district_key) == district_key(selected_name))
+                          & (selected_type == "District"))
+        pincode_match = (pincode_lookup_df["Pincode"].astype(str) == str(selected_name)) & (selected_type == "Pincode")
+        matched_df = district_lookup_df[district_match] if selected_type == "District" else pincode_lookup_df[pincode_match]
 
+        if matched_df.empty:
+            st.info(f"No transactions for {selected_name} in {period_label(drill_year, drill_quarter)}.")
+        else:
+            col1, col2, col3 = st.columns(3)
+            col1.metric(selected_type, selected_name)
+            col2.metric("Transaction Volume", indian_number_format(matched_df["Total_volume"].iloc[0]))
+            col3.metric("Transaction Value (₹)", indian_number_format(matched_df["Total_value"].iloc[0]))
 
+        def matched_first(df, is_match):
+            # The matched place is listed first and highlighted.
+            df = pd.concat([df[is_match], df[~is_match]], ignore_index=True)
+            matched_rows = int(is_match.sum())
+            return df.style.apply(lambda row: ["background-color: rgba(255, 215, 0, 0.25)"
+                                               if row.name < matched_rows else ""] * len(row), axis=1)
 
+        col1, col2 = st.columns(2)
 
+        with col1:
+            st.subheader("Districts")
+            st.dataframe(matched_first(district_lookup_df, district_match), hide_index=True)
+        with col2:
+            st.subheader("Top Pincodes")
+            st.dataframe(matched_first(pincode_lookup_df, pincode_match), hide_index=True)
@@ -17,16 +17,34 @@ engine = get_phonepe_engine()
 
 st.set_page_config(page_title="User Engagement", layout="wide")
 
+from profiling import profile_page
+profile_page(__file__)
+
+from query_cache import cached_query
+from period_slices import period_selector, slice_period, period_label
+from data_queries import get_transaction_slices, get_state_user_slices, get_district_user_slices
+transaction_slices_df = cached_query(get_transaction_slices, engine)
+selected_year, selected_quarter = period_selector(transaction_slices_df)
+state_user_slices_df = cached_query(get_state_user_slices, engine)
+district_user_slices_df = cached_query(get_district_user_slices, engine)
+
 
 st.title("User Engagement and Growth Strategy Analysis")
 
 st.header("Top 10 States/Districts of Registered Users")
 
-from data_queries import get_top_states_by_registered_users
-top_states_df = get_top_states_by_registered_users(engine)
+state_users_df = slice_period(state_user_slices_df, selected_year, selected_quarter, latest_when_all=True)
+district_users_df = slice_period(district_user_slices_df, selected_year, selected_quarter, latest_when_all=True)
+
+top_states_df = (state_users_df
+                 .groupby("State", as_index=False)["Registered_users"].sum()
+                 .rename(columns={"Registered_users": "Total_Users"})
+                 .nlargest(10, "Total_Users"))
 
-from data_queries import get_top_districts_by_registered_users
-top_districts_df = get_top_districts_by_registered_users(engine)
+top_districts_df = (district_users_df
+                    .groupby(["State", "District"], as_index=False)["Registered_users"].sum()
+                    .rename(columns={"Registered_users": "Total_Users"})
+                    .nlargest(10, "Total_Users"))
 
 from data_queries import indian_number_format
 
@@ -49,11 +67,15 @@ with col2:
     
 st.header("User Engagement Ratio: Top 10 States & Districts")
 
-from data_queries import get_state_engagement_ratio
-top_states_engagement_df = get_state_engagement_ratio(engine)
+def engagement_ratio(users_df, keys):
+    ratio_df = (users_df[users_df["Registered_users"] > 0]
+                .groupby(keys, as_index=False)[["Registered_users", "App_opens"]].sum()
+                .rename(columns={"Registered_users": "Total_Registered", "App_opens": "Total_App_Opens"}))
+    ratio_df["Engagement_Ratio_Percent"] = (ratio_df["Total_App_Opens"] * 100.0 / ratio_df["Total_Registered"]).round(2)
+    return ratio_df.nlargest(10, "Engagement_Ratio_Percent")
 
-from data_queries import get_district_engagement_ratio
-top_districts_engagement_df = get_district_engagement_ratio(engine)
+top_states_engagement_df = engagement_ratio(state_users_df, ["State"])
+top_districts_engagement_df = engagement_ratio(district_users_df, ["State", "District"])
 
 fig_states = px.pie(
     top_states_engagement_df,
@@ -80,7 +102,7 @@ with col2:
 st.header("Top 10 Dormant Regions: High Registration, Low Engagement")
 
 from data_queries import get_dormant_user_regions
-dormant_regions_df = get_dormant_user_regions(engine)
+dormant_regions_df = cached_query(get_dormant_user_regions, engine)
 
 fig_scatter = px.scatter(
     dormant_regions_df,
@@ -104,7 +126,7 @@ st.plotly_chart(fig_scatter, use_container_width=True)
 st.header("Growth of User Engagement Across States Over Time")
 
 from data_queries import get_growth_states_by_engagement
-yearly_growth_df = get_growth_states_by_engagement(engine)
+yearly_growth_df = cached_query(get_growth_states_by_engagement, engine)
 
 fig_heatmap = px.density_heatmap(yearly_growth_df, 
                                  x='Year', 
@@ -125,7 +147,7 @@ st.plotly_chart(fig_heatmap, use_container_width=True)
 st.header("Target Districts to Boost User Stickiness")
 
 from data_queries import get_target_districts_low_engagement
-target_districts_df = get_target_districts_low_engagement(engine)
+target_districts_df = cached_query(get_target_districts_low_engagement, engine)
 
 fig_bar = px.bar(
     target_districts_df,
@@ -135,7 +157,79 @@ fig_bar = px.bar(
     orientation="h",
     labels={"Engagement_Ratio_Percent": "Engagement Ratio (%)", "District": "District"},
     color_continuous_scale="YlOrRd",
+    hover_data=["Area_type", "Tier"],
     text="State" )
 fig_bar.update_layout(width=1080, height=720)
 
-st.plotly_chart(fig_bar, use_container_width=True)
\ No newline at end of file
+st.plotly_chart(fig_bar, use_container_width=True)
+
+st.header("Market Segments: Engagement, Growth and Insurance Combined")
+
+from segmentation import FEATURES, resolve_period, segment_districts, segment_states
+from data_queries import get_insurance_slices, get_district_transaction_slices
+from query_cache import data_version
+from geo_shards import DISTRICT_KEY_PROPERTY, district_key, load_state_districts
+
+insurance_slices_df = cached_query(get_insurance_slices, engine)
+district_transaction_slices_df = cached_query(get_district_transaction_slices, engine)
+
+@st.cache_data(ttl=3600)
+def load_segments(version, end, k, _transaction_slices_df, _state_user_slices_df, _insurance_slices_df,
+                  _district_transaction_slices_df, _district_user_slices_df):
+    # The slice frames are cached per data version, so the version, window end and
+    # segment count are enough to key the assignments.
+    return (segment_states(_transaction_slices_df, _state_user_slices_df, _insurance_slices_df, end, k),
+            segment_districts(_district_transaction_slices_df, _district_user_slices_df, _insurance_slices_df, end, k))
+
+segment_count = st.slider("Number of segments", min_value=2, max_value=8, value=4, key="segment_count")
+segment_end = resolve_period(transaction_slices_df, selected_year, selected_quarter)
+segment_label = period_label(segment_end // 4, segment_end % 4 + 1)
+
+(state_segments_df, state_profile_df), (district_segments_df, district_profile_df) = load_segments(
+    data_version(engine), segment_end, segment_count, transaction_slices_df, state_user_slices_df, insurance_slices_df,
+    district_transaction_slices_df, district_user_slices_df)
+
+st.caption(f"Segments from k-means over {', '.join(FEATURES)}, totalled over the four quarters to {segment_label}. "
+           "Insurance is published per state, so districts carry the figure of their state.")
+
+state_segments_df = state_segments_df.merge(
+    transaction_slices_df[["State", "Geo_name"]].drop_duplicates(), on="State", how="left")
+
+fig_segments = px.choropleth(
+    state_segments_df,
+    geojson="https://gist.githubusercontent.com/jbrobst/56c13bbbf9d97d187fea01ca62ea5112/raw/e388c4cae20aa53cb5090210a42ebb9b765c0a36/india_states.geojson",
+    featureidkey="properties.ST_NM",
+    locations="Geo_name",
+    color="Segment_name",
+    category_orders={"Segment_name": state_profile_df["Segment_name"].tolist()},
+    hover_name="State",
+    hover_data=FEATURES,
+    labels={"Segment_name": "Segment"},
+    title=f"State Segments ({segment_label})")
+fig_segments.update_geos(fitbounds="locations", visible=False)
+fig_segments.update_layout(width=1080, height=720)
+
+st.plotly_chart(fig_segments, use_container_width=True)
+st.dataframe(state_profile_df, hide_index=True)
+
+segment_state = st.selectbox("District segments of", sorted(district_segments_df["State"].unique()),
+                             key="segment_state")
+state_district_segments_df = district_segments_df[district_segments_df["State"] == segment_state].assign(
+    District_key=lambda df: df["District"].map(district_key))
+
+fig_district_segments = px.choropleth(
+    state_district_segments_df,
+    geojson=load_state_districts(segment_state),
+    featureidkey=f"properties.{DISTRICT_KEY_PROPERTY}",
+    locations="District_key",
+    color="Segment_name",
+    category_orders={"Segment_name": district_profile_df["Segment_name"].tolist()},
+    hover_name="District",
+    hover_data=FEATURES,
+    labels={"Segment_name": "Segment"},
+    title=f"District Segments: {segment_state} ({segment_label})")
+fig_district_segments.update_geos(fitbounds="locations", visible=False)
+fig_district_segments.update_layout(width=1080, height=720)
+
+st.plotly_chart(fig_district_segments, use_container_width=True)
+st.dataframe(district_profile_df, hide_index=True)
@@ -0,0 +1,91 @@
+import streamlit as st
+import sys
+import os
+import pandas as pd
+import numpy as np
+import matplotlib.pyplot as plt
+import seaborn as sns
+import plotly.express as px
+from sqlalchemy import text
+
+sys.path.append(os.path.abspath("D:/D26_Files/Phonepe_Analytics/Pulse_Case_Studies/"))
+
+from db_connection import get_phonepe_engine
+
+engine = get_phonepe_engine()
+
+
+st.set_page_config(page_title="Transaction Forecast", layout="wide")
+
+from profiling import profile_page
+profile_page(__file__)
+
+from query_cache import cached_query
+from data_queries import get_transaction_slices
+transaction_slices_df = cached_query(get_transaction_slices, engine)
+
+
+st.title("Quarter-ahead Transaction Forecast")
+
+from forecasting import ALL_TYPES, get_cached_forecasts
+from query_cache import data_version
+
+@st.cache_data(show_spinner="Fitting forecast models...")
+def load_forecasts(version, horizon, _slices_df):
+    return get_cached_forecasts(_slices_df, horizon)
+
+horizon = st.sidebar.slider("Forecast horizon (quarters)", min_value=1, max_value=8, value=4)
+forecast_df = load_forecasts(data_version(engine), horizon, transaction_slices_df)
+
+col1, col2 = st.columns(2)
+
+with col1:
+    forecast_state = st.selectbox("State", sorted(forecast_df["State"].unique()))
+with col2:
+    forecast_type = st.selectbox("Transaction Type", [ALL_TYPES] + sorted(
+        set(forecast_df["Transaction_type"]) - {ALL_TYPES}))
+
+history_df = transaction_slices_df[transaction_slices_df["State"] == forecast_state]
+if forecast_type != ALL_TYPES:
+    history_df = history_df[history_df["Transaction_type"] == forecast_type]
+history_df = history_df.groupby(["Year", "Quarter"], as_index=False)[["Total_volume", "Total_value"]].sum()
+
+# "All" has a forecast of its own for the state total, so its interval is a real
+# prediction interval of the total rather than a sum of per-type intervals.
+future_df = forecast_df[(forecast_df["State"] == forecast_state) & (forecast_df["Transaction_type"] == forecast_type)]
+future_df = future_df.drop(columns=["State", "Transaction_type"]).reset_index(drop=True)
+
+history_df["Year-Quarter"] = history_df["Year"].astype(str) + " Q" + history_df["Quarter"].astype(str)
+future_df["Year-Quarter"] = future_df["Year"].astype(str) + " Q" + future_df["Quarter"].astype(str)
+
+chart_df = pd.concat([
+    history_df.rename(columns={"Total_volume": "Volume", "Total_value": "Value"}).assign(Series="Actual"),
+    future_df.rename(columns={"Forecast_volume": "Volume", "Forecast_value": "Value"}).assign(Series="Forecast"),
+], ignore_index=True)
+
+fig_value = px.line(
+    chart_df,
+    x="Year-Quarter",
+    y="Value",
+    color="Series",
+    markers=True,
+    labels={"Value": "Transaction Value (₹)", "Year-Quarter": "Quarter"},
+    title=f"Transaction Value Forecast: {forecast_state}, {forecast_type}")
+
+fig_volume = px.line(
+    chart_df,
+    x="Year-Quarter",
+    y="Volume",
+    color="Series",
+    markers=True,
+    labels={"Volume": "Transaction Volume", "Year-Quarter": "Quarter"},
+    title=f"Transaction Volume Forecast: {forecast_state}, {forecast_type}")
+
+col1, col2 = st.columns(2)
+with col1:
+    st.plotly_chart(fig_value, use_container_width=True)
+with col2:
+    st.plotly_chart(fig_volume, use_container_width=True)
+
+st.subheader("Forecast Table")
+st.dataframe(future_df.drop(columns=["Year-Quarter"]), hide_index=True)
@@ -0,0 +1,128 @@
+import streamlit as st
+import sys
+import os
+import time
+import pandas as pd
+import numpy as np
+import plotly.express as px
+
+sys.path.append(os.path.abspath("D:/D26_Files/Phonepe_Analytics/Pulse_Case_Studies/"))
+
+from db_connection import get_phonepe_engine
+
+engine = get_phonepe_engine()
+
+
+st.set_page_config(page_title="Insurance What-If", layout="wide")
+
+from profiling import profile_page
+profile_page(__file__)
+
+from query_cache import cached_query
+from period_slices import period_selector, period_label
+from data_queries import get_transaction_slices, get_state_user_slices, get_insurance_slices
+transaction_slices_df = cached_query(get_transaction_slices, engine)
+selected_year, selected_quarter = period_selector(transaction_slices_df)
+state_user_slices_df = cached_query(get_state_user_slices, engine)
+insurance_slices_df = cached_query(get_insurance_slices, engine)
+
+
+st.title("Insurance Penetration What-If Simulator")
+
+from insurance_simulator import (state_baselines, percentile_scenarios, rate_scenarios, uplift_scenarios,
+                                 scenario_summary, state_results)
+from segmentation import resolve_period
+from query_cache import data_version
+from data_queries import indian_number_format
+
+@st.cache_data(ttl=3600)
+def load_baselines(version, end, _insurance_slices_df, _state_user_slices_df):
+    # The slice frames are cached per data version; every scenario below is evaluated
+    # in memory against these baselines.
+    return state_baselines(_insurance_slices_df, _state_user_slices_df, end)
+
+baseline_end = resolve_period(insurance_slices_df, selected_year, selected_quarter)
+if baseline_end is None:
+    st.info("No insurance transactions have been loaded yet.")
+    st.stop()
+baseline_label = period_label(baseline_end // 4, baseline_end % 4 + 1)
+if selected_year is not None and selected_year * 4 + (selected_quarter or 4) - 1 < baseline_end:
+    st.info(f"Insurance data starts in {baseline_label}; the baselines below are for that quarter.")
+baseline_df = load_baselines(data_version(engine), baseline_end, insurance_slices_df, state_user_slices_df)
+
+st.caption(f"Baselines: registered users as of {baseline_label}; adoption rate (insurance transactions per "
+           f"registered user) and average premium over the four quarters to {baseline_label}.")
+
+st.header("Scenario")
+
+col1, col2 = st.columns(2)
+with col1:
+    scenario_kind = st.radio("Target", ["National percentile", "Adoption rate", "Uplift"], horizontal=True)
+with col2:
+    scenario_states = st.multiselect("States (none selected = all states)", baseline_df["State"].tolist())
+
+if scenario_kind == "National percentile":
+    target_value = st.slider("Adoption percentile across states (50 = national median)", 0, 100, 50)
+    sweep = np.linspace(0, 100, 1001)
+    build = percentile_scenarios
+    sweep_label, sweep_scale = "Target percentile", 1
+elif scenario_kind == "Adoption rate":
+    highest = float(baseline_df["Adoption_rate"].max() * 2) or 0.01
+    target_value = st.slider("Insurance transactions per 1,000 registered users", 0.0, highest * 1000,
+                             float(baseline_df["Adoption_rate"].median() * 1000)) / 1000
+    sweep = np.linspace(0, highest, 1001)
+    build = rate_scenarios
+    sweep_label, sweep_scale = "Target rate (per 1,000 registered users)", 1000
+else:
+    target_value = st.slider("Adoption uplift (%)", 0, 200, 25)
+    sweep = np.linspace(0, 200, 1001)
+    build = uplift_scenarios
+    sweep_label, sweep_scale = "Uplift (%)", 1
+
+states = scenario_states or None
+simulation_start = time.perf_counter()
+# The chosen scenario and a sweep of 1,001 neighbouring scenarios, evaluated in one broadcast.
+target_rates = build(baseline_df, np.r_[target_value, sweep], states)
+summary_df = scenario_summary(baseline_df, target_rates)
+results_df = state_results(baseline_df, target_rates[0])
+simulation_ms = (time.perf_counter() - simulation_start) * 1000
+
+chosen = summary_df.iloc[0]
+current_rate = baseline_df["Insurance_txn_count"].sum() / baseline_df["Registered_users"].sum()
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("Incremental insurance transactions", indian_number_format(chosen["Incremental_txns"]))
+col2.metric("Incremental value (₹)", indian_number_format(chosen["Incremental_value"]))
+col3.metric("States lifted", int(chosen["States_lifted"]))
+col4.metric("National adoption (per 1,000 users)", f"{chosen['Adoption_rate'] * 1000:.2f}",
+            f"{(chosen['Adoption_rate'] - current_rate) * 1000:+.2f}")
+st.caption(f"{len(target_rates):,} scenarios x {len(baseline_df)} states evaluated in {simulation_ms:.1f} ms")
+
+fig_states = px.bar(
+    results_df[results_df["Incremental_value"] > 0],
+    x="Incremental_value",
+    y="State",
+    orientation="h",
+    color="Adoption_rate",
+    color_continuous_scale="sunset",
+    hover_data=["Registered_users", "Target_rate", "Incremental_txns", "Avg_premium"],
+    labels={"Incremental_value": "Incremental Value (₹)", "Adoption_rate": "Current Adoption Rate"},
+    title="Incremental Insurance Value by State")
+fig_states.update_layout(yaxis={"categoryorder": "total ascending"}, height=720)
+
+sweep_df = summary_df.iloc[1:].assign(Target=sweep * sweep_scale)
+fig_sweep = px.line(
+    sweep_df,
+    x="Target",
+    y="Incremental_value",
+    hover_data=["Incremental_txns", "States_lifted"],
+    labels={"Target": sweep_label, "Incremental_value": "Incremental Value (₹)"},
+    title="Incremental Value Across Targets")
+fig_sweep.add_vline(x=target_value * sweep_scale, line_dash="dash", line_color="grey")
+
+col1, col2 = st.columns(2)
+with col1:
+    st.plotly_chart(fig_states, use_container_width=True)
+with col2:
+    st.plotly_chart(fig_sweep, use_container_width=True)
+
+st.dataframe(results_df, hide_index=True)
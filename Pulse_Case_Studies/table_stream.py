@@ -0,0 +1,137 @@
+"""
+table_stream.py
+
+This module streams whole tables (or filtered slices of them) out of the database in
+fixed-size chunks, for pulls that are too large to materialise in one go with
+pd.read_sql("SELECT * FROM ...").
+
+    for chunk in stream_table(engine, "top_transaction",
+                              columns=["State", "Entity_name", "Transaction_amount"],
+                              where={"Entity_type": "Pincode", "Year>=": 2022}):
+        ...
+
+Rows are fetched over a server-side (unbuffered) cursor, so memory stays at about
+one chunk whatever the table size. Only the requested columns are selected and the
+predicates are applied in the WHERE clause. Every chunk has the same dtypes, taken
+from the table definition rather than inferred per chunk, and can be produced as a
+pandas DataFrame or a pyarrow RecordBatch.
+"""
+import re
+import pandas as pd
+from sqlalchemy import MetaData, Table, func, select, types
+
+from db_connection import read_engine
+
+DEFAULT_CHUNKSIZE = 50000
+
+_PREDICATE = re.compile(r"^(\w+)\s*(==|=|!=|<=|>=|<|>)?$")
+
+_OPERATORS = {
+    "=": lambda column, value: column == value,
+    "==": lambda column, value: column == value,
+    "!=": lambda column, value: column != value,
+    "<": lambda column, value: column < value,
+    "<=": lambda column, value: column <= value,
+    ">": lambda column, value: column > value,
+    ">=": lambda column, value: column >= value,
+}
+
+
+def _table(engine, table):
+    return Table(table, MetaData(), autoload_with=engine)
+
+
+def _column_dtype(column_type):
+    # Nullable integers keep one dtype across chunks whether or not a chunk has NULLs.
+    if isinstance(column_type, types.Integer):
+        return "Int64"
+    if isinstance(column_type, (types.Float, types.Numeric)):
+        return "float64"
+    return "object"
+
+
+def _arrow_type(dtype):
+    import pyarrow as pa
+    return {"Int64": pa.int64(), "float64": pa.float64()}.get(dtype, pa.string())
+
+
+def build_predicates(table, where):
+    """
+    Turn a where dict into SQLAlchemy conditions on table. Keys are column names,
+    optionally followed by an operator ("Year>=", "State!="); a list, tuple or set
+    value means IN and None means IS NULL.
+    """
+    conditions = []
+    for key, value in (where or {}).items():
+        match = _PREDICATE.match(key.strip())
+        if not match or match.group(1) not in table.c:
+            raise ValueError(f"Unknown column in predicate {key!r} for table {table.name}")
+        column, operator = table.c[match.group(1)], match.group(2) or "="
+        if isinstance(value, (list, tuple, set)):
+            if operator not in ("=", "==", "!="):
+                raise ValueError(f"IN lists only support = and !=, got {key!r}")
+            condition = column.in_(list(value))
+            conditions.append(~condition if operator == "!=" else condition)
+        elif value is None:
+            conditions.append(column.is_(None) if operator in ("=", "==") else column.is_not(None))
+        else:
+            conditions.append(_OPERATORS[operator](column, value))
+    return conditions
+
+
+def stream_table(engine, table, columns=None, where=None, chunksize=DEFAULT_CHUNKSIZE, output="pandas", order_by=None):
+    """
+    Yield the rows of table in chunks of at most chunksize rows.
+
+    columns limits the selected columns (default: all); where holds the predicates
+    described in build_predicates; order_by is a column name or list of them.
+    output="arrow" yields pyarrow RecordBatches sharing one schema instead of
+    DataFrames. Reads go to a replica when db_connection has one configured.
+
+    Returns:
+    generator of pandas.DataFrame (or pyarrow.RecordBatch) chunks
+    """
+    if output not in ("pandas", "arrow"):
+        raise ValueError(f"output must be 'pandas' or 'arrow', got {output!r}")
+    engine = read_engine(engine)
+    source = _table(engine, table)
+    columns = list(columns or source.c.keys())
+    unknown = [column for column in columns if column not in source.c]
+    if unknown:
+        raise ValueError(f"Unknown column(s) for table {table}: {', '.join(unknown)}")
+
+    query = select(*[source.c[column] for column in columns]).where(*build_predicates(source, where))
+    if order_by:
+        query = query.order_by(*[source.c[column] for column in ([order_by] if isinstance(order_by, str) else order_by)])
+
+    dtypes = {column: _column_dtype(source.c[column].type) for column in columns}
+    schema = None
+    if output == "arrow":
+        import pyarrow as pa
+        schema = pa.schema([(column, _arrow_type(dtype)) for column, dtype in dtypes.items()])
+    # Arguments are checked above, when stream_table is called; rows are only
+    # fetched once the generator is iterated.
+    return _stream(engine, query, dtypes, chunksize, schema)
+
+
+def _stream(engine, query, dtypes, chunksize, schema):
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, max_row_buffer=chunksize).execute(query)
+        for rows in result.partitions(chunksize):
+            chunk = pd.DataFrame.from_records(rows, columns=list(dtypes)).astype(dtypes)
+            if schema is not None:
+                import pyarrow as pa
+                yield pa.RecordBatch.from_pandas(chunk, schema=schema, preserve_index=False)
+            else:
+                yield chunk
+
+
+def count_rows(engine, table, where=None):
+    """
+    Count the rows a stream_table call with the same table and where would yield.
+    """
+    engine = read_engine(engine)
+    source = _table(engine, table)
+    query = select(func.count()).select_from(source).where(*build_predicates(source, where))
+    with engine.connect() as conn:
+        return conn.execute(query).scalar()